@@ -0,0 +1,116 @@
+"""Run the benchmark suite and write a JSON report.
+
+```
+python -m benchmarks --output results.json
+python -m benchmarks --payload-sizes 1024 65536 --compare baseline.json
+```
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import platform
+import sys
+from importlib import metadata
+from typing import Any, Sequence
+
+from benchmarks import cases, harness
+
+
+def _package_version() -> str | None:
+    try:
+        return metadata.version("skand_otel_utils")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def run(
+    *,
+    payload_sizes: Sequence[int] = cases.DEFAULT_PAYLOAD_SIZES,
+    name_filter: str | None = None,
+    min_time: float = harness.DEFAULT_MIN_TIME,
+    repeat: int = harness.DEFAULT_REPEAT,
+) -> dict[str, Any]:
+    """Run the benchmark cases and build the report.
+
+    Args:
+        payload_sizes: Event data sizes, in bytes.
+        name_filter: Only run the cases whose key contains this string.
+        min_time: Minimum number of seconds of each timed repeat.
+        repeat: Number of timed repeats.
+
+    Returns:
+        The JSON serialisable report.
+
+    """
+    results = [
+        harness.measure(case, min_time=min_time, repeat=repeat).to_dict()
+        for case in cases.iter_cases(payload_sizes)
+        if name_filter is None or name_filter in case.key
+    ]
+    return {
+        "metadata": {
+            "package_version": _package_version(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+            "min_time": min_time,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def _parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument(
+        "--output", help="Write the JSON report to this file instead of stdout."
+    )
+    parser.add_argument(
+        "--payload-sizes",
+        type=int,
+        nargs="+",
+        default=cases.DEFAULT_PAYLOAD_SIZES,
+        help="Event data sizes, in bytes.",
+    )
+    parser.add_argument("--filter", help="Only run cases whose key contains this.")
+    parser.add_argument("--min-time", type=float, default=harness.DEFAULT_MIN_TIME)
+    parser.add_argument("--repeat", type=int, default=harness.DEFAULT_REPEAT)
+    parser.add_argument(
+        "--compare", help="Report of a previous run to compare the results with."
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Run the benchmarks from the command line."""
+    args = _parse_args(argv)
+    report = run(
+        payload_sizes=args.payload_sizes,
+        name_filter=args.filter,
+        min_time=args.min_time,
+        repeat=args.repeat,
+    )
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:  # noqa: PTH123
+            output.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:  # noqa: PTH123
+            baseline = json.load(baseline_file)
+        for key, baseline_ns, current_ns in harness.compare(baseline, report):
+            sys.stderr.write(
+                f"{current_ns / baseline_ns:6.2f}x  {baseline_ns:12.0f} ns -> "
+                f"{current_ns:12.0f} ns  {key}\n"
+            )
+
+
+if __name__ == "__main__":
+    main()
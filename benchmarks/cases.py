@@ -0,0 +1,245 @@
+"""Benchmark cases of the decorator stack and propagator helpers."""
+
+from __future__ import annotations
+
+import functools
+import itertools
+import json
+from typing import Callable, Iterator, Sequence
+
+from cloudevents.sdk.event import v1
+from dapr.clients.grpc._response import TopicEventResponse, TopicEventResponseStatus
+from opentelemetry import trace
+from opentelemetry.context.context import Context
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+from opentelemetry.sdk.trace.id_generator import RandomIdGenerator
+
+from benchmarks.harness import Case
+from skand_otel_utils import propagator
+from skand_otel_utils.cloudevents.decorators import (
+    distributed_trace_context,
+    instrument,
+    trace_span,
+)
+
+DEFAULT_PAYLOAD_SIZES = (1024, 64 * 1024, 1024 * 1024, 50 * 1024 * 1024)
+"""Event data sizes, in bytes, from 1 KB to 50 MB."""
+
+CONTENT_TYPES = ("application/json", "application/octet-stream", "")
+"""Content types of the benchmarked events, the empty one meaning missing."""
+
+EXTRACTIONS = ("extensions", "data", "miss")
+"""Where the traceparent of the benchmarked events is found."""
+
+_SUCCESS = TopicEventResponse(TopicEventResponseStatus.success)
+_BOUNDED_PAYLOAD_LENGTH = 1024
+_DISTINCT_TRACEPARENTS = 4 * propagator.TRACEPARENT_CACHE_SIZE
+
+
+class _Tracing:
+    """In-memory tracer provider and sampled and unsampled remote contexts."""
+
+    def __init__(self) -> None:
+        self.exporter = InMemorySpanExporter()
+        self.tracer_provider = TracerProvider()
+        self.tracer_provider.add_span_processor(SimpleSpanProcessor(self.exporter))
+        self.tracer = self.tracer_provider.get_tracer(__name__)
+        self._id_generator = RandomIdGenerator()
+
+    def traceparent(self, *, sampled: bool) -> str:
+        return propagator.format_traceparent(
+            trace.SpanContext(
+                trace_id=self._id_generator.generate_trace_id(),
+                span_id=self._id_generator.generate_span_id(),
+                is_remote=True,
+                trace_flags=trace.TraceFlags(
+                    trace.TraceFlags.SAMPLED if sampled else trace.TraceFlags.DEFAULT
+                ),
+            )
+        )
+
+    def current_span_context(self, *, sampled: bool) -> Context:
+        """Build a context whose current span is recording when sampled."""
+        if sampled:
+            span = self.tracer.start_span("benchmark")
+        else:
+            span = trace.NonRecordingSpan(
+                trace.get_current_span(
+                    propagator.extract_context_from_traceparent(
+                        self.traceparent(sampled=False)
+                    )
+                ).get_span_context()
+            )
+        return trace.set_span_in_context(span, Context())
+
+    def clear(self) -> None:
+        self.exporter.clear()
+
+
+@functools.lru_cache(maxsize=None)
+def _json_data(size: int, traceparent: str | None) -> bytes:
+    """Build a JSON object of about ``size`` bytes, traceparent first."""
+    document: dict[str, object] = {}
+    if traceparent is not None:
+        document["traceparent"] = traceparent
+    item = {"id": 0, "name": "item", "tags": ["a", "b"], "value": 1.5}
+    item_size = len(json.dumps(item)) + 2
+    document["items"] = [
+        dict(item, id=index) for index in range(max(size // item_size, 1))
+    ]
+    return json.dumps(document).encode()
+
+
+def _event(data: bytes, content_type: str, traceparent: str | None) -> v1.Event:
+    event = v1.Event()
+    event.SetEventID("benchmark")
+    event.SetEventType("benchmark")
+    event.SetSource("benchmarks")
+    event.SetSubject("benchmark")
+    event.SetData(data)
+    if content_type:
+        event.SetContentType(content_type)
+    if traceparent is not None:
+        event.SetExtensions({"traceparent": traceparent})
+    return event
+
+
+def _handler(_: v1.Event) -> TopicEventResponse:
+    return _SUCCESS
+
+
+def _propagator_cases(tracing: _Tracing) -> Iterator[Case]:
+    for sampled in (True, False):
+        yield Case(
+            "propagator/get_traceparent_from_current_trace_context",
+            {"sampled": sampled},
+            propagator.get_traceparent_from_current_trace_context,
+            context=tracing.current_span_context(sampled=sampled),
+        )
+
+    traceparent = tracing.traceparent(sampled=True)
+    yield Case(
+        "propagator/extract_context_from_traceparent",
+        {"cache": "hit"},
+        lambda: propagator.extract_context_from_traceparent(traceparent),
+    )
+    traceparents = itertools.cycle(
+        [tracing.traceparent(sampled=True) for _ in range(_DISTINCT_TRACEPARENTS)]
+    )
+    yield Case(
+        "propagator/extract_context_from_traceparent",
+        {"cache": "miss"},
+        lambda: propagator.extract_context_from_traceparent(next(traceparents)),
+    )
+
+
+def _setup_cases(tracing: _Tracing, payload_sizes: Sequence[int]) -> Iterator[Case]:
+    handler = distributed_trace_context.setup()(_handler)
+    traceparent = tracing.traceparent(sampled=True)
+    for size in payload_sizes:
+        data_with_traceparent = _json_data(size, traceparent)
+        data = _json_data(size, None)
+        for content_type, extraction in itertools.product(CONTENT_TYPES, EXTRACTIONS):
+            event = _event(
+                data_with_traceparent if extraction == "data" else data,
+                content_type,
+                traceparent if extraction == "extensions" else None,
+            )
+            yield Case(
+                "distributed_trace_context/setup",
+                {
+                    "payload_size": size,
+                    "content_type": content_type or "missing",
+                    "extraction": extraction,
+                },
+                lambda handler=handler, event=event: handler(event),
+            )
+
+
+def _trace_span_cases(
+    tracing: _Tracing, payload_sizes: Sequence[int]
+) -> Iterator[Case]:
+    status_handler = trace_span.set_span_status_from_cloudenvet_handler_result(_handler)
+    event_handlers = {
+        "full": trace_span.set_span_event_from_event(
+            "event payload", trace_span.extract_payload_from_cloudevent
+        )(_handler),
+        "bounded": trace_span.set_span_event_from_event(
+            "event payload",
+            trace_span.make_payload_extractor(_BOUNDED_PAYLOAD_LENGTH),
+        )(_handler),
+    }
+    for sampled in (True, False):
+        span_context = tracing.current_span_context(sampled=sampled)
+        event = _event(_json_data(payload_sizes[0], None), "application/json", None)
+        yield Case(
+            "trace_span/set_span_status_from_cloudenvet_handler_result",
+            {"sampled": sampled},
+            lambda event=event: status_handler(event),
+            context=span_context,
+        )
+        for size, (extractor, handler) in itertools.product(
+            payload_sizes, event_handlers.items()
+        ):
+            event = _event(_json_data(size, None), "application/json", None)
+            yield Case(
+                "trace_span/set_span_event_from_event",
+                {"sampled": sampled, "payload_size": size, "extractor": extractor},
+                lambda handler=handler, event=event: handler(event),
+                context=span_context,
+                teardown=tracing.clear,
+            )
+
+
+def _stack_cases(tracing: _Tracing, payload_sizes: Sequence[int]) -> Iterator[Case]:
+    def readme_stack(
+        *, consumer_span: bool
+    ) -> Callable[[v1.Event], TopicEventResponse]:
+        return distributed_trace_context.setup(
+            consumer_span=consumer_span, tracer_provider=tracing.tracer_provider
+        )(
+            trace_span.set_span_event_from_event(
+                "event payload", trace_span.extract_payload_from_cloudevent
+            )(trace_span.set_span_status_from_cloudenvet_handler_result(_handler))
+        )
+
+    stacks = {
+        "readme": readme_stack(consumer_span=False),
+        "readme_consumer_span": readme_stack(consumer_span=True),
+        "instrument": instrument.setup(
+            event_extractor=trace_span.extract_payload_from_cloudevent
+        )(_handler),
+    }
+    traceparents = {
+        sampled: tracing.traceparent(sampled=sampled) for sampled in (True, False)
+    }
+    for size, sampled, (stack, handler) in itertools.product(
+        payload_sizes, (True, False), stacks.items()
+    ):
+        event = _event(
+            _json_data(size, None), "application/json", traceparents[sampled]
+        )
+        yield Case(
+            f"stack/{stack}",
+            {"sampled": sampled, "payload_size": size},
+            lambda handler=handler, event=event: handler(event),
+            teardown=tracing.clear,
+        )
+
+
+def iter_cases(payload_sizes: Sequence[int] = DEFAULT_PAYLOAD_SIZES) -> Iterator[Case]:
+    """Yield every benchmark case.
+
+    Args:
+        payload_sizes: Event data sizes, in bytes.
+
+    """
+    tracing = _Tracing()
+    yield from _propagator_cases(tracing)
+    yield from _setup_cases(tracing, payload_sizes)
+    yield from _trace_span_cases(tracing, payload_sizes)
+    yield from _stack_cases(tracing, payload_sizes)
@@ -0,0 +1,199 @@
+"""Timing and allocation measurement of benchmark cases."""
+
+from __future__ import annotations
+
+import dataclasses
+import gc
+import time
+import tracemalloc
+from typing import TYPE_CHECKING, Any, Callable, Mapping
+
+from opentelemetry import context
+
+if TYPE_CHECKING:
+    from opentelemetry.context.context import Context
+
+DEFAULT_MIN_TIME = 0.2
+"""Minimum number of seconds of each timed repeat."""
+
+DEFAULT_REPEAT = 5
+"""Number of timed repeats, the fastest one is reported."""
+
+_MAX_NUMBER = 1 << 20
+
+
+@dataclasses.dataclass(frozen=True)
+class Case:
+    """A benchmarked operation.
+
+    Attributes:
+        name: Name of the measured operation, e.g. ``setup/extensions``.
+        params: Parameters distinguishing the variants of the operation.
+        func: The operation, called without arguments.
+        context: Context attached while the operation is measured, e.g. one
+            with a sampled or unsampled current span.
+        teardown: Called after each timed repeat, e.g. to clear exported spans.
+
+    """
+
+    name: str
+    params: Mapping[str, Any]
+    func: Callable[[], object]
+    context: Context | None = None
+    teardown: Callable[[], object] | None = None
+
+    @property
+    def key(self) -> str:
+        """Identify the case across runs."""
+        params = ",".join(
+            f"{key}={value}" for key, value in sorted(self.params.items())
+        )
+        return f"{self.name}[{params}]"
+
+
+@dataclasses.dataclass(frozen=True)
+class Result:
+    """Measurement of a benchmark case.
+
+    Attributes:
+        key: See `Case.key`.
+        name: See `Case.name`.
+        params: See `Case.params`.
+        number: Number of calls of each timed repeat.
+        best_ns_per_op: Per call time of the fastest repeat, in nanoseconds.
+        mean_ns_per_op: Per call time averaged over every repeat.
+        peak_bytes_per_op: Peak memory allocated by a single call.
+        retained_bytes_per_op: Memory still allocated after a call, averaged
+            over the repeat.
+
+    """
+
+    key: str
+    name: str
+    params: Mapping[str, Any]
+    number: int
+    best_ns_per_op: float
+    mean_ns_per_op: float
+    peak_bytes_per_op: int
+    retained_bytes_per_op: float
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return a JSON serialisable representation."""
+        return dataclasses.asdict(self)
+
+
+def _time(case: Case, number: int) -> int:
+    func = case.func
+    token = context.attach(case.context) if case.context is not None else None
+    try:
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter_ns() - start
+    finally:
+        if token is not None:
+            context.detach(token)
+    if case.teardown is not None:
+        case.teardown()
+    return elapsed
+
+
+def _calibrate(case: Case, min_time: float) -> int:
+    """Find a number of calls lasting at least ``min_time`` seconds."""
+    number = 1
+    while number < _MAX_NUMBER:
+        if _time(case, number) >= min_time * 1e9:
+            break
+        number *= 2
+    return number
+
+
+def _allocations(case: Case, number: int) -> tuple[int, float]:
+    """Measure the peak and retained memory of calls with tracemalloc."""
+    token = context.attach(case.context) if case.context is not None else None
+    was_tracing = tracemalloc.is_tracing()
+    try:
+        case.func()
+        tracemalloc.stop()
+        tracemalloc.start()
+        case.func()
+        _, peak = tracemalloc.get_traced_memory()
+
+        tracemalloc.stop()
+        tracemalloc.start()
+        for _ in range(number):
+            case.func()
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        if was_tracing:
+            tracemalloc.start()
+        if token is not None:
+            context.detach(token)
+        if case.teardown is not None:
+            case.teardown()
+    return peak, retained / number
+
+
+def measure(
+    case: Case,
+    *,
+    min_time: float = DEFAULT_MIN_TIME,
+    repeat: int = DEFAULT_REPEAT,
+) -> Result:
+    """Time a case and measure its allocations.
+
+    Args:
+        case: The benchmarked operation.
+        min_time: Minimum number of seconds of each timed repeat.
+        repeat: Number of timed repeats.
+
+    Returns:
+        The measurement.
+
+    """
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        number = _calibrate(case, min_time / repeat)
+        timings = [_time(case, number) / number for _ in range(repeat)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    peak, retained = _allocations(case, min(number, 100))
+    return Result(
+        key=case.key,
+        name=case.name,
+        params=dict(case.params),
+        number=number,
+        best_ns_per_op=min(timings),
+        mean_ns_per_op=sum(timings) / len(timings),
+        peak_bytes_per_op=peak,
+        retained_bytes_per_op=retained,
+    )
+
+
+def compare(
+    baseline: Mapping[str, Any], current: Mapping[str, Any]
+) -> list[tuple[str, float, float]]:
+    """Compare the best per call times of two benchmark reports.
+
+    Args:
+        baseline: Report of a previous run, as written by ``python -m benchmarks``.
+        current: Report of the current run.
+
+    Returns:
+        ``(key, baseline ns, current ns)`` for each case found in both reports.
+
+    """
+    baseline_results = {result["key"]: result for result in baseline["results"]}
+    return [
+        (
+            result["key"],
+            baseline_results[result["key"]]["best_ns_per_op"],
+            result["best_ns_per_op"],
+        )
+        for result in current["results"]
+        if result["key"] in baseline_results
+    ]
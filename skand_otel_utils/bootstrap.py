@@ -0,0 +1,571 @@
+"""Fork-safe installation of the tracer and meter providers.
+
+`configure_tracing` sets up OTLP export with throughput-oriented defaults,
+while `install_providers` takes any exporters.
+
+Consumers running several worker processes per pod bootstrap tracing once in
+the parent, before forking. The SDK batch span processor and periodic metric
+reader restart their threads and clear their queues in forked children, but
+the exporters they hold, and their gRPC channels or HTTP sessions, are copied
+as is. The exporters installed here are created lazily in each process, so a
+child never exports through the connection of its parent.
+
+```python
+bootstrap.configure_tracing(service_name="tiler")
+```
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import threading
+import weakref
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Generic,
+    Iterable,
+    NamedTuple,
+    Sequence,
+    TypeVar,
+)
+
+from opentelemetry import metrics, trace
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import (
+    MetricExporter,
+    MetricExportResult,
+    PeriodicExportingMetricReader,
+)
+from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    SpanExporter,
+    SpanExportResult,
+)
+
+from skand_otel_utils import load_shedding
+
+if TYPE_CHECKING:
+    from opentelemetry.metrics import CallbackOptions, Observation
+    from opentelemetry.sdk.metrics._internal.aggregation import (
+        AggregationTemporality,
+    )
+    from opentelemetry.sdk.metrics.export import MetricsData
+    from opentelemetry.sdk.metrics.view import Aggregation
+    from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor
+    from opentelemetry.sdk.trace.sampling import Sampler
+
+_T = TypeVar("_T", int, float)
+_ExporterT = TypeVar("_ExporterT")
+
+DEFAULT_MAX_QUEUE_SIZE = 8192
+"""Spans buffered for export, four times the SDK default to absorb bursts."""
+
+DEFAULT_MAX_EXPORT_BATCH_SIZE = 1024
+"""Spans per export request, twice the SDK default."""
+
+DEFAULT_SCHEDULE_DELAY_MILLIS = 1000.0
+"""Delay between two exports, a fifth of the SDK default to drain sooner."""
+
+DEFAULT_EXPORT_TIMEOUT_MILLIS = 10_000.0
+"""Timeout of an export, a third of the SDK default so a stuck collector
+does not stall the export thread for long."""
+
+DEFAULT_SHED_LOAD_ABOVE = 0.8
+"""Fill ratio of the span queue above which optional work is shed."""
+
+QUEUE_SIZE_METRIC = "otel.span_queue.size"
+"""Name of the gauge of the number of spans waiting for export."""
+
+DROPPED_SPANS_METRIC = "otel.span_queue.dropped"
+"""Name of the counter of the spans dropped because the queue was full."""
+
+_OTLP_PROTOCOLS = ("grpc", "http/protobuf")
+
+
+def _no_op() -> None:
+    pass
+
+
+class _PerProcess(Generic[_ExporterT]):
+    """Exporter created on first use in each process."""
+
+    def __init__(self, factory: Callable[[], _ExporterT]) -> None:
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+        self._exporter: _ExporterT | None = None
+        if hasattr(os, "register_at_fork"):
+            # The lock may have been held by another thread of the parent
+            at_fork_reinit = weakref.WeakMethod(self._at_fork_reinit)
+            os.register_at_fork(after_in_child=lambda: (at_fork_reinit() or _no_op)())
+
+    def _at_fork_reinit(self) -> None:
+        self._lock = threading.Lock()
+
+    def get(self) -> _ExporterT:
+        exporter, pid = self._exporter, os.getpid()
+        if exporter is not None and self._pid == pid:
+            return exporter
+        with self._lock:
+            if self._exporter is None or self._pid != pid:
+                self._exporter = self._factory()
+                self._pid = pid
+            return self._exporter
+
+    def current(self) -> _ExporterT | None:
+        """Return the exporter of this process, if created, never an inherited one."""
+        return self._exporter if self._pid == os.getpid() else None
+
+
+class ForkSafeSpanExporter(SpanExporter):
+    """Span exporter creating its delegate in the process that exports.
+
+    The delegate is created on the first export of each process, so children
+    forked after the parent exported get their own exporter. The inherited one
+    is left untouched, as closing a connection of the parent is not safe.
+    """
+
+    def __init__(self, factory: Callable[[], SpanExporter]) -> None:
+        """Initialize the exporter.
+
+        Args:
+            factory: Creates the delegate exporter, e.g. ``OTLPSpanExporter``.
+
+        """
+        self._exporter = _PerProcess(factory)
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        """Export the spans with the exporter of this process."""
+        return self._exporter.get().export(spans)
+
+    def shutdown(self) -> None:
+        """Shut the exporter of this process down, if it was created."""
+        exporter = self._exporter.current()
+        if exporter is not None:
+            exporter.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        """Flush the exporter of this process, if it was created."""
+        exporter = self._exporter.current()
+        return exporter.force_flush(timeout_millis) if exporter is not None else True
+
+
+class ForkSafeMetricExporter(MetricExporter):
+    """Metric exporter creating its delegate in the process that exports.
+
+    See `ForkSafeSpanExporter`. The delegate is only created on export, so the
+    temporality and aggregation preferences are given upfront.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], MetricExporter],
+        *,
+        preferred_temporality: dict[type, AggregationTemporality] | None = None,
+        preferred_aggregation: dict[type, Aggregation] | None = None,
+    ) -> None:
+        """Initialize the exporter.
+
+        Args:
+            factory: Creates the delegate exporter, e.g. ``OTLPMetricExporter``.
+            preferred_temporality: Temporality per instrument type, see
+                `MetricExporter`.
+            preferred_aggregation: Aggregation per instrument type, see
+                `MetricExporter`.
+
+        """
+        super().__init__(preferred_temporality or {}, preferred_aggregation or {})
+        self._exporter = _PerProcess(factory)
+
+    def export(
+        self,
+        metrics_data: MetricsData,
+        timeout_millis: float = 10_000,
+        **kwargs: object,
+    ) -> MetricExportResult:
+        """Export the metrics with the exporter of this process."""
+        return self._exporter.get().export(metrics_data, timeout_millis, **kwargs)
+
+    def force_flush(self, timeout_millis: float = 10_000) -> bool:
+        """Flush the exporter of this process, if it was created."""
+        exporter = self._exporter.current()
+        return exporter.force_flush(timeout_millis) if exporter is not None else True
+
+    def shutdown(self, timeout_millis: float = 30_000, **kwargs: object) -> None:
+        """Shut the exporter of this process down, if it was created."""
+        exporter = self._exporter.current()
+        if exporter is not None:
+            exporter.shutdown(timeout_millis, **kwargs)
+
+
+class Providers(NamedTuple):
+    """Providers installed by `install_providers`."""
+
+    tracer_provider: TracerProvider
+    meter_provider: MeterProvider
+
+
+def _new_batch_span_processor(span_exporter: SpanExporter) -> SpanProcessor:
+    return BatchSpanProcessor(span_exporter)
+
+
+def install_providers(  # noqa: PLR0913
+    span_exporter_factory: Callable[[], SpanExporter] | None = None,
+    metric_exporter_factory: Callable[[], MetricExporter] | None = None,
+    *,
+    resource: Resource | None = None,
+    sampler: Sampler | None = None,
+    span_processor_factory: Callable[
+        [SpanExporter], SpanProcessor
+    ] = _new_batch_span_processor,
+    metric_export_interval_millis: float | None = None,
+    set_global: bool = True,
+) -> Providers:
+    """Create the tracer and meter providers with fork-safe exporters.
+
+    Call it once, in the parent process before forking. Spans and metrics
+    recorded in a child are exported by exporters created in that child, see
+    `ForkSafeSpanExporter`, while the SDK span processor and metric reader
+    restart their threads and drop the parent's queued data after the fork.
+
+    Args:
+        span_exporter_factory: Creates the span exporter of each process. No
+            span processor is added if None.
+        metric_exporter_factory: Creates the metric exporter of each process.
+            No metric reader is added if None.
+        resource: Resource of both providers. Defaults to the SDK default
+            resource.
+        sampler: Sampler of the tracer provider. Defaults to the SDK default,
+            configured with ``OTEL_TRACES_SAMPLER``.
+        span_processor_factory: Wraps the span exporter in a span processor.
+            Defaults to a `BatchSpanProcessor` configured with the
+            ``OTEL_BSP_*`` environment variables.
+        metric_export_interval_millis: Interval between metric exports.
+            Defaults to ``OTEL_METRIC_EXPORT_INTERVAL``.
+        set_global: Install the providers as the global tracer and meter
+            providers. The global providers can only be set once per process.
+
+    Returns:
+        The tracer and meter providers.
+
+    """
+    if resource is None:
+        resource = Resource.create({})
+    tracer_provider = TracerProvider(sampler=sampler, resource=resource)
+    if span_exporter_factory is not None:
+        tracer_provider.add_span_processor(
+            span_processor_factory(ForkSafeSpanExporter(span_exporter_factory))
+        )
+
+    metric_readers = (
+        [
+            PeriodicExportingMetricReader(
+                ForkSafeMetricExporter(metric_exporter_factory),
+                export_interval_millis=metric_export_interval_millis,
+            )
+        ]
+        if metric_exporter_factory is not None
+        else []
+    )
+    meter_provider = MeterProvider(metric_readers=metric_readers, resource=resource)
+
+    if set_global:
+        trace.set_tracer_provider(tracer_provider)
+        metrics.set_meter_provider(meter_provider)
+    return Providers(tracer_provider, meter_provider)
+
+
+class MonitoredBatchSpanProcessor(BatchSpanProcessor):
+    """Batch span processor measuring its queue and the spans it drops.
+
+    The SDK processor drops the oldest queued span when a span ends while the
+    queue is full, and only logs the first drop. This one counts every drop
+    and tells when the queue is near full, to shed load before it is.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        span_exporter: SpanExporter,
+        max_queue_size: int | None = None,
+        schedule_delay_millis: float | None = None,
+        max_export_batch_size: int | None = None,
+        export_timeout_millis: float | None = None,
+        *,
+        shed_load_above: float = DEFAULT_SHED_LOAD_ABOVE,
+    ) -> None:
+        """Initialize the processor.
+
+        Args:
+            span_exporter: Exporter of the batches.
+            max_queue_size: See `BatchSpanProcessor`.
+            schedule_delay_millis: See `BatchSpanProcessor`.
+            max_export_batch_size: See `BatchSpanProcessor`.
+            export_timeout_millis: See `BatchSpanProcessor`.
+            shed_load_above: Fill ratio of the queue above which
+                `is_near_full` is true.
+
+        """
+        if max_queue_size is None:
+            max_queue_size = self._default_max_queue_size()
+        if schedule_delay_millis is None:
+            schedule_delay_millis = self._default_schedule_delay_millis()
+        if max_export_batch_size is None:
+            max_export_batch_size = self._default_max_export_batch_size()
+        if export_timeout_millis is None:
+            export_timeout_millis = self._default_export_timeout_millis()
+        super().__init__(
+            span_exporter,
+            max_queue_size,
+            schedule_delay_millis,
+            max_export_batch_size,
+            export_timeout_millis,
+        )
+        self.shed_load_above = shed_load_above
+        self._near_full_size = max(int(self.max_queue_size * shed_load_above), 1)
+        self._dropped_spans = 0
+        self._dropped_lock = threading.Lock()
+        self._dropped_counter: metrics.Counter | None = None
+
+    @property
+    def queue_size(self) -> int:
+        """Number of spans waiting for export."""
+        return len(self.queue)
+
+    @property
+    def dropped_spans(self) -> int:
+        """Number of spans dropped because the queue was full."""
+        return self._dropped_spans
+
+    def is_near_full(self) -> bool:
+        """Whether the queue is filled above ``shed_load_above``."""
+        return len(self.queue) >= self._near_full_size
+
+    def on_end(self, span: ReadableSpan) -> None:
+        """Queue the span for export, counting the span it drops if full.
+
+        Spans without a span context cannot be sampled, so they are skipped.
+        """
+        if span.context is None:
+            return
+        if (
+            len(self.queue) >= self.max_queue_size
+            and not self.done
+            and span.context.trace_flags.sampled
+        ):
+            with self._dropped_lock:
+                self._dropped_spans += 1
+            if self._dropped_counter is not None:
+                self._dropped_counter.add(1)
+        super().on_end(span)
+
+    def _observe_queue_size(self, _: CallbackOptions) -> Iterable[Observation]:
+        return [metrics.Observation(len(self.queue))]
+
+    def instrument(self, meter_provider: metrics.MeterProvider | None = None) -> None:
+        """Report the queue size and the dropped spans as metrics.
+
+        Args:
+            meter_provider: Provider of the meter. Defaults to the global meter
+                provider.
+
+        """
+        meter = metrics.get_meter(__name__, meter_provider=meter_provider)
+        meter.create_observable_gauge(
+            QUEUE_SIZE_METRIC,
+            callbacks=[self._observe_queue_size],
+            unit="{span}",
+            description="Spans waiting for export.",
+        )
+        self._dropped_counter = meter.create_counter(
+            DROPPED_SPANS_METRIC,
+            unit="{span}",
+            description="Spans dropped because the export queue was full.",
+        )
+
+
+class TracingConfiguration(NamedTuple):
+    """Providers and span processor installed by `configure_tracing`."""
+
+    tracer_provider: TracerProvider
+    meter_provider: MeterProvider
+    span_processor: MonitoredBatchSpanProcessor
+
+
+def _env_number(name: str, type_: Callable[[str], _T]) -> _T | None:
+    """Read a numeric environment variable, None if unset or invalid."""
+    try:
+        return type_(os.environ[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def _otlp_exporter_factories(
+    protocol: str, endpoint: str | None, *, compression: bool
+) -> tuple[functools.partial[SpanExporter], functools.partial[MetricExporter]]:
+    """Create the factories of the OTLP span and metric exporters."""
+    # The exporters load grpc or requests, so they are only imported when used
+    compress = compression and not (
+        "OTEL_EXPORTER_OTLP_COMPRESSION" in os.environ
+        or "OTEL_EXPORTER_OTLP_TRACES_COMPRESSION" in os.environ
+    )
+    if protocol == "grpc":
+        import grpc
+        from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import (
+            OTLPMetricExporter,
+        )
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        codec = grpc.Compression.Gzip if compress else None
+        return (
+            functools.partial(OTLPSpanExporter, endpoint=endpoint, compression=codec),
+            functools.partial(OTLPMetricExporter, endpoint=endpoint, compression=codec),
+        )
+
+    from opentelemetry.exporter.otlp.proto.http import Compression
+    from opentelemetry.exporter.otlp.proto.http.metric_exporter import (
+        OTLPMetricExporter as OTLPHTTPMetricExporter,
+    )
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+        OTLPSpanExporter as OTLPHTTPSpanExporter,
+    )
+
+    codec = Compression.Gzip if compress else None
+    base_endpoint = endpoint.rstrip("/") if endpoint is not None else None
+    return (
+        functools.partial(
+            OTLPHTTPSpanExporter,
+            endpoint=base_endpoint and f"{base_endpoint}/v1/traces",
+            compression=codec,
+        ),
+        functools.partial(
+            OTLPHTTPMetricExporter,
+            endpoint=base_endpoint and f"{base_endpoint}/v1/metrics",
+            compression=codec,
+        ),
+    )
+
+
+def configure_tracing(  # noqa: PLR0913
+    *,
+    service_name: str | None = None,
+    protocol: str | None = None,
+    endpoint: str | None = None,
+    compression: bool = True,
+    export_metrics: bool = True,
+    max_queue_size: int | None = None,
+    max_export_batch_size: int | None = None,
+    schedule_delay_millis: float | None = None,
+    export_timeout_millis: float | None = None,
+    shed_load_above: float | None = DEFAULT_SHED_LOAD_ABOVE,
+    sampler: Sampler | None = None,
+    span_exporter_factory: Callable[[], SpanExporter] | None = None,
+    metric_exporter_factory: Callable[[], MetricExporter] | None = None,
+    set_global: bool = True,
+) -> TracingConfiguration:
+    """Set up OTLP export of spans and metrics tuned for bursty consumers.
+
+    Built on `install_providers`, so the exporters are fork-safe. Spans go
+    through a `MonitoredBatchSpanProcessor` whose queue size and drops are
+    reported as metrics. The batch settings default to the standard
+    ``OTEL_BSP_*`` environment variables, and to the throughput-oriented
+    ``DEFAULT_*`` values of this module when they are not set.
+
+    Args:
+        service_name: ``service.name`` of the resource. Defaults to
+            ``OTEL_SERVICE_NAME``.
+        protocol: ``grpc`` or ``http/protobuf``. Defaults to
+            ``OTEL_EXPORTER_OTLP_PROTOCOL``, else ``grpc``.
+        endpoint: Collector endpoint. Defaults to the OTLP environment
+            variables. HTTP signal paths are appended to it.
+        compression: Compress exports with gzip, unless an OTLP compression
+            environment variable is set.
+        export_metrics: Export metrics, including the span queue metrics.
+        max_queue_size: Spans buffered for export.
+        max_export_batch_size: Spans per export request.
+        schedule_delay_millis: Delay between two exports.
+        export_timeout_millis: Timeout of an export.
+        shed_load_above: Fill ratio of the span queue above which the
+            decorators skip optional work, see `load_shedding`. None disables
+            load shedding.
+        sampler: Sampler of the tracer provider.
+        span_exporter_factory: Creates the span exporter instead of OTLP.
+        metric_exporter_factory: Creates the metric exporter instead of OTLP.
+        set_global: Install the providers and the load shedding hook
+            globally.
+
+    Returns:
+        The providers and the span processor.
+
+    """
+    protocol = protocol or os.environ.get("OTEL_EXPORTER_OTLP_PROTOCOL", "grpc")
+    if protocol not in _OTLP_PROTOCOLS:
+        msg = f"Unsupported OTLP protocol {protocol!r}"
+        raise ValueError(msg)
+    if span_exporter_factory is None or (
+        export_metrics and metric_exporter_factory is None
+    ):
+        otlp_span_factory, otlp_metric_factory = _otlp_exporter_factories(
+            protocol, endpoint, compression=compression
+        )
+        span_exporter_factory = span_exporter_factory or otlp_span_factory
+        metric_exporter_factory = metric_exporter_factory or otlp_metric_factory
+
+    queue_size = (
+        max_queue_size
+        or _env_number("OTEL_BSP_MAX_QUEUE_SIZE", int)
+        or DEFAULT_MAX_QUEUE_SIZE
+    )
+    batch_size = (
+        max_export_batch_size
+        or _env_number("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", int)
+        or min(DEFAULT_MAX_EXPORT_BATCH_SIZE, queue_size)
+    )
+    schedule_delay = (
+        schedule_delay_millis
+        or _env_number("OTEL_BSP_SCHEDULE_DELAY", float)
+        or DEFAULT_SCHEDULE_DELAY_MILLIS
+    )
+    export_timeout = (
+        export_timeout_millis
+        or _env_number("OTEL_BSP_EXPORT_TIMEOUT", float)
+        or DEFAULT_EXPORT_TIMEOUT_MILLIS
+    )
+    span_processors: list[MonitoredBatchSpanProcessor] = []
+
+    def new_span_processor(exporter: SpanExporter) -> MonitoredBatchSpanProcessor:
+        processor = MonitoredBatchSpanProcessor(
+            exporter,
+            max_queue_size=queue_size,
+            schedule_delay_millis=schedule_delay,
+            max_export_batch_size=batch_size,
+            export_timeout_millis=export_timeout,
+            shed_load_above=(
+                DEFAULT_SHED_LOAD_ABOVE if shed_load_above is None else shed_load_above
+            ),
+        )
+        span_processors.append(processor)
+        return processor
+
+    providers = install_providers(
+        span_exporter_factory,
+        metric_exporter_factory if export_metrics else None,
+        resource=Resource.create({SERVICE_NAME: service_name})
+        if service_name is not None
+        else None,
+        sampler=sampler,
+        span_processor_factory=new_span_processor,
+        set_global=set_global,
+    )
+    (span_processor,) = span_processors
+    span_processor.instrument(providers.meter_provider)
+    if set_global and shed_load_above is not None:
+        load_shedding.set_hook(span_processor.is_near_full)
+    return TracingConfiguration(
+        providers.tracer_provider, providers.meter_provider, span_processor
+    )
@@ -0,0 +1,27 @@
+"""Lazy access to the Dapr response types.
+
+``dapr.clients`` loads grpc and protobuf, which services only propagating the
+trace context do not need, so the response types are imported on first use.
+"""
+
+from __future__ import annotations
+
+import functools
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from dapr.clients.grpc._response import (
+        TopicEventResponse,
+        TopicEventResponseStatus,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def response_types() -> tuple[type[TopicEventResponse], type[TopicEventResponseStatus]]:
+    """Import and return `TopicEventResponse` and `TopicEventResponseStatus`."""
+    from dapr.clients.grpc._response import (
+        TopicEventResponse,
+        TopicEventResponseStatus,
+    )
+
+    return TopicEventResponse, TopicEventResponseStatus
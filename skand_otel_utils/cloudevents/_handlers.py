@@ -0,0 +1,37 @@
+"""Wrapping of synchronous and ``async def`` CloudEvent handlers.
+
+Decorators are typed with a TypeVar constrained to the synchronous and the
+asynchronous handler types, which ``inspect.iscoroutinefunction`` does not
+narrow, so the handler kind is dispatched on, and the wrapper cast back to the
+type of the handler, in a single place.
+"""
+
+from __future__ import annotations
+
+import inspect
+from typing import Any, Awaitable, Callable, TypeVar, cast
+
+_HandlerT = TypeVar("_HandlerT", bound=Callable[..., Any])
+_ArgT = TypeVar("_ArgT")
+_ResultT = TypeVar("_ResultT")
+
+
+def wrap_handler(
+    func: _HandlerT,
+    wrap_sync: Callable[[Callable[[_ArgT], _ResultT]], Callable[[_ArgT], _ResultT]],
+    wrap_async: Callable[
+        [Callable[[_ArgT], Awaitable[_ResultT]]],
+        Callable[[_ArgT], Awaitable[_ResultT]],
+    ],
+) -> _HandlerT:
+    """Wrap a handler with the wrapper matching its kind, keeping its type.
+
+    Args:
+        func: Synchronous or ``async def`` handler.
+        wrap_sync: Wraps a synchronous handler.
+        wrap_async: Wraps an ``async def`` handler.
+
+    """
+    if inspect.iscoroutinefunction(func):
+        return cast(_HandlerT, wrap_async(func))
+    return cast(_HandlerT, wrap_sync(func))
@@ -0,0 +1,23 @@
+"""Typed access to `opentelemetry.trace.use_span`.
+
+``use_span`` and ``Tracer.start_as_current_span`` are typed with a
+``ParamSpec`` only defined on Python 3.10+, so on Python 3.8 type checkers see
+no parameters at all; the signature of ``use_span`` is restored here, and spans
+are started with ``Tracer.start_span`` and made current with it.
+"""
+
+from __future__ import annotations
+
+from typing import ContextManager, Protocol, cast
+
+from opentelemetry import trace
+
+
+class _UseSpan(Protocol):
+    def __call__(
+        self, span: trace.Span, *, end_on_exit: bool = False
+    ) -> ContextManager[trace.Span]: ...
+
+
+use_span = cast("_UseSpan", trace.use_span)
+"""`trace.use_span`: make a span current, and optionally end it, on exit."""
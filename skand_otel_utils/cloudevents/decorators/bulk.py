@@ -0,0 +1,253 @@
+"""Trace decorators for Dapr bulk subscription handlers.
+
+A bulk handler receives a batch of CloudEvents and returns either one
+`TopicEventResponse` for the whole batch or one response per entry, in the
+order of the events.
+
+```python
+@bulk.setup()
+@bulk.set_span_events_from_events(
+    name="event payload", event_extractor=trace_span.extract_payload_from_cloudevent
+)
+@bulk.set_span_status_from_bulk_handler_result
+def handler(events: Sequence[v1.Event]) -> Sequence[TopicEventResponse]:
+    pass
+```
+"""
+
+from __future__ import annotations
+
+import functools
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Callable, Sequence
+
+from opentelemetry import trace
+
+from skand_otel_utils import load_shedding, propagator
+from skand_otel_utils.cloudevents import _dapr, payload
+from skand_otel_utils.cloudevents._handlers import wrap_handler
+from skand_otel_utils.cloudevents._spans import use_span
+from skand_otel_utils.cloudevents.decorators.distributed_trace_context import (
+    compile_pipelines,
+    new_miss_logger,
+)
+
+if TYPE_CHECKING:
+    from cloudevents.sdk.event import v1
+
+    from skand_otel_utils.cloudevents.diagnostics import RateLimitedLogger
+    from skand_otel_utils.cloudevents.types import (
+        AsyncBulkCloudEventHandler,
+        BulkCloudEventHandler,
+        BulkCloudEventHandlerT,
+        BulkTopicEventResponse,
+        TraceparentExtraction,
+        TraceparentExtractorFunc,
+    )
+
+BATCH_MESSAGE_COUNT_ATTRIBUTE = "messaging.batch.message_count"
+"""Span attribute holding the number of events in the batch."""
+
+BULK_STATUS_COUNT_ATTRIBUTE_PREFIX = "cloudevents.bulk.status."
+"""Prefix of the span attributes counting entries per response status."""
+
+
+def _extract_links(
+    events: Sequence[v1.Event],
+    extract_traceparent: Callable[[v1.Event], TraceparentExtraction],
+    miss_logger: RateLimitedLogger,
+) -> list[trace.Link]:
+    """Extract one span link per distinct upstream span context in the batch."""
+    span_contexts: dict[tuple[int, int], trace.SpanContext] = {}
+    missing = 0
+    for event in events:
+        carrier, _ = extract_traceparent(event)
+        span_context = (
+            trace.get_current_span(
+                propagator.extract_context_from_carrier(carrier)
+            ).get_span_context()
+            if carrier
+            else None
+        )
+        if span_context is None or not span_context.is_valid:
+            missing += 1
+        else:
+            key = (span_context.trace_id, span_context.span_id)
+            span_contexts.setdefault(key, span_context)
+
+    if missing:
+        miss_logger.log("Failed to extract traceparent from %d bulk events.", missing)
+    return [trace.Link(span_context) for span_context in span_contexts.values()]
+
+
+def setup(  # noqa: PLR0913
+    pipelines: Sequence[TraceparentExtractorFunc] | None = None,
+    *,
+    span_name: str = "process bulk events",
+    share_payload: bool = False,
+    payload_decoder: payload.PayloadDecoder | None = None,
+    tracer_provider: trace.TracerProvider | None = None,
+    miss_logger: RateLimitedLogger | None = None,
+) -> Callable[[BulkCloudEventHandlerT], BulkCloudEventHandlerT]:
+    """Trace a bulk handler with one batch span linked to every upstream trace.
+
+    Traceparents of the whole batch are extracted in one pass with the same
+    compiled pipelines as `distributed_trace_context.setup`. A single consumer
+    span is started around the handler, with a span link to each distinct
+    upstream span context, so no event of the batch is treated as the parent.
+
+    Args:
+        pipelines: Traceparent extractors, see `distributed_trace_context.setup`.
+        span_name: Name of the batch span.
+        share_payload: Decode the data of each event at most once, see
+            `distributed_trace_context.setup`.
+        payload_decoder: Decoder used when ``share_payload`` is enabled.
+        tracer_provider: Provider of the batch span tracer. Defaults to the
+            global tracer provider.
+        miss_logger: Rate-limited logger reporting batches with events without
+            a traceparent, see `distributed_trace_context.setup`.
+
+    """
+    extract_traceparent = compile_pipelines(pipelines)
+    if miss_logger is None:
+        miss_logger = new_miss_logger()
+    tracer = trace.get_tracer(__name__, tracer_provider=tracer_provider)
+
+    def start_span(events: Sequence[v1.Event]) -> trace.Span:
+        if share_payload:
+            for event in events:
+                payload.share(event, payload_decoder)
+        return tracer.start_span(
+            span_name,
+            kind=trace.SpanKind.CONSUMER,
+            links=_extract_links(events, extract_traceparent, miss_logger),
+            attributes={BATCH_MESSAGE_COUNT_ATTRIBUTE: len(events)},
+        )
+
+    def wrap_async(func: AsyncBulkCloudEventHandler) -> AsyncBulkCloudEventHandler:
+        @functools.wraps(func)
+        async def async_wrapper(events: Sequence[v1.Event]) -> BulkTopicEventResponse:
+            with use_span(start_span(events), end_on_exit=True):
+                return await func(events)
+
+        return async_wrapper
+
+    def wrap_sync(func: BulkCloudEventHandler) -> BulkCloudEventHandler:
+        @functools.wraps(func)
+        def wrapper(events: Sequence[v1.Event]) -> BulkTopicEventResponse:
+            with use_span(start_span(events), end_on_exit=True):
+                return func(events)
+
+        return wrapper
+
+    def decorator(func: BulkCloudEventHandlerT) -> BulkCloudEventHandlerT:
+        return wrap_handler(func, wrap_sync, wrap_async)
+
+    return decorator
+
+
+def set_span_events_from_events(
+    name: str,
+    event_extractor: Callable[[v1.Event], Any],
+) -> Callable[[BulkCloudEventHandlerT], BulkCloudEventHandlerT]:
+    """Add one span event per CloudEvent of the batch.
+
+    No span event is added while `load_shedding.should_shed`, as for
+    `trace_span.set_span_event_from_event`.
+
+    Args:
+        name: Name of the span events
+        event_extractor: Function to extract data from each event for span
+            event attributes
+
+    """
+
+    def add_events(events: Sequence[v1.Event]) -> None:
+        span = trace.get_current_span()
+        if not span.is_recording() or load_shedding.should_shed():
+            return
+        for event in events:
+            span.add_event(name, event_extractor(event))
+
+    def wrap_async(func: AsyncBulkCloudEventHandler) -> AsyncBulkCloudEventHandler:
+        @functools.wraps(func)
+        async def async_wrapper(events: Sequence[v1.Event]) -> BulkTopicEventResponse:
+            add_events(events)
+            return await func(events)
+
+        return async_wrapper
+
+    def wrap_sync(func: BulkCloudEventHandler) -> BulkCloudEventHandler:
+        @functools.wraps(func)
+        def wrapper(events: Sequence[v1.Event]) -> BulkTopicEventResponse:
+            add_events(events)
+            return func(events)
+
+        return wrapper
+
+    def decorator(func: BulkCloudEventHandlerT) -> BulkCloudEventHandlerT:
+        return wrap_handler(func, wrap_sync, wrap_async)
+
+    return decorator
+
+
+def _set_span_status_from_bulk_result(
+    events: Sequence[v1.Event], result: BulkTopicEventResponse
+) -> None:
+    response_type, status_type = _dapr.response_types()
+    if isinstance(result, response_type):
+        statuses = Counter({result.status: len(events)})
+    elif isinstance(result, Sequence):
+        statuses = Counter(
+            response.status
+            for response in result
+            if isinstance(response, response_type)
+        )
+    else:
+        return
+
+    span = trace.get_current_span()
+    span.set_attributes(
+        {
+            f"{BULK_STATUS_COUNT_ATTRIBUTE_PREFIX}{status.name}": count
+            for status, count in statuses.items()
+        }
+    )
+    failed = sum(statuses.values()) - statuses[status_type.success]
+    if failed:
+        span.set_status(
+            trace.StatusCode.ERROR, f"{failed} of {len(events)} entries failed"
+        )
+    elif statuses:
+        span.set_status(trace.StatusCode.OK)
+
+
+def set_span_status_from_bulk_handler_result(
+    func: BulkCloudEventHandlerT,
+) -> BulkCloudEventHandlerT:
+    """Set the span status from the per-entry results of a bulk handler.
+
+    The span is OK when every entry succeeded and ERROR when any entry is
+    retried or dropped; the number of entries per status is recorded as span
+    attributes.
+    """
+
+    def wrap_async(func: AsyncBulkCloudEventHandler) -> AsyncBulkCloudEventHandler:
+        @functools.wraps(func)
+        async def async_wrapper(events: Sequence[v1.Event]) -> BulkTopicEventResponse:
+            result = await func(events)
+            _set_span_status_from_bulk_result(events, result)
+            return result
+
+        return async_wrapper
+
+    def wrap_sync(func: BulkCloudEventHandler) -> BulkCloudEventHandler:
+        @functools.wraps(func)
+        def wrapper(events: Sequence[v1.Event]) -> BulkTopicEventResponse:
+            result = func(events)
+            _set_span_status_from_bulk_result(events, result)
+            return result
+
+        return wrapper
+
+    return wrap_handler(func, wrap_sync, wrap_async)
@@ -0,0 +1,320 @@
+"""Decorator dropping CloudEvents redelivered within a time window.
+
+Dapr pub/sub delivers at least once, and brokers redeliver bursts of events
+when they rebalance. The decorator remembers the events it recently handled
+successfully and answers their redeliveries without calling the handler:
+
+```python
+@app.subscribe(pubsub_name="YOUR_PUBSUB_NAME", topic="YOUR_TOPIC")
+@distributed_trace_context.setup(consumer_span=True)
+@deduplicate.setup()
+def handler(event: v1.Event) -> TopicEventResponse:
+    pass
+```
+
+Placed under `distributed_trace_context.setup`, duplicates are recorded as a
+span event of the span of the redelivered event.
+"""
+
+from __future__ import annotations
+
+import enum
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Hashable, Mapping
+
+from opentelemetry import metrics, trace
+
+from skand_otel_utils.cloudevents import _dapr
+from skand_otel_utils.cloudevents._handlers import wrap_handler
+
+if TYPE_CHECKING:
+    from cloudevents.sdk.event import v1
+    from dapr.clients.grpc._response import TopicEventResponse
+
+    from skand_otel_utils.cloudevents.types import (
+        AsyncCloudEventHandler,
+        CloudEventHandler,
+        CloudEventHandlerT,
+    )
+
+DEFAULT_MAX_EVENTS = 10_000
+"""Default number of events remembered, the oldest being forgotten first."""
+
+DEFAULT_WINDOW_SECONDS = 300.0
+"""Default time, in seconds, during which a redelivery is a duplicate."""
+
+DUPLICATE_SPAN_EVENT_NAME = "cloudevents.duplicate"
+"""Name of the span event recorded for each duplicate."""
+
+DUPLICATE_COUNTER_NAME = "cloudevents.duplicates"
+"""Name of the counter of duplicates."""
+
+
+def event_key(event: v1.Event) -> Hashable:
+    """Identify an event by its id, source and traceparent extension.
+
+    The id is only unique per source, and including the traceparent tells an
+    id reused by a new publish apart from a redelivery.
+    """
+    return event.id, event.source, event.extensions.get("traceparent")
+
+
+class Delivery(enum.Enum):
+    """Outcome of `SeenEvents.start` for a delivery of an event."""
+
+    NEW = "new"
+    """Neither seen in the window nor in flight: the delivery is handled."""
+
+    SEEN = "seen"
+    """Handled successfully in the window."""
+
+    IN_FLIGHT = "in_flight"
+    """Being handled by a concurrent delivery, which may still fail."""
+
+
+class SeenEvents:
+    """Thread-safe set of the keys seen in a sliding time window.
+
+    Keys are kept in insertion order, which is also their expiry order, so
+    adding, looking up and forgetting a key, and evicting the expired and
+    excess keys, take amortised constant time under a single short lock. The
+    keys of the deliveries being handled are kept apart, in flight, until
+    their handling finishes.
+    """
+
+    def __init__(
+        self,
+        max_events: int = DEFAULT_MAX_EVENTS,
+        window_seconds: float = DEFAULT_WINDOW_SECONDS,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize an empty set.
+
+        Args:
+            max_events: Number of keys remembered. The oldest keys are
+                forgotten first, even within the window.
+            window_seconds: Time, in seconds, a key is remembered after it was
+                first added.
+            clock: Monotonic clock, in seconds.
+
+        """
+        if max_events < 1:
+            msg = "max_events must be positive"
+            raise ValueError(msg)
+        if window_seconds <= 0:
+            msg = "window_seconds must be positive"
+            raise ValueError(msg)
+        self.max_events = max_events
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._seen: OrderedDict[Hashable, float] = OrderedDict()
+        self._in_flight: set[Hashable] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of keys remembered, expired ones included."""
+        return len(self._seen)
+
+    def add(self, key: Hashable) -> bool:
+        """Add a key, returning False if it was already seen in the window.
+
+        The window of a key starts when it is first added: seeing it again
+        does not extend it.
+        """
+        now = self._clock()
+        with self._lock:
+            if self._is_seen(key, now):
+                return False
+            self._remember(key, now)
+            return True
+
+    def start(self, key: Hashable) -> Delivery:
+        """Mark a key in flight, unless it was seen in the window or is in flight.
+
+        Each `Delivery.NEW` must be followed by `finish`.
+        """
+        now = self._clock()
+        with self._lock:
+            if self._is_seen(key, now):
+                return Delivery.SEEN
+            if key in self._in_flight:
+                return Delivery.IN_FLIGHT
+            self._in_flight.add(key)
+            return Delivery.NEW
+
+    def finish(self, key: Hashable, *, succeeded: bool) -> None:
+        """Take a key out of flight, adding it if its handling succeeded."""
+        now = self._clock()
+        with self._lock:
+            self._in_flight.discard(key)
+            if succeeded:
+                self._remember(key, now)
+
+    def _is_seen(self, key: Hashable, now: float) -> bool:
+        added_at = self._seen.get(key)
+        return added_at is not None and added_at > now - self.window_seconds
+
+    def _remember(self, key: Hashable, now: float) -> None:
+        seen = self._seen
+        seen.pop(key, None)
+        seen[key] = now
+        while len(seen) > self.max_events:
+            seen.popitem(last=False)
+        expired_before = now - self.window_seconds
+        while True:
+            oldest, oldest_added_at = next(iter(seen.items()))
+            if oldest_added_at > expired_before:
+                return
+            del seen[oldest]
+
+    def discard(self, key: Hashable) -> None:
+        """Forget a key, so that it is not a duplicate when seen again."""
+        with self._lock:
+            self._seen.pop(key, None)
+
+
+class _Deduplication:
+    """Per-handler seen-set, responses and instruments."""
+
+    def __init__(
+        self,
+        *,
+        seen: SeenEvents,
+        key: Callable[[v1.Event], Hashable],
+        duplicate_response: TopicEventResponse,
+        meter_provider: metrics.MeterProvider | None,
+        attributes: Mapping[str, str] | None,
+    ) -> None:
+        self.seen = seen
+        self.key = key
+        self.duplicate_response = duplicate_response
+        response_type, status_type = _dapr.response_types()
+        self.response_type = response_type
+        self.success = status_type.success
+        self.in_flight_response = response_type(status_type.retry)
+        self.attributes = dict(attributes or {})
+        self.duplicates = metrics.get_meter(
+            __name__, meter_provider=meter_provider
+        ).create_counter(
+            DUPLICATE_COUNTER_NAME,
+            description="CloudEvents dropped as duplicates of a recent delivery.",
+        )
+
+    def start(self, event: v1.Event) -> tuple[Hashable, TopicEventResponse | None]:
+        """Start handling an event, returning the response of a duplicate."""
+        key = self.key(event)
+        delivery = self.seen.start(key)
+        if delivery is Delivery.NEW:
+            return key, None
+
+        self.duplicates.add(1, self.attributes)
+        span = trace.get_current_span()
+        if span.is_recording():
+            span.add_event(
+                DUPLICATE_SPAN_EVENT_NAME,
+                {
+                    "event_id": str(event.id),
+                    "event_source": str(event.source),
+                    "in_flight": delivery is Delivery.IN_FLIGHT,
+                },
+            )
+        if delivery is Delivery.IN_FLIGHT:
+            return key, self.in_flight_response
+        return key, self.duplicate_response
+
+    def is_success(self, result: object) -> bool:
+        """Whether Dapr acknowledges the result, e.g. None, as a success."""
+        return not isinstance(result, self.response_type) or (
+            result.status == self.success
+        )
+
+
+def setup(  # noqa: PLR0913
+    *,
+    max_events: int = DEFAULT_MAX_EVENTS,
+    window_seconds: float = DEFAULT_WINDOW_SECONDS,
+    key: Callable[[v1.Event], Hashable] = event_key,
+    duplicate_response: TopicEventResponse | None = None,
+    meter_provider: metrics.MeterProvider | None = None,
+    attributes: Mapping[str, str] | None = None,
+    seen: SeenEvents | None = None,
+) -> Callable[[CloudEventHandlerT], CloudEventHandlerT]:
+    """Answer the redeliveries of recently handled events without the handler.
+
+    An event is remembered once its handler answers with a success, so an
+    event the handler raised on or did not succeed with is handled again when
+    the broker redelivers it. A delivery of an event still being handled is
+    answered with a retry, for the broker to redeliver it if the first
+    delivery fails.
+
+    Args:
+        max_events: Number of events remembered, see `SeenEvents`.
+        window_seconds: Time, in seconds, during which a redelivery is a
+            duplicate.
+        key: Identifies the deliveries of an event. Defaults to `event_key`.
+        duplicate_response: Response returned for duplicates of an event
+            already handled. Defaults to a success, which acknowledges the
+            redelivery.
+        meter_provider: Provider of the meter of the duplicate counter.
+            Defaults to the global meter provider.
+        attributes: Attributes of the duplicate counter, e.g. the topic.
+        seen: Seen-set shared with other handlers. Created from
+            ``max_events`` and ``window_seconds`` if None.
+
+    """
+    response_type, status_type = _dapr.response_types()
+    deduplication = _Deduplication(
+        seen=SeenEvents(max_events, window_seconds) if seen is None else seen,
+        key=key,
+        duplicate_response=(
+            response_type(status_type.success)
+            if duplicate_response is None
+            else duplicate_response
+        ),
+        meter_provider=meter_provider,
+        attributes=attributes,
+    )
+    start = deduplication.start
+    is_success = deduplication.is_success
+    finish = deduplication.seen.finish
+
+    def wrap_async(func: AsyncCloudEventHandler) -> AsyncCloudEventHandler:
+        @functools.wraps(func)
+        async def async_wrapper(event: v1.Event) -> TopicEventResponse:
+            key, duplicate_response = start(event)
+            if duplicate_response is not None:
+                return duplicate_response
+            succeeded = False
+            try:
+                result = await func(event)
+                succeeded = is_success(result)
+            finally:
+                finish(key, succeeded=succeeded)
+            return result
+
+        return async_wrapper
+
+    def wrap_sync(func: CloudEventHandler) -> CloudEventHandler:
+        @functools.wraps(func)
+        def wrapper(event: v1.Event) -> TopicEventResponse:
+            key, duplicate_response = start(event)
+            if duplicate_response is not None:
+                return duplicate_response
+            succeeded = False
+            try:
+                result = func(event)
+                succeeded = is_success(result)
+            finally:
+                finish(key, succeeded=succeeded)
+            return result
+
+        return wrapper
+
+    def decorator(func: CloudEventHandlerT) -> CloudEventHandlerT:
+        return wrap_handler(func, wrap_sync, wrap_async)
+
+    return decorator
@@ -1,51 +1,294 @@
 from __future__ import annotations
 
+import contextlib
+import fnmatch
 import functools
 import json
 import logging
-from typing import TYPE_CHECKING, Callable, Sequence
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    ContextManager,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
 
-from opentelemetry import context, trace
-from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+from opentelemetry import baggage, context, trace
+from opentelemetry.semconv.trace import SpanAttributes
+
+from skand_otel_utils import propagator
+from skand_otel_utils.cloudevents import json_scanner, payload, protobuf_scanner
+from skand_otel_utils.cloudevents._handlers import wrap_handler
+from skand_otel_utils.cloudevents._spans import use_span
+from skand_otel_utils.cloudevents.diagnostics import RateLimitedLogger
+from skand_otel_utils.cloudevents.metrics import CloudEventMetrics
 
 if TYPE_CHECKING:
     from cloudevents.sdk.event import v1
     from dapr.clients.grpc._response import TopicEventResponse
+    from opentelemetry import metrics
+    from opentelemetry.sdk.trace.id_generator import IdGenerator
+    from opentelemetry.sdk.trace.sampling import Sampler
+
+    from skand_otel_utils.cloudevents.types import (
+        AsyncCloudEventHandler,
+        CloudEventHandler,
+        CloudEventHandlerT,
+        TraceparentExtraction,
+        TraceparentExtractorFunc,
+    )
+
+    _Plan = Tuple[Tuple[TraceparentExtractorFunc, str], ...]
+
+logger = logging.getLogger(__name__)
+
+_TRACEPARENT = propagator.TRACEPARENT_HEADER
+_TRACE_KEYS = (
+    _TRACEPARENT,
+    propagator.TRACESTATE_HEADER,
+    propagator.BAGGAGE_HEADER,
+)
+_TRACE_KEY_LITERALS = tuple(f'"{key}"' for key in _TRACE_KEYS)
+_TRACE_KEY_LITERALS_BYTES = tuple(literal.encode() for literal in _TRACE_KEY_LITERALS)
+_WIDE_ENCODING_PREFIX_LENGTH = 4
+
+_ExtractorT = TypeVar("_ExtractorT", bound=Callable[..., object])
+_NeedleT = TypeVar("_NeedleT", str, bytes)
+
+MISSING_CONTENT_TYPE = ""
+"""Content type pattern matching events without a ``datacontenttype``."""
+
+JSON_CONTENT_TYPES = frozenset(
+    {
+        "application/json",
+        "application/*+json",
+        "text/json",
+        "text/plain",
+        MISSING_CONTENT_TYPE,
+    }
+)
+"""Content type patterns whose data may be JSON text."""
+
+BINARY_CONTENT_TYPES = frozenset(
+    {
+        "application/protobuf",
+        "application/x-protobuf",
+        "application/vnd.google.protobuf",
+        "application/*+protobuf",
+        "application/octet-stream",
+    }
+)
+"""Content type patterns whose data may be a protobuf message or binary frame."""
+
+TRACEPARENT_LENGTH = 55
+"""Length of a version ``00`` traceparent, the default binary header length."""
+
+_MAX_COMPILED_CONTENT_TYPES = 64
+
+MESSAGING_SYSTEM = "dapr"
+"""Value of the ``messaging.system`` attribute of consumer spans."""
+
+PUBSUB_NAME_ATTRIBUTE = "dapr.pubsub.name"
+"""Consumer span attribute holding the name of the Dapr pub/sub component."""
+
+_DAPR_TOPIC_EXTENSION = "topic"
+_DAPR_PUBSUB_NAME_EXTENSION = "pubsubname"
+
+
+@functools.lru_cache(maxsize=None)
+def _id_generator() -> IdGenerator:
+    """Create the ID generator of dropped root events, loading the SDK on use."""
+    from opentelemetry.sdk.trace.id_generator import (
+        RandomIdGenerator,
+    )
+
+    return RandomIdGenerator()
+
+
+class ExtractorMetadata(NamedTuple):
+    """Declares where a traceparent extractor applies.
+
+    Attributes:
+        content_types: Media type patterns (``fnmatch`` style, lower case and
+            without parameters) the extractor applies to, or None for any.
+
+    """
+
+    content_types: frozenset[str] | None = None
+
+
+_EXTRACTOR_METADATA_ATTRIBUTE = "__extractor_metadata__"
+
 
-    from skand_otel_utils.cloudevents.types import CloudEventHandler
+def extractor_metadata(
+    *,
+    content_types: Iterable[str] | None = None,
+) -> Callable[[_ExtractorT], _ExtractorT]:
+    """Declare the content types an extractor applies to.
+
+    Extractors without metadata apply to any content type.
+    """
+    metadata = ExtractorMetadata(
+        frozenset(content_types) if content_types is not None else None
+    )
+
+    def decorator(extractor: _ExtractorT) -> _ExtractorT:
+        setattr(extractor, _EXTRACTOR_METADATA_ATTRIBUTE, metadata)
+        return extractor
+
+    return decorator
+
+
+def get_extractor_metadata(extractor: Callable[..., object]) -> ExtractorMetadata:
+    """Return the metadata declared by `extractor_metadata`, or the defaults."""
+    return getattr(extractor, _EXTRACTOR_METADATA_ATTRIBUTE, ExtractorMetadata())
 
 
 class TraceparentExtractor:
     """Pipeline for extracting traceparent from different sources in an event."""
 
     @staticmethod
-    def from_extensions(event: v1.Event) -> str | None:
-        """Extract traceparent from event extensions."""
-        traceparent = event.extensions.get("traceparent")
+    def from_extensions(event: v1.Event) -> str | propagator.TraceCarrier | None:
+        """Extract traceparent from event extensions.
+
+        Returns a `propagator.TraceCarrier` when the extensions also hold a
+        tracestate or baggage, the traceparent alone otherwise.
+        """
+        extensions = event.extensions
+        traceparent = extensions.get(_TRACEPARENT)
         if not traceparent:
-            logging.warning("Not found traceparent from event extensions")
-        return traceparent
+            logger.debug("Not found traceparent from event extensions")
+            return traceparent
+        return _carrier(
+            traceparent,
+            extensions.get(propagator.TRACESTATE_HEADER),
+            extensions.get(propagator.BAGGAGE_HEADER),
+        )
 
     @staticmethod
-    def from_json_data(event: v1.Event) -> str | None:
-        """Extract traceparent from JSON event data."""
-        try:
-            event_data: object = json.loads(event.data)
-        except (json.JSONDecodeError, TypeError) as e:
-            msg = f"Failed to parse event data for traceparent: {e}"
-            logging.warning(msg)
-            return None
+    @extractor_metadata(content_types=JSON_CONTENT_TYPES)
+    def from_json_data(event: v1.Event) -> str | propagator.TraceCarrier | None:
+        """Extract traceparent from JSON event data.
 
-        if not isinstance(event_data, dict):
-            return None
+        Top-level tracestate and baggage members are read in the same scan, see
+        `from_extensions`. Only the first ``json_scanner.DEFAULT_MAX_SCAN_BYTES``
+        of the data are scanned, see `from_json_data_with_budget`. Events with
+        a shared payload read the members from the decoded payload instead.
+        """
+        return _carrier_from_json_data(event, json_scanner.DEFAULT_MAX_SCAN_BYTES)
 
-        traceparent = event_data.get("traceparent")
-        if not traceparent:
-            logging.warning("Not found traceparent from event data")
-        return traceparent
+    @staticmethod
+    def from_json_data_with_budget(
+        max_scan_bytes: int | None,
+    ) -> TraceparentExtractorFunc:
+        """Build a JSON data extractor with a custom scan budget.
+
+        Args:
+            max_scan_bytes: Number of leading bytes of the event data to scan for
+                a top-level traceparent, or None to scan the whole document.
+
+        """
+
+        @extractor_metadata(content_types=JSON_CONTENT_TYPES)
+        def from_json_data(event: v1.Event) -> str | propagator.TraceCarrier | None:
+            return _carrier_from_json_data(event, max_scan_bytes)
+
+        return from_json_data
+
+    @staticmethod
+    def from_protobuf_field(
+        field_number: int,
+        *,
+        tracestate_field_number: int | None = None,
+        baggage_field_number: int | None = None,
+        max_scan_bytes: int | None = protobuf_scanner.DEFAULT_MAX_SCAN_BYTES,
+    ) -> TraceparentExtractorFunc:
+        """Build an extractor reading the traceparent from a protobuf string field.
+
+        The wire format of the top-level fields is walked on a memoryview, see
+        `protobuf_scanner.scan_string_fields`, so the message is never decoded.
+
+        Args:
+            field_number: Number of the top-level string field holding the
+                traceparent.
+            tracestate_field_number: Number of the field holding the tracestate,
+                if any.
+            baggage_field_number: Number of the field holding the baggage, if any.
+            max_scan_bytes: Number of leading bytes of the event data to scan for
+                the fields, or None to scan the whole message.
+
+        """
+        field_numbers = tuple(
+            number
+            for number in (field_number, tracestate_field_number, baggage_field_number)
+            if number is not None
+        )
+
+        @extractor_metadata(content_types=BINARY_CONTENT_TYPES)
+        def from_protobuf_data(event: v1.Event) -> str | propagator.TraceCarrier | None:
+            data = _binary_data(event)
+            if data is None:
+                return None
+            try:
+                fields = protobuf_scanner.scan_string_fields(
+                    data, field_numbers, max_scan_bytes
+                )
+            except protobuf_scanner.MalformedMessageError as e:
+                logger.debug("Failed to scan event data for traceparent: %s", e)
+                return None
+
+            traceparent = fields.get(field_number)
+            if not traceparent:
+                logger.debug("Not found traceparent from event data")
+                return None
+            tracestate = (
+                fields.get(tracestate_field_number)
+                if tracestate_field_number is not None
+                else None
+            )
+            baggage_header = (
+                fields.get(baggage_field_number)
+                if baggage_field_number is not None
+                else None
+            )
+            return _carrier(traceparent, tracestate, baggage_header)
+
+        return from_protobuf_data
+
+    @staticmethod
+    def from_binary_header(
+        prefix: bytes = b"", length: int = TRACEPARENT_LENGTH
+    ) -> TraceparentExtractorFunc:
+        """Build an extractor reading the traceparent from a fixed binary header.
+
+        Args:
+            prefix: Magic bytes the event data starts with when it carries the
+                header. Data without the prefix is skipped.
+            length: Length of the ASCII traceparent following the prefix.
+
+        """
+        end = len(prefix) + length
+
+        @extractor_metadata(content_types=BINARY_CONTENT_TYPES)
+        def from_binary_header(event: v1.Event) -> str | None:
+            data = _binary_data(event)
+            if data is None or len(data) < end or data[: len(prefix)] != prefix:
+                logger.debug("Not found traceparent from event data header")
+                return None
+            try:
+                return str(data[len(prefix) : end], "ascii")
+            except UnicodeDecodeError:
+                logger.debug("Not found traceparent from event data header")
+                return None
+
+        return from_binary_header
 
     @classmethod
-    def get_default_pipelines(cls) -> Sequence[Callable[[v1.Event], str | None]]:
+    def get_default_pipelines(cls) -> Sequence[TraceparentExtractorFunc]:
         """Return the default pipeline functions for traceparent extraction."""
         return (
             cls.from_json_data,
@@ -53,21 +296,226 @@ class TraceparentExtractor:
         )
 
 
-def _extract_trace_context_from_traceparent(traceparent: str) -> trace.Context:
+def _binary_data(event: v1.Event) -> protobuf_scanner.BinaryData | None:
+    data = event.data
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        logger.debug(
+            "Failed to scan event data for traceparent: unsupported type %s",
+            type(data).__name__,
+        )
+        return None
+    return data
+
+
+def _carrier(
+    traceparent: str, tracestate: object, baggage_header: object
+) -> str | propagator.TraceCarrier:
+    """Keep the traceparent alone unless there is a tracestate or baggage."""
+    tracestate = tracestate if isinstance(tracestate, str) and tracestate else None
+    if not isinstance(baggage_header, str) or not baggage_header:
+        baggage_header = None
+    if tracestate is None and baggage_header is None:
+        return traceparent
+    return propagator.TraceCarrier(traceparent, tracestate, baggage_header)
+
+
+def _carrier_from_json_data(
+    event: v1.Event, max_scan_bytes: int | None
+) -> str | propagator.TraceCarrier | None:
+    """Scan JSON event data for a top-level traceparent, tracestate and baggage.
+
+    Falls back to a full parse only when the scan is ambiguous, e.g. malformed
+    or non UTF-8 data.
+    """
+    if payload.is_shared(event):
+        return _carrier_from_shared_payload(event)
+
+    data = event.data
+    if not isinstance(data, (str, bytes, bytearray, memoryview)):
+        logger.debug(
+            "Failed to parse event data for traceparent: unsupported type %s",
+            type(data).__name__,
+        )
+        return None
+
+    keys = _trace_keys_to_scan(data, max_scan_bytes)
+    if not keys:
+        logger.debug("Not found traceparent from event data")
+        return None
+
+    try:
+        members = json_scanner.scan_top_level_strings(data, keys, max_scan_bytes)
+    except json_scanner.AmbiguousJSONError:
+        members = _parse_top_level_strings(data)
+
+    traceparent = members.get(_TRACEPARENT)
+    if not traceparent:
+        logger.debug("Not found traceparent from event data")
+        return traceparent
+    return _carrier(
+        traceparent,
+        members.get(propagator.TRACESTATE_HEADER),
+        members.get(propagator.BAGGAGE_HEADER),
+    )
+
+
+def _trace_keys_to_scan(
+    data: json_scanner.JSONText, max_scan_bytes: int | None
+) -> tuple[str, ...]:
+    r"""Select the trace members the scanned prefix may hold.
+
+    A plain substring search is much cheaper than walking the JSON structure,
+    so events without a traceparent skip the scan, and the scan stops at the
+    traceparent unless the tracestate or baggage keys appear too. Keys spelled
+    with ``\u`` escapes and UTF-16/32 data, which the full parse fallback
+    understands, are always scanned for every member.
+    """
+    if isinstance(data, memoryview):
+        return _TRACE_KEYS
+    end = len(data) if max_scan_bytes is None else max_scan_bytes
+    if isinstance(data, str):
+        return _present_trace_keys(data.find, _TRACE_KEY_LITERALS, "\\u", end)
+    if 0 in data[:_WIDE_ENCODING_PREFIX_LENGTH]:
+        return _TRACE_KEYS
+    return _present_trace_keys(data.find, _TRACE_KEY_LITERALS_BYTES, b"\\u", end)
+
+
+def _present_trace_keys(
+    find: Callable[[_NeedleT, int, int], int],
+    literals: tuple[_NeedleT, ...],
+    escape: _NeedleT,
+    end: int,
+) -> tuple[str, ...]:
+    """Search the prefix with needles of the same type as the data."""
+    if find(escape, 0, end) != -1:
+        return _TRACE_KEYS
+    if find(literals[0], 0, end) == -1:
+        return ()
+    return tuple(
+        key
+        for key, literal in zip(_TRACE_KEYS, literals)
+        if key == _TRACEPARENT or find(literal, 0, end) != -1
+    )
+
+
+def _carrier_from_shared_payload(
+    event: v1.Event,
+) -> str | propagator.TraceCarrier | None:
+    """Read the top-level trace members from the shared decoded payload."""
+    try:
+        event_data: object = payload.get_payload(event)
+    except ValueError as e:
+        logger.debug("Failed to parse event data for traceparent: %s", e)
+        return None
+
+    if not isinstance(event_data, dict):
+        logger.debug("Not found traceparent from event data")
+        return None
+    traceparent = event_data.get(_TRACEPARENT)
+    if not traceparent or not isinstance(traceparent, str):
+        logger.debug("Not found traceparent from event data")
+        return None
+    return _carrier(
+        traceparent,
+        event_data.get(propagator.TRACESTATE_HEADER),
+        event_data.get(propagator.BAGGAGE_HEADER),
+    )
+
+
+def _parse_top_level_strings(data: json_scanner.JSONText) -> dict[str, str | None]:
+    """Fully parse JSON data and keep its top-level string members."""
+    try:
+        event_data: object = json.loads(
+            data.tobytes() if isinstance(data, memoryview) else data
+        )
+    except ValueError as e:
+        logger.debug("Failed to parse event data for traceparent: %s", e)
+        return {}
+
+    if not isinstance(event_data, dict):
+        return {}
+    return {
+        key: value if isinstance(value, str) else None
+        for key, value in event_data.items()
+    }
+
+
+class _CompiledPipeline:
+    """Traceparent extraction pipeline compiled once per decorated handler.
+
+    Extractors keep their declared order, which is their precedence. The
+    extractors applicable to each ``datacontenttype`` are resolved on first
+    sight and memoised, so extracting from an event is a dictionary lookup plus
+    the applicable extractors. Skipping the others lets a later extractor run
+    first when no earlier extractor can match the content type.
+    """
+
+    def __init__(self, pipelines: Sequence[TraceparentExtractorFunc]) -> None:
+        self._extractors = tuple(
+            (
+                extractor,
+                getattr(extractor, "__name__", repr(extractor)),
+                get_extractor_metadata(extractor).content_types,
+            )
+            for extractor in pipelines
+        )
+        self._plans: dict[str | None, _Plan] = {}
+
+    def _plan(self, content_type: str | None) -> _Plan:
+        media_type = (content_type or "").split(";", 1)[0].strip().lower()
+        plan = tuple(
+            (extractor, name)
+            for extractor, name, patterns in self._extractors
+            if patterns is None
+            or any(fnmatch.fnmatchcase(media_type, pattern) for pattern in patterns)
+        )
+        if len(self._plans) < _MAX_COMPILED_CONTENT_TYPES:
+            self._plans[content_type] = plan
+        return plan
+
+    def __call__(self, event: v1.Event) -> TraceparentExtraction:
+        """Return the first traceparent found and the name of its extractor."""
+        content_type = event.content_type
+        plan = self._plans.get(content_type)
+        if plan is None:
+            plan = self._plan(content_type)
+
+        for extractor, name in plan:
+            carrier = extractor(event)
+            if carrier:
+                return carrier, name
+        return None, None
+
+
+def compile_pipelines(
+    pipelines: Sequence[TraceparentExtractorFunc] | None = None,
+) -> Callable[[v1.Event], TraceparentExtraction]:
+    """Compile extractor pipelines into a single dispatch function.
+
+    The returned function returns the first traceparent found in an event, or
+    the `propagator.TraceCarrier` holding it, and the name of the extractor
+    which found it, see `setup` for the ordering.
+    """
+    if pipelines is None:
+        pipelines = TraceparentExtractor.get_default_pipelines()
+    return _CompiledPipeline(pipelines)
+
+
+def _extract_trace_context_from_traceparent(traceparent: str) -> context.Context:
     """Extract trace context from a W3C traceparent string.
 
     Args:
         traceparent (str): W3C traceparent string (e.g., '00-trace-id-span-id-flags')
 
     Returns:
-        trace.Context: The extracted trace context containing span and trace information
+        context.Context: The extracted trace context containing span and trace
+            information
 
     """
-    propagator = TraceContextTextMapPropagator()
-    return propagator.extract({"traceparent": traceparent})
+    return propagator.extract_context_from_traceparent(traceparent)
 
 
-def _attach_distributed_trace_context(trace_context: trace.Context) -> object | None:
+def _attach_distributed_trace_context(trace_context: context.Context) -> object | None:
     """Attach distributed tracing context from a traceparent string."""
     span_context = trace.get_current_span(trace_context).get_span_context()
     if span_context.is_valid and span_context.is_remote:
@@ -75,47 +523,527 @@ def _attach_distributed_trace_context(trace_context: trace.Context) -> object |
     return None
 
 
-def setup(
-    pipelines: Sequence[CloudEventHandler] | None = None,
-) -> Callable[[CloudEventHandler], CloudEventHandler]:
-    """Configure traceparent extraction pipelines.
+def new_miss_logger() -> RateLimitedLogger:
+    """Create the default rate-limited logger of events without a traceparent."""
+    return RateLimitedLogger(logger)
+
+
+def _trace_context_from_event(
+    event: v1.Event,
+    extract_traceparent: Callable[[v1.Event], TraceparentExtraction],
+    miss_logger: RateLimitedLogger,
+) -> context.Context | None:
+    """Extract the remote trace context of an event."""
+    # Extract traceparent using configured pipelines
+    carrier, extractor_name = extract_traceparent(event)
+
+    if not carrier:
+        miss_logger.log("Failed to extract traceparent from the event.")
+        return None
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Extracted %r with extractor %s", carrier, extractor_name)
+    trace_context = (
+        propagator.extract_context_from_carrier(carrier)
+        if isinstance(carrier, propagator.TraceCarrier)
+        else _extract_trace_context_from_traceparent(carrier)
+    )
+    if not trace.get_current_span(trace_context).get_span_context().is_valid:
+        return None
+    return trace_context
+
+
+def _attach_trace_context_from_event(
+    event: v1.Event,
+    extract_traceparent: Callable[[v1.Event], TraceparentExtraction],
+    miss_logger: RateLimitedLogger,
+    head_sampler: HeadSampler | None = None,
+) -> object | None:
+    """Extract the traceparent of an event and attach its remote context.
+
+    When the head sampler drops the event, an unsampled context is attached
+    instead.
+    """
+    trace_context = _trace_context_from_event(event, extract_traceparent, miss_logger)
+    if head_sampler is not None:
+        unsampled_context = head_sampler.unsampled_context(event, trace_context)
+        if unsampled_context is not None:
+            return context.attach(unsampled_context)
+    if trace_context is None:
+        return None
+    return _attach_distributed_trace_context(trace_context)
+
+
+_DEFAULT_EXTRACT_TRACEPARENT = compile_pipelines()
+_DEFAULT_MISS_LOGGER = new_miss_logger()
+
+
+def attach_from_event(
+    event: v1.Event,
+    extract_traceparent: Callable[[v1.Event], TraceparentExtraction] | None = None,
+    *,
+    miss_logger: RateLimitedLogger | None = None,
+    head_sampler: HeadSampler | None = None,
+) -> object | None:
+    """Attach the remote trace context of an event to the current context.
+
+    The explicit form of `setup`, for batch loops and worker pools handling
+    events without a decorated handler. The returned token must be passed to
+    `detach` in a ``finally`` block, or use `use_event_trace_context`.
 
     Args:
-        pipelines: Sequence of extractor functions that take a CloudEvent and
-            return an optional traceparent string. Defaults to standard extractors
-        if None.
+        event: The CloudEvent.
+        extract_traceparent: Pipeline compiled once with `compile_pipelines`.
+            Defaults to the compiled default pipelines.
+        miss_logger: Rate-limited logger reporting events without a traceparent.
+            Defaults to one shared by every caller of this function.
+        head_sampler: Head sampler deciding whether the event is traced, see
+            `HeadSampler`.
+
+    Returns:
+        The token of the attached context, or None if nothing was attached.
 
     """
-    if pipelines is None:
-        pipelines = TraceparentExtractor.get_default_pipelines()
+    return _attach_trace_context_from_event(
+        event,
+        _DEFAULT_EXTRACT_TRACEPARENT
+        if extract_traceparent is None
+        else extract_traceparent,
+        _DEFAULT_MISS_LOGGER if miss_logger is None else miss_logger,
+        head_sampler,
+    )
+
+
+def detach(token: object | None) -> None:
+    """Restore the context replaced by `attach_from_event`, if any."""
+    if token is not None:
+        context.detach(token)
+
+
+@contextlib.contextmanager
+def use_event_trace_context(
+    event: v1.Event,
+    extract_traceparent: Callable[[v1.Event], TraceparentExtraction] | None = None,
+    *,
+    miss_logger: RateLimitedLogger | None = None,
+    head_sampler: HeadSampler | None = None,
+) -> Iterator[None]:
+    """Run a block under the remote trace context of an event.
+
+    The context is detached when the block exits, even on exceptions, and
+    blocks can be nested, e.g. per event inside a batch span.
+
+    ```python
+    extract = distributed_trace_context.compile_pipelines()
+    for event in events:
+        with distributed_trace_context.use_event_trace_context(event, extract):
+            process(event)
+    ```
+
+    See `attach_from_event` for the arguments.
+    """
+    token = attach_from_event(
+        event, extract_traceparent, miss_logger=miss_logger, head_sampler=head_sampler
+    )
+    try:
+        yield
+    finally:
+        detach(token)
+
+
+def _destination_attributes(
+    pubsub_name: str | None, topic: str | None
+) -> dict[str, str]:
+    attributes = {}
+    if topic:
+        attributes[SpanAttributes.MESSAGING_DESTINATION_NAME] = topic
+    if pubsub_name:
+        attributes[PUBSUB_NAME_ATTRIBUTE] = pubsub_name
+    return attributes
+
+
+def _consumer_span_name(topic: str | None) -> str:
+    return f"{topic} process" if topic else "process"
+
+
+class HeadSampler:
+    """Decides whether an event is traced before any instrumentation work.
+
+    Events whose parent is not sampled are dropped, the others are passed to a
+    local sampler, e.g. a ratio or `sampling.RateLimitingSampler`, with the
+    consumer span name and the topic, pub/sub name and event type attributes.
+    A dropped event runs under an unsampled span context, so the `trace_span`
+    decorators see a span that is not recording and downstream services inherit
+    the decision.
+    """
+
+    def __init__(
+        self,
+        sampler: Sampler,
+        *,
+        pubsub_name: str | None = None,
+        topic: str | None = None,
+    ) -> None:
+        """Initialize the head sampler.
+
+        Args:
+            sampler: Local sampler consulted for events with a sampled parent or
+                without a parent.
+            pubsub_name: Name of the Dapr pub/sub component of the subscription.
+                Read from the ``pubsubname`` extension of each event if None.
+            topic: Topic of the subscription. Read from the ``topic`` extension
+                of each event if None.
+
+        """
+        self.sampler = sampler
+        self.pubsub_name = pubsub_name
+        self.topic = topic
+        self.span_name = _consumer_span_name(topic)
+        self.attributes = _destination_attributes(pubsub_name, topic)
+
+    def _sampling_target(self, event: v1.Event) -> tuple[str, dict[str, str]]:
+        span_name, attributes = self.span_name, self.attributes
+        if self.topic is None or self.pubsub_name is None:
+            extensions = event.extensions or {}
+            topic = self.topic or extensions.get(_DAPR_TOPIC_EXTENSION)
+            span_name = _consumer_span_name(topic)
+            attributes = _destination_attributes(
+                self.pubsub_name or extensions.get(_DAPR_PUBSUB_NAME_EXTENSION), topic
+            )
+        if event.type:
+            attributes = {
+                **attributes,
+                SpanAttributes.CLOUDEVENTS_EVENT_TYPE: event.type,
+            }
+        return span_name, attributes
+
+    def is_sampled(self, event: v1.Event, parent: context.Context | None) -> bool:
+        """Decide whether the event is traced.
+
+        Args:
+            event: The CloudEvent.
+            parent: Remote context extracted from the event, or None to use the
+                current context.
+
+        """
+        span_context = trace.get_current_span(parent).get_span_context()
+        if span_context.is_valid and not span_context.trace_flags.sampled:
+            return False
+
+        trace_id = (
+            span_context.trace_id
+            if span_context.is_valid
+            else _id_generator().generate_trace_id()
+        )
+        span_name, attributes = self._sampling_target(event)
+        result = self.sampler.should_sample(
+            parent, trace_id, span_name, trace.SpanKind.CONSUMER, attributes
+        )
+        return result.decision.is_sampled()
+
+    def unsampled_context(
+        self, event: v1.Event, parent: context.Context | None
+    ) -> context.Context | None:
+        """Build the context an event runs under when it is dropped.
+
+        Args:
+            event: The CloudEvent.
+            parent: Remote context extracted from the event, or None to use the
+                current context.
+
+        Returns:
+            A context whose current span is not sampled, or None if the event is
+            sampled.
+
+        """
+        if self.is_sampled(event, parent):
+            return None
+
+        span_context = trace.get_current_span(parent).get_span_context()
+        if span_context.is_valid:
+            trace_id, span_id = span_context.trace_id, span_context.span_id
+        else:
+            id_generator = _id_generator()
+            trace_id = id_generator.generate_trace_id()
+            span_id = id_generator.generate_span_id()
+        unsampled_span = trace.NonRecordingSpan(
+            trace.SpanContext(
+                trace_id=trace_id,
+                span_id=span_id,
+                is_remote=True,
+                trace_flags=trace.TraceFlags(trace.TraceFlags.DEFAULT),
+                trace_state=span_context.trace_state,
+            )
+        )
+        return trace.set_span_in_context(unsampled_span, parent)
+
+
+@contextlib.contextmanager
+def _attached(
+    trace_context: context.Context, span_manager: ContextManager[trace.Span]
+) -> Iterator[trace.Span]:
+    token = context.attach(trace_context)
+    try:
+        with span_manager as span:
+            yield span
+    finally:
+        context.detach(token)
+
+
+def _with_baggage(
+    trace_context: context.Context | None, span_manager: ContextManager[trace.Span]
+) -> ContextManager[trace.Span]:
+    """Make the baggage of a remote context current along with its span."""
+    if trace_context is None or not baggage.get_all(trace_context):
+        return span_manager
+    return _attached(trace_context, span_manager)
+
+
+class _ConsumerSpanStarter:
+    """Starts a consumer span per event, parented on its remote trace context.
+
+    Attributes known at subscription time are computed once; only the event
+    attributes, and the topic and pub/sub name when not given, are read per event.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        extract_traceparent: Callable[[v1.Event], TraceparentExtraction],
+        miss_logger: RateLimitedLogger,
+        *,
+        pubsub_name: str | None,
+        topic: str | None,
+        tracer_provider: trace.TracerProvider | None,
+        head_sampler: HeadSampler | None,
+    ) -> None:
+        self.extract_traceparent = extract_traceparent
+        self.miss_logger = miss_logger
+        self.head_sampler = head_sampler
+        self.pubsub_name = pubsub_name
+        self.topic = topic
+        self.tracer = trace.get_tracer(__name__, tracer_provider=tracer_provider)
+        self.span_name = _consumer_span_name(topic)
+        self.static_attributes = _destination_attributes(pubsub_name, topic)
+        self.static_attributes[SpanAttributes.MESSAGING_SYSTEM] = MESSAGING_SYSTEM
+        self.static_attributes[SpanAttributes.MESSAGING_OPERATION] = "process"
+
+    def _event_attributes(self, event: v1.Event) -> dict[str, str]:
+        attributes = dict(self.static_attributes)
+        if self.topic is None or self.pubsub_name is None:
+            extensions = event.extensions or {}
+            destination_attributes = _destination_attributes(
+                extensions.get(_DAPR_PUBSUB_NAME_EXTENSION),
+                extensions.get(_DAPR_TOPIC_EXTENSION),
+            )
+            for key, value in destination_attributes.items():
+                attributes.setdefault(key, value)
+        attributes.update(
+            {
+                key: value
+                for key, value in (
+                    (SpanAttributes.MESSAGING_MESSAGE_ID, event.id),
+                    (SpanAttributes.CLOUDEVENTS_EVENT_ID, event.id),
+                    (SpanAttributes.CLOUDEVENTS_EVENT_TYPE, event.type),
+                    (SpanAttributes.CLOUDEVENTS_EVENT_SOURCE, event.source),
+                )
+                if value
+            }
+        )
+        return attributes
+
+    def __call__(self, event: v1.Event) -> ContextManager[trace.Span]:
+        # Without a valid traceparent, the current context is the parent
+        parent = _trace_context_from_event(
+            event, self.extract_traceparent, self.miss_logger
+        )
+        if self.head_sampler is not None:
+            unsampled_context = self.head_sampler.unsampled_context(event, parent)
+            if unsampled_context is not None:
+                return _with_baggage(
+                    unsampled_context,
+                    use_span(trace.get_current_span(unsampled_context)),
+                )
 
-    def decorator(func: CloudEventHandler) -> CloudEventHandler:
+        attributes = self._event_attributes(event)
+        span_name = self.span_name
+        if self.topic is None:
+            span_name = _consumer_span_name(
+                attributes.get(SpanAttributes.MESSAGING_DESTINATION_NAME)
+            )
+        return _with_baggage(
+            parent,
+            use_span(
+                self.tracer.start_span(
+                    span_name,
+                    context=parent,
+                    kind=trace.SpanKind.CONSUMER,
+                    attributes=attributes,
+                ),
+                end_on_exit=True,
+            ),
+        )
+
+
+def _wrap_in_remote_context(
+    func: CloudEventHandlerT,
+    attach: Callable[[v1.Event], object | None],
+) -> CloudEventHandlerT:
+    def wrap_async(func: AsyncCloudEventHandler) -> AsyncCloudEventHandler:
+        @functools.wraps(func)
+        async def async_wrapper(event: v1.Event) -> TopicEventResponse:
+            token = attach(event)
+            try:
+                return await func(event)
+            finally:
+                detach(token)
+
+        return async_wrapper
+
+    def wrap_sync(func: CloudEventHandler) -> CloudEventHandler:
         @functools.wraps(func)
         def wrapper(event: v1.Event) -> TopicEventResponse:
-            # Extract traceparent using configured pipelines
-            traceparent = None
-            for extractor in pipelines:
-                traceparent = extractor(event)
-                if traceparent:
-                    logging.info(
-                        "found traceparent in extractor: %s", extractor.__name__
-                    )
-                    break
-
-            token = None
-            if traceparent:
-                logging.info("Extracted traceparent: %s", traceparent)
-                trace_context = _extract_trace_context_from_traceparent(traceparent)
-                token = _attach_distributed_trace_context(trace_context)
-            else:
-                logging.error("Failed to extract traceparent from the event.")
-
-            result = func(event)
-
-            if token:
-                context.detach(token)
-            return result
+            token = attach(event)
+            try:
+                return func(event)
+            finally:
+                detach(token)
+
+        return wrapper
+
+    return wrap_handler(func, wrap_sync, wrap_async)
+
 
+def _wrap_in_consumer_span(
+    func: CloudEventHandlerT,
+    start_span: Callable[[v1.Event], ContextManager[trace.Span]],
+    prepare: Callable[[v1.Event], None],
+) -> CloudEventHandlerT:
+    def wrap_async(func: AsyncCloudEventHandler) -> AsyncCloudEventHandler:
+        @functools.wraps(func)
+        async def async_wrapper(event: v1.Event) -> TopicEventResponse:
+            prepare(event)
+            with start_span(event):
+                return await func(event)
+
+        return async_wrapper
+
+    def wrap_sync(func: CloudEventHandler) -> CloudEventHandler:
+        @functools.wraps(func)
+        def wrapper(event: v1.Event) -> TopicEventResponse:
+            prepare(event)
+            with start_span(event):
+                return func(event)
+
+        return wrapper
+
+    return wrap_handler(func, wrap_sync, wrap_async)
+
+
+def setup(  # noqa: PLR0913
+    pipelines: Sequence[TraceparentExtractorFunc] | None = None,
+    *,
+    share_payload: bool = False,
+    payload_decoder: payload.PayloadDecoder | None = None,
+    consumer_span: bool = False,
+    pubsub_name: str | None = None,
+    topic: str | None = None,
+    tracer_provider: trace.TracerProvider | None = None,
+    record_metrics: bool = False,
+    meter_provider: metrics.MeterProvider | None = None,
+    miss_logger: RateLimitedLogger | None = None,
+    sampler: Sampler | None = None,
+) -> Callable[[CloudEventHandlerT], CloudEventHandlerT]:
+    """Configure traceparent extraction pipelines.
+
+    Both synchronous and ``async def`` handlers are supported.
+
+    Args:
+        pipelines: Sequence of extractor functions that take a CloudEvent and
+            return an optional traceparent string, or a `propagator.TraceCarrier`
+            whose tracestate and baggage are attached too. Defaults to standard
+            extractors if None. The sequence is compiled once: extractors are
+            tried in order, skipping those that do not apply to the event
+            content type according to `extractor_metadata`.
+        share_payload: Decode the event data at most once and share it with the
+            extractors and the handler through `payload.get_payload`.
+        payload_decoder: Decoder used when ``share_payload`` is enabled. Defaults
+            to `payload.get_default_decoder`.
+        consumer_span: Start a ``CONSUMER`` span per event, parented on the
+            extracted context (or the current context when there is none), with
+            messaging and CloudEvents semantic convention attributes.
+        pubsub_name: Name of the Dapr pub/sub component of the subscription. Read
+            from the ``pubsubname`` extension of each event if None.
+        topic: Topic of the subscription, used in the consumer span name. Read
+            from the ``topic`` extension of each event if None.
+        tracer_provider: Provider of the consumer span tracer. Defaults to the
+            global tracer provider.
+        record_metrics: Record extraction, handler and end-to-end latencies and
+            extraction and handler result counts, see `CloudEventMetrics`. The
+            topic and pub/sub name are added to every measurement.
+        meter_provider: Provider of the meter used when ``record_metrics`` is
+            enabled. Defaults to the global meter provider.
+        miss_logger: Rate-limited logger reporting events without a traceparent.
+            Defaults to `new_miss_logger`, a warning for each of the first
+            events then a summary with counts at most once a minute. Every
+            decorated handler gets its own logger unless one is shared.
+        sampler: Enable head sampling with this local sampler, see
+            `HeadSampler`. Events whose traceparent is not sampled, or that
+            the sampler drops, run under an unsampled span context: no consumer
+            span is started and the `trace_span` decorators skip their work.
+            Pass ``ALWAYS_ON`` to only honour the traceparent flags.
+
+    """
+    extract_traceparent = compile_pipelines(pipelines)
+    if miss_logger is None:
+        miss_logger = new_miss_logger()
+    event_metrics = (
+        CloudEventMetrics(
+            meter_provider, attributes=_destination_attributes(pubsub_name, topic)
+        )
+        if record_metrics
+        else None
+    )
+    if event_metrics is not None:
+        extract_traceparent = event_metrics.instrument_extraction(extract_traceparent)
+    head_sampler = (
+        HeadSampler(sampler, pubsub_name=pubsub_name, topic=topic)
+        if sampler is not None
+        else None
+    )
+
+    def share(event: v1.Event) -> None:
+        if share_payload:
+            payload.share(event, payload_decoder)
+
+    def attach(event: v1.Event) -> object | None:
+        share(event)
+        return _attach_trace_context_from_event(
+            event, extract_traceparent, miss_logger, head_sampler
+        )
+
+    start_span = (
+        _ConsumerSpanStarter(
+            extract_traceparent,
+            miss_logger,
+            pubsub_name=pubsub_name,
+            topic=topic,
+            tracer_provider=tracer_provider,
+            head_sampler=head_sampler,
+        )
+        if consumer_span
+        else None
+    )
+
+    def decorator(func: CloudEventHandlerT) -> CloudEventHandlerT:
+        if event_metrics is not None:
+            func = event_metrics.instrument_handler(func)
+        wrapper = (
+            _wrap_in_consumer_span(func, start_span, share)
+            if start_span is not None
+            else _wrap_in_remote_context(func, attach)
+        )
+        if event_metrics is not None:
+            wrapper = event_metrics.instrument_process(wrapper)
         return wrapper
 
     return decorator
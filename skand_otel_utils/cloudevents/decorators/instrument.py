@@ -0,0 +1,286 @@
+"""Single-wrapper equivalent of the standard CloudEvent trace decorator stack.
+
+```python
+@app.subscribe(pubsub_name="YOUR_PUBSUB_NAME", topic="YOUR_TOPIC")
+@instrument.setup(
+    span_event_name="event payload",
+    event_extractor=trace_span.extract_payload_from_cloudevent,
+)
+def handler(event: v1.Event) -> TopicEventResponse:
+    pass
+```
+
+behaves like stacking `distributed_trace_context.setup`,
+`trace_span.set_span_event_from_event` and
+`trace_span.set_span_status_from_cloudenvet_handler_result`, with a single
+wrapper and one current span lookup per event. It takes the options of
+`distributed_trace_context.setup`; with ``record_metrics``, the handler and
+the wrapper are measured by two more wrappers, as with the stacked decorators.
+"""
+
+from __future__ import annotations
+
+import functools
+from typing import TYPE_CHECKING, Any, Callable, ContextManager, Sequence
+
+from opentelemetry import trace
+
+from skand_otel_utils.cloudevents import payload
+from skand_otel_utils.cloudevents._handlers import wrap_handler
+from skand_otel_utils.cloudevents.decorators.distributed_trace_context import (
+    HeadSampler,
+    _attach_trace_context_from_event,
+    _ConsumerSpanStarter,
+    _destination_attributes,
+    compile_pipelines,
+    detach,
+    new_miss_logger,
+)
+from skand_otel_utils.cloudevents.decorators.trace_span import (
+    _add_span_event,
+    _set_span_status_from_result,
+)
+from skand_otel_utils.cloudevents.metrics import CloudEventMetrics
+
+if TYPE_CHECKING:
+    from cloudevents.sdk.event import v1
+    from dapr.clients.grpc._response import TopicEventResponse
+    from opentelemetry import metrics
+    from opentelemetry.sdk.trace.sampling import Sampler
+
+    from skand_otel_utils.cloudevents.diagnostics import RateLimitedLogger
+    from skand_otel_utils.cloudevents.types import (
+        AsyncCloudEventHandler,
+        CloudEventHandler,
+        CloudEventHandlerT,
+        TraceparentExtraction,
+        TraceparentExtractorFunc,
+    )
+
+
+class _Instrumentation:
+    """Per-handler configuration and the work done around each call."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        extract_traceparent: Callable[[v1.Event], TraceparentExtraction],
+        span_event_name: str | None,
+        event_extractor: Callable[[v1.Event], Any] | None,
+        set_span_status: bool,
+        share_payload: bool,
+        payload_decoder: payload.PayloadDecoder | None,
+        miss_logger: RateLimitedLogger,
+        head_sampler: HeadSampler | None,
+    ) -> None:
+        self.extract_traceparent = extract_traceparent
+        self.span_event_name = span_event_name or "event payload"
+        self.event_extractor = event_extractor
+        self.set_span_status = set_span_status
+        self.share_payload = share_payload
+        self.payload_decoder = payload_decoder
+        self.miss_logger = miss_logger
+        self.head_sampler = head_sampler
+
+    def share(self, event: v1.Event) -> None:
+        if self.share_payload:
+            payload.share(event, self.payload_decoder)
+
+    def before(self, event: v1.Event) -> tuple[object | None, trace.Span]:
+        self.share(event)
+        token = _attach_trace_context_from_event(
+            event, self.extract_traceparent, self.miss_logger, self.head_sampler
+        )
+
+        span = trace.get_current_span()
+        self.add_span_event(span, event)
+        return token, span
+
+    def add_span_event(self, span: trace.Span, event: v1.Event) -> None:
+        if self.event_extractor is not None:
+            _add_span_event(span, self.span_event_name, self.event_extractor, event)
+
+    def after(self, span: trace.Span, result: TopicEventResponse) -> None:
+        if self.set_span_status:
+            _set_span_status_from_result(span, result)
+
+
+def setup(  # noqa: PLR0913
+    pipelines: Sequence[TraceparentExtractorFunc] | None = None,
+    *,
+    span_event_name: str | None = None,
+    event_extractor: Callable[[v1.Event], Any] | None = None,
+    set_span_status: bool = True,
+    share_payload: bool = False,
+    payload_decoder: payload.PayloadDecoder | None = None,
+    consumer_span: bool = False,
+    pubsub_name: str | None = None,
+    topic: str | None = None,
+    tracer_provider: trace.TracerProvider | None = None,
+    record_metrics: bool = False,
+    meter_provider: metrics.MeterProvider | None = None,
+    miss_logger: RateLimitedLogger | None = None,
+    sampler: Sampler | None = None,
+) -> Callable[[CloudEventHandlerT], CloudEventHandlerT]:
+    """Instrument a CloudEvent handler with the standard trace stack.
+
+    The span event and status are set on the consumer span when
+    ``consumer_span`` is enabled, and on the current span otherwise.
+
+    Args:
+        pipelines: Traceparent extractors, see `distributed_trace_context.setup`.
+        span_event_name: Name of the span event holding the event payload, see
+            `trace_span.set_span_event_from_event`. Defaults to
+            ``"event payload"`` when ``event_extractor`` is given.
+        event_extractor: Function to extract data from the event for the span
+            event attributes. No span event is added if None.
+        set_span_status: Set the span status from the handler result, see
+            `trace_span.set_span_status_from_cloudenvet_handler_result`.
+        share_payload: Decode the event data at most once, see
+            `distributed_trace_context.setup`.
+        payload_decoder: Decoder used when ``share_payload`` is enabled.
+        consumer_span: Start a ``CONSUMER`` span per event, see
+            `distributed_trace_context.setup`.
+        pubsub_name: Name of the Dapr pub/sub component of the subscription, see
+            `distributed_trace_context.setup`.
+        topic: Topic of the subscription, see `distributed_trace_context.setup`.
+        tracer_provider: Provider of the consumer span tracer. Defaults to the
+            global tracer provider.
+        record_metrics: Record the metrics of `CloudEventMetrics`, see
+            `distributed_trace_context.setup`.
+        meter_provider: Provider of the meter used when ``record_metrics`` is
+            enabled. Defaults to the global meter provider.
+        miss_logger: Rate-limited logger reporting events without a traceparent,
+            see `distributed_trace_context.setup`.
+        sampler: Enable head sampling with this local sampler, see
+            `distributed_trace_context.setup`.
+
+    """
+    extract_traceparent = compile_pipelines(pipelines)
+    if miss_logger is None:
+        miss_logger = new_miss_logger()
+    event_metrics = (
+        CloudEventMetrics(
+            meter_provider, attributes=_destination_attributes(pubsub_name, topic)
+        )
+        if record_metrics
+        else None
+    )
+    if event_metrics is not None:
+        extract_traceparent = event_metrics.instrument_extraction(extract_traceparent)
+    head_sampler = (
+        HeadSampler(sampler, pubsub_name=pubsub_name, topic=topic)
+        if sampler is not None
+        else None
+    )
+    instrumentation = _Instrumentation(
+        extract_traceparent=extract_traceparent,
+        span_event_name=span_event_name,
+        event_extractor=event_extractor,
+        set_span_status=set_span_status,
+        share_payload=share_payload,
+        payload_decoder=payload_decoder,
+        miss_logger=miss_logger,
+        head_sampler=head_sampler,
+    )
+    wrapper = (
+        _wrap_in_consumer_span(
+            instrumentation,
+            _ConsumerSpanStarter(
+                extract_traceparent,
+                miss_logger,
+                pubsub_name=pubsub_name,
+                topic=topic,
+                tracer_provider=tracer_provider,
+                head_sampler=head_sampler,
+            ),
+        )
+        if consumer_span
+        else _wrap_in_remote_context(instrumentation)
+    )
+
+    def decorator(func: CloudEventHandlerT) -> CloudEventHandlerT:
+        if event_metrics is not None:
+            func = event_metrics.instrument_handler(func)
+        wrapped = wrapper(func)
+        if event_metrics is not None:
+            wrapped = event_metrics.instrument_process(wrapped)
+        return wrapped
+
+    return decorator
+
+
+def _wrap_in_remote_context(
+    instrumentation: _Instrumentation,
+) -> Callable[[CloudEventHandlerT], CloudEventHandlerT]:
+    before = instrumentation.before
+    after = instrumentation.after
+
+    def wrap_async(func: AsyncCloudEventHandler) -> AsyncCloudEventHandler:
+        @functools.wraps(func)
+        async def async_wrapper(event: v1.Event) -> TopicEventResponse:
+            token, span = before(event)
+            try:
+                result = await func(event)
+                after(span, result)
+            finally:
+                detach(token)
+            return result
+
+        return async_wrapper
+
+    def wrap_sync(func: CloudEventHandler) -> CloudEventHandler:
+        @functools.wraps(func)
+        def wrapper(event: v1.Event) -> TopicEventResponse:
+            token, span = before(event)
+            try:
+                result = func(event)
+                after(span, result)
+            finally:
+                detach(token)
+            return result
+
+        return wrapper
+
+    def decorator(func: CloudEventHandlerT) -> CloudEventHandlerT:
+        return wrap_handler(func, wrap_sync, wrap_async)
+
+    return decorator
+
+
+def _wrap_in_consumer_span(
+    instrumentation: _Instrumentation,
+    start_span: Callable[[v1.Event], ContextManager[trace.Span]],
+) -> Callable[[CloudEventHandlerT], CloudEventHandlerT]:
+    share = instrumentation.share
+    add_span_event = instrumentation.add_span_event
+    after = instrumentation.after
+
+    def wrap_async(func: AsyncCloudEventHandler) -> AsyncCloudEventHandler:
+        @functools.wraps(func)
+        async def async_wrapper(event: v1.Event) -> TopicEventResponse:
+            share(event)
+            with start_span(event) as span:
+                add_span_event(span, event)
+                result = await func(event)
+                after(span, result)
+            return result
+
+        return async_wrapper
+
+    def wrap_sync(func: CloudEventHandler) -> CloudEventHandler:
+        @functools.wraps(func)
+        def wrapper(event: v1.Event) -> TopicEventResponse:
+            share(event)
+            with start_span(event) as span:
+                add_span_event(span, event)
+                result = func(event)
+                after(span, result)
+            return result
+
+        return wrapper
+
+    def decorator(func: CloudEventHandlerT) -> CloudEventHandlerT:
+        return wrap_handler(func, wrap_sync, wrap_async)
+
+    return decorator
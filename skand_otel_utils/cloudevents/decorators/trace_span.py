@@ -1,67 +1,121 @@
+from __future__ import annotations
+
 import functools
 import json
-from typing import Any, Callable
+import reprlib
+from typing import TYPE_CHECKING, Any, Callable
 
-from cloudevents.sdk.event import v1
-from dapr.clients.grpc._response import TopicEventResponse, TopicEventResponseStatus
 from opentelemetry import trace
 from opentelemetry.trace import StatusCode
 
-from skand_otel_utils.cloudevents.types import CloudEventHandler
+from skand_otel_utils import load_shedding
+from skand_otel_utils.cloudevents import _dapr
+from skand_otel_utils.cloudevents._handlers import wrap_handler
+
+if TYPE_CHECKING:
+    from cloudevents.sdk.event import v1
+    from dapr.clients.grpc._response import TopicEventResponse
+
+    from skand_otel_utils.cloudevents.types import (
+        AsyncCloudEventHandler,
+        CloudEventHandler,
+        CloudEventHandlerT,
+    )
+
+_TRUNCATION_MARKER = "..."
+
+
+def _set_span_status_from_result(span: trace.Span, result: TopicEventResponse) -> None:
+    response_type, status_type = _dapr.response_types()
+    if not isinstance(result, response_type):
+        return
+
+    status_code = (
+        StatusCode.OK
+        if result.status == status_type.success
+        else trace.StatusCode.ERROR
+    )
+    span.set_status(status_code)
 
 
 def set_span_status_from_cloudenvet_handler_result(
-    func: CloudEventHandler,
-) -> Callable[[CloudEventHandler], CloudEventHandler]:
+    func: CloudEventHandlerT,
+) -> CloudEventHandlerT:
     """Set the span status based on the result of the CloudEvent handler."""
 
-    @functools.wraps(func)
-    def wrapper(event: v1.Event) -> TopicEventResponse:
-        result: TopicEventResponse = func(event)
-        if not isinstance(result, TopicEventResponse):
+    def wrap_async(func: AsyncCloudEventHandler) -> AsyncCloudEventHandler:
+        @functools.wraps(func)
+        async def async_wrapper(event: v1.Event) -> TopicEventResponse:
+            result = await func(event)
+            _set_span_status_from_result(trace.get_current_span(), result)
             return result
 
-        status_code = (
-            StatusCode.OK
-            if result.status == TopicEventResponseStatus.success
-            else trace.StatusCode.ERROR
-        )
-        span = trace.get_current_span()
-        span.set_status(status_code)
-        return result
+        return async_wrapper
+
+    def wrap_sync(func: CloudEventHandler) -> CloudEventHandler:
+        @functools.wraps(func)
+        def wrapper(event: v1.Event) -> TopicEventResponse:
+            result = func(event)
+            _set_span_status_from_result(trace.get_current_span(), result)
+            return result
+
+        return wrapper
 
-    return wrapper
+    return wrap_handler(func, wrap_sync, wrap_async)
+
+
+def _add_span_event(
+    span: trace.Span,
+    name: str,
+    event_extractor: Callable[[v1.Event], Any],
+    event: v1.Event,
+) -> None:
+    """Add a span event, unless the span is not recorded or load is shed."""
+    if span.is_recording() and not load_shedding.should_shed():
+        span.add_event(name, event_extractor(event))
 
 
 def set_span_event_from_event(
     name: str,
     event_extractor: Callable[[v1.Event], Any],
-) -> Callable[[CloudEventHandler], CloudEventHandler]:
+) -> Callable[[CloudEventHandlerT], CloudEventHandlerT]:
     """Wrap a function with a trace span.
 
+    The event extractor is not called when the current span is not recording,
+    e.g. when the trace is not sampled, nor while `load_shedding.should_shed`.
+
     Args:
         name: Name of the span
         event_extractor: Function to extract data from the event for span attributes
 
     """
 
-    def decorator(func: CloudEventHandler) -> CloudEventHandler:
+    def wrap_async(func: AsyncCloudEventHandler) -> AsyncCloudEventHandler:
+        @functools.wraps(func)
+        async def async_wrapper(event: v1.Event) -> TopicEventResponse:
+            _add_span_event(trace.get_current_span(), name, event_extractor, event)
+            return await func(event)
+
+        return async_wrapper
+
+    def wrap_sync(func: CloudEventHandler) -> CloudEventHandler:
         @functools.wraps(func)
         def wrapper(event: v1.Event) -> TopicEventResponse:
-            span = trace.get_current_span()
-            span.add_event(name, event_extractor(event))
+            _add_span_event(trace.get_current_span(), name, event_extractor, event)
             return func(event)
 
         return wrapper
 
+    def decorator(func: CloudEventHandlerT) -> CloudEventHandlerT:
+        return wrap_handler(func, wrap_sync, wrap_async)
+
     return decorator
 
 
-def extract_payload_from_cloudevent(event: v1.Event) -> dict:
-    """Create a dictionary representation of the event payload."""
+def _payload_from_cloudevent(event: v1.Event, event_data: str) -> dict:
     return {
         "event_data_type": type(event.data).__name__,
-        "event_data": str(event.data),
+        "event_data": event_data,
         "event_type": event.type,
         "event_id": event.id,
         "event_content_type": event.content_type,
@@ -69,3 +123,60 @@ def extract_payload_from_cloudevent(event: v1.Event) -> dict:
         "event_extensions": json.dumps(event.extensions),
         "event_subject": event.subject,
     }
+
+
+def extract_payload_from_cloudevent(event: v1.Event) -> dict:
+    """Create a dictionary representation of the event payload."""
+    return _payload_from_cloudevent(event, str(event.data))
+
+
+def _truncate(text: str, max_length: int) -> str:
+    if len(text) <= max_length:
+        return text
+    return text[:max_length] + _TRUNCATION_MARKER
+
+
+def _truncated_str(data: object, max_length: int, repr_: reprlib.Repr) -> str:
+    """Stringify at most about ``max_length`` characters of the event data."""
+    if isinstance(data, str):
+        return _truncate(data, max_length)
+    if isinstance(data, (bytes, bytearray)):
+        text = str(data[:max_length])
+        return text + _TRUNCATION_MARKER if len(data) > max_length else text
+    if isinstance(data, (dict, list, tuple, set, frozenset)):
+        return _truncate(repr_.repr(data), max_length)
+    return _truncate(str(data), max_length)
+
+
+def make_payload_extractor(max_data_length: int) -> Callable[[v1.Event], dict]:
+    """Create an `extract_payload_from_cloudevent` with a bounded ``event_data``.
+
+    Text and binary data are sliced before being stringified and containers are
+    rendered with `reprlib`, so a large payload is never copied whole into the
+    span event. Truncated values end with ``"..."``.
+
+    Args:
+        max_data_length: Maximum number of characters or bytes of the event data
+            kept in ``event_data``.
+
+    Returns:
+        An event extractor for `set_span_event_from_event`.
+
+    """
+    if max_data_length < 0:
+        msg = "max_data_length must not be negative"
+        raise ValueError(msg)
+
+    repr_ = reprlib.Repr()
+    repr_.maxstring = repr_.maxother = max(max_data_length, 4)
+    repr_.maxdict = repr_.maxlist = repr_.maxtuple = repr_.maxset = max(
+        max_data_length // 4, 1
+    )
+    repr_.maxfrozenset = repr_.maxset
+
+    def extract_payload(event: v1.Event) -> dict:
+        return _payload_from_cloudevent(
+            event, _truncated_str(event.data, max_data_length, repr_)
+        )
+
+    return extract_payload
@@ -0,0 +1,96 @@
+"""Rate-limited diagnostics for conditions recurring on every event."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable
+
+DEFAULT_FIRST_N = 10
+"""Number of occurrences logged individually before switching to summaries."""
+
+DEFAULT_SUMMARY_INTERVAL = 60.0
+"""Minimum number of seconds between two summaries."""
+
+
+class RateLimitedLogger:
+    """Log the first occurrences of a recurring condition, then periodic summaries.
+
+    The first ``first_n`` occurrences are logged as they happen. Later ones are
+    counted, and at most one summary with the number of suppressed occurrences
+    is logged every ``summary_interval`` seconds, when the next occurrence comes
+    in. Nothing is counted nor formatted when the logger is disabled for
+    ``level``.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        *,
+        level: int = logging.WARNING,
+        first_n: int = DEFAULT_FIRST_N,
+        summary_interval: float = DEFAULT_SUMMARY_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the logger.
+
+        Args:
+            logger: Logger the messages are sent to.
+            level: Level of the messages.
+            first_n: Number of occurrences logged individually.
+            summary_interval: Minimum number of seconds between two summaries.
+            clock: Monotonic clock, in seconds.
+
+        """
+        self.logger = logger
+        self.level = level
+        self.first_n = first_n
+        self.summary_interval = summary_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._count = 0
+        self._suppressed = 0
+        self._window_start: float | None = None
+
+    @property
+    def count(self) -> int:
+        """Number of occurrences seen while the logger was enabled."""
+        return self._count
+
+    def log(self, msg: str, *args: object) -> None:
+        """Record an occurrence and log it if the rate limit allows.
+
+        Args:
+            msg: Message format string, formatted lazily with ``args``.
+            *args: Arguments of the message.
+
+        """
+        if not self.logger.isEnabledFor(self.level):
+            return
+
+        with self._lock:
+            self._count += 1
+            if self._count <= self.first_n:
+                suppressed = 0
+            else:
+                now = self._clock()
+                if self._window_start is None:
+                    self._window_start = now
+                self._suppressed += 1
+                if now - self._window_start < self.summary_interval:
+                    return
+                suppressed = self._suppressed
+                self._suppressed = 0
+                self._window_start = now
+
+        if suppressed:
+            self.logger.log(
+                self.level,
+                "%s (%d occurrences since the last report, %d in total)",
+                msg % args if args else msg,
+                suppressed,
+                self._count,
+            )
+        else:
+            self.logger.log(self.level, msg, *args)
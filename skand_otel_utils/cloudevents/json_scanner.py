@@ -0,0 +1,234 @@
+"""Bounded-prefix scanner for top-level string members of a JSON object.
+
+The scanner walks the top level of a JSON object with a handful of compiled
+regular expressions and only decodes the values of the requested keys, so large
+payloads are never materialised into Python objects.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Iterable, Pattern, Union
+
+JSONText = Union[str, bytes, bytearray, memoryview]
+
+DEFAULT_MAX_SCAN_BYTES = 64 * 1024
+"""Default number of leading bytes (or characters for ``str``) to scan."""
+
+_INCOMPLETE = -1
+_OPENING = 2
+_NON_ASCII = 0x80
+
+
+class AmbiguousJSONError(ValueError):
+    """Raised when the scan cannot decide without a full JSON parse."""
+
+
+class _Grammar:
+    """Compiled patterns and delimiters for either ``str`` or binary input."""
+
+    def __init__(self, *, binary: bool) -> None:
+        def compile_(pattern: str) -> Pattern[Any]:
+            return re.compile(pattern.encode("ascii") if binary else pattern, re.DOTALL)
+
+        def char(value: str) -> str | int:
+            return ord(value) if binary else value
+
+        self.binary = binary
+        self.whitespace = compile_(r"[ \t\n\r]*")
+        self.string = compile_(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+        self.scalar = compile_(r"[^ \t\n\r,:\[\]{}\"]+")
+        self.structural = compile_(r'(")|([\[{])|([\]}])')
+        self.flat_containers = compile_(r'(?:[^"\[\]{}]+|[\[{][^"\[\]{}]*[\]}])*')
+        self.quote = char('"')
+        self.colon = char(":")
+        self.comma = char(",")
+        self.open_brace = char("{")
+        self.close_brace = char("}")
+        self.open_bracket = char("[")
+
+
+_TEXT_GRAMMAR = _Grammar(binary=False)
+_BINARY_GRAMMAR = _Grammar(binary=True)
+
+
+class _Scanner:
+    def __init__(self, data: JSONText, max_bytes: int | None) -> None:
+        if isinstance(data, memoryview) and data.format != "B":
+            data = data.cast("B")
+        self.data = data
+        self.grammar = _TEXT_GRAMMAR if isinstance(data, str) else _BINARY_GRAMMAR
+        size = len(data)
+        self.end = size if max_bytes is None else min(size, max_bytes)
+        self.truncated = self.end < size
+
+    def peek(self, pos: int) -> Any:  # noqa: ANN401
+        return self.data[pos] if pos < self.end else None
+
+    def match_end(self, pattern: Pattern[Any], pos: int) -> int:
+        """End of a match of a pattern that also matches the empty string."""
+        match = pattern.match(self.data, pos, self.end)
+        if match is None:
+            msg = "Unexpected JSON scanner state"
+            raise AmbiguousJSONError(msg)
+        return match.end()
+
+    def skip_whitespace(self, pos: int) -> int:
+        return self.match_end(self.grammar.whitespace, pos)
+
+    def match_string(self, pos: int) -> int:
+        match = self.grammar.string.match(self.data, pos, self.end)
+        return match.end() if match else _INCOMPLETE
+
+    def decode_string(self, start: int, end: int) -> str:
+        token = self.data[start:end]
+        if isinstance(token, memoryview):
+            token = token.tobytes()
+        try:
+            if isinstance(token, str):
+                return json.loads(token) if "\\" in token else token[1:-1]
+            if b"\\" in token:
+                return json.loads(token)
+            return token[1:-1].decode("utf-8")
+        except ValueError as e:
+            raise AmbiguousJSONError(str(e)) from e
+
+    def skip_value(self, pos: int) -> int:
+        grammar = self.grammar
+        first = self.peek(pos)
+        if first == grammar.quote:
+            return self.match_string(pos)
+        if first not in (grammar.open_brace, grammar.open_bracket):
+            match = grammar.scalar.match(self.data, pos, self.end)
+            return match.end() if match else _INCOMPLETE
+
+        pos += 1
+        depth = 1
+        while True:
+            # Skip scalars and string-free leaf containers in a single match.
+            pos = self.match_end(grammar.flat_containers, pos)
+            match = grammar.structural.match(self.data, pos, self.end)
+            if not match:
+                return _INCOMPLETE
+            if match.lastindex == 1:
+                pos = self.match_string(match.start())
+                if pos == _INCOMPLETE:
+                    return _INCOMPLETE
+                continue
+            depth += 1 if match.lastindex == _OPENING else -1
+            pos = match.end()
+            if depth == 0:
+                return pos
+
+    def read_member(self, pos: int) -> tuple[str, int, int] | None:
+        """Read ``"key": value`` at ``pos``, returning the key and value bounds."""
+        key_end = self.match_string(pos)
+        if key_end == _INCOMPLETE:
+            return None
+        key = self.decode_string(pos, key_end)
+
+        pos = self.skip_whitespace(key_end)
+        if self.peek(pos) != self.grammar.colon:
+            return None
+        value_start = self.skip_whitespace(pos + 1)
+        value_end = self.skip_value(value_start)
+        if value_end == _INCOMPLETE:
+            return None
+        return key, value_start, value_end
+
+    def decode_value(self, start: int, end: int) -> str | None:
+        """Decode the string value at ``start``, or None for any other value."""
+        if self.peek(start) != self.grammar.quote:
+            return None
+        return self.decode_string(start, end)
+
+    def may_repeat(self, keys: Iterable[str], pos: int) -> bool:
+        r"""Whether one of ``keys`` may be a member again after ``pos``.
+
+        Keys are searched as quoted literals, and any ``\u`` escape may spell
+        one, so only a prefix without either can be skipped.
+        """
+        data = self.data
+        if isinstance(data, memoryview):
+            return True
+        literals = [json.dumps(key, ensure_ascii=False) for key in keys]
+        if isinstance(data, str):
+            needles = ["\\u", *literals]
+            return any(data.find(needle, pos, self.end) != -1 for needle in needles)
+        needles_bytes = [b"\\u", *(literal.encode() for literal in literals)]
+        return any(data.find(needle, pos, self.end) != -1 for needle in needles_bytes)
+
+    def check_object_start(self) -> int | None:
+        """Return the position after the opening brace, or None for non-objects."""
+        pos = self.skip_whitespace(0)
+        first = self.peek(pos)
+        if first == self.grammar.open_brace:
+            return pos + 1
+        if self.grammar.binary and first is not None and not 0 < first < _NON_ASCII:
+            msg = "JSON text is not UTF-8 encoded"
+            raise AmbiguousJSONError(msg)
+        return None
+
+
+def scan_top_level_strings(
+    data: JSONText,
+    keys: Iterable[str],
+    max_bytes: int | None = DEFAULT_MAX_SCAN_BYTES,
+) -> dict[str, str | None]:
+    """Find the values of top-level ``keys`` in a JSON object without decoding it.
+
+    Only the first ``max_bytes`` of ``data`` are inspected. Keys found in that
+    prefix are returned with their decoded string value, or ``None`` when the
+    member is ``null`` or not a string. Keys that are not found are omitted, and
+    the last occurrence of a duplicated key in the prefix wins, as with
+    `json.loads`.
+
+    Args:
+        data: JSON text as ``str`` or UTF-8 encoded bytes-like object.
+        keys: Top-level member names to look for.
+        max_bytes: Scan budget, or ``None`` to scan the whole document.
+
+    Raises:
+        AmbiguousJSONError: The document is malformed or uses an encoding the
+            scanner does not understand, so a full parse is needed to decide.
+
+    """
+    wanted = set(keys)
+    found: dict[str, str | None] = {}
+    scanner = _Scanner(data, max_bytes)
+    grammar = scanner.grammar
+
+    pos = scanner.check_object_start()
+    if pos is None:
+        return found
+    check_repeats = True
+
+    while pos is not None:
+        pos = scanner.skip_whitespace(pos)
+        if scanner.peek(pos) == grammar.close_brace:
+            break
+
+        member = scanner.read_member(pos)
+        if member is None:
+            pos = None
+            break
+        key, value_start, pos = member
+        if key in wanted:
+            found[key] = scanner.decode_value(value_start, pos)
+        if check_repeats and len(found) == len(wanted):
+            # Later duplicates override the values found so far
+            if not scanner.may_repeat(wanted, pos):
+                break
+            check_repeats = False
+
+        pos = scanner.skip_whitespace(pos)
+        delimiter = scanner.peek(pos)
+        if delimiter == grammar.close_brace:
+            break
+        pos = pos + 1 if delimiter == grammar.comma else None
+
+    if pos is None and not scanner.truncated and len(found) < len(wanted):
+        msg = "JSON object ended unexpectedly"
+        raise AmbiguousJSONError(msg)
+    return found
@@ -0,0 +1,238 @@
+"""Per-stage latency metrics of CloudEvent handlers.
+
+Instruments are created once, when the decorators are applied; the decorators
+add no metric wrappers at all unless metrics are enabled.
+"""
+
+from __future__ import annotations
+
+import functools
+import time
+from typing import TYPE_CHECKING, Callable, Mapping
+
+from opentelemetry import metrics
+
+from skand_otel_utils import propagator
+from skand_otel_utils.cloudevents import _dapr
+from skand_otel_utils.cloudevents._handlers import wrap_handler
+
+if TYPE_CHECKING:
+    from cloudevents.sdk.event import v1
+    from dapr.clients.grpc._response import TopicEventResponse
+
+    from skand_otel_utils.cloudevents.types import (
+        AsyncCloudEventHandler,
+        CloudEventHandler,
+        CloudEventHandlerT,
+        TraceparentExtraction,
+    )
+
+EXTRACTOR_ATTRIBUTE = "cloudevents.traceparent.extractor"
+"""Metric attribute holding the name of the extractor that found the traceparent."""
+
+HANDLER_STATUS_ATTRIBUTE = "cloudevents.handler.status"
+"""Metric attribute holding the `TopicEventResponseStatus` name of a result."""
+
+NO_RESPONSE_STATUS = "none"
+"""Handler status recorded when the handler returns no `TopicEventResponse`."""
+
+EXCEPTION_STATUS = "exception"
+"""Handler status recorded when the handler raises."""
+
+UNKNOWN_EXTRACTOR = "none"
+"""Extractor name recorded when a traceparent is found by an unnamed extractor."""
+
+
+class CloudEventMetrics:
+    """OTel instruments measuring where the time of each event is spent.
+
+    Attributes:
+        extraction_duration: Histogram of the traceparent extraction time.
+        handler_duration: Histogram of the wrapped handler time.
+        process_duration: Histogram of the end-to-end time of the decorated
+            handler, extraction and context handling included.
+        extractor_matches: Counter of events per extractor that found the
+            traceparent.
+        extraction_misses: Counter of events without a traceparent.
+        invalid_traceparents: Counter of events whose traceparent is invalid.
+        handler_results: Counter of handler results per status.
+
+    """
+
+    def __init__(
+        self,
+        meter_provider: metrics.MeterProvider | None = None,
+        *,
+        attributes: Mapping[str, str] | None = None,
+    ) -> None:
+        """Create the instruments.
+
+        Args:
+            meter_provider: Provider of the meter. Defaults to the global meter
+                provider.
+            attributes: Attributes added to every measurement, e.g. the topic.
+
+        """
+        meter = metrics.get_meter(__name__, meter_provider=meter_provider)
+        self.extraction_duration = meter.create_histogram(
+            "cloudevents.traceparent.extraction.duration",
+            unit="s",
+            description="Time spent extracting the traceparent of an event.",
+        )
+        self.handler_duration = meter.create_histogram(
+            "cloudevents.handler.duration",
+            unit="s",
+            description="Time spent in the CloudEvent handler.",
+        )
+        self.process_duration = meter.create_histogram(
+            "cloudevents.process.duration",
+            unit="s",
+            description="End-to-end time spent processing an event.",
+        )
+        self.extractor_matches = meter.create_counter(
+            "cloudevents.traceparent.extractor.matches",
+            description="Events whose traceparent was found, per extractor.",
+        )
+        self.extraction_misses = meter.create_counter(
+            "cloudevents.traceparent.misses",
+            description="Events without a traceparent.",
+        )
+        self.invalid_traceparents = meter.create_counter(
+            "cloudevents.traceparent.invalid",
+            description="Events with an invalid traceparent.",
+        )
+        self.handler_results = meter.create_counter(
+            "cloudevents.handler.results",
+            description="CloudEvent handler results, per status.",
+        )
+
+        self._attributes = dict(attributes or {})
+        self._extractor_attributes: dict[str, dict[str, str]] = {}
+        self._response_type, status_type = _dapr.response_types()
+        self._status_attributes = {
+            status: self._with_attribute(HANDLER_STATUS_ATTRIBUTE, status)
+            for status in (
+                *(status.name for status in status_type),
+                NO_RESPONSE_STATUS,
+                EXCEPTION_STATUS,
+            )
+        }
+
+    def _with_attribute(self, key: str, value: str) -> dict[str, str]:
+        return {**self._attributes, key: value}
+
+    def _record_extraction(
+        self,
+        carrier: str | propagator.TraceCarrier | None,
+        extractor_name: str | None,
+        duration: float,
+    ) -> None:
+        self.extraction_duration.record(duration, self._attributes)
+        traceparent = propagator.get_carrier_traceparent(carrier)
+        if not traceparent:
+            self.extraction_misses.add(1, self._attributes)
+            return
+
+        if extractor_name is None:
+            extractor_name = UNKNOWN_EXTRACTOR
+        attributes = self._extractor_attributes.get(extractor_name)
+        if attributes is None:
+            attributes = self._with_attribute(EXTRACTOR_ATTRIBUTE, extractor_name)
+            self._extractor_attributes[extractor_name] = attributes
+        self.extractor_matches.add(1, attributes)
+        if propagator.parse_traceparent(traceparent) is None:
+            self.invalid_traceparents.add(1, self._attributes)
+
+    def _record_result(self, result: object, duration: float) -> None:
+        self.handler_duration.record(duration, self._attributes)
+        status = (
+            result.status.name
+            if isinstance(result, self._response_type)
+            else NO_RESPONSE_STATUS
+        )
+        self.handler_results.add(1, self._status_attributes[status])
+
+    def _record_exception(self, duration: float) -> None:
+        self.handler_duration.record(duration, self._attributes)
+        self.handler_results.add(1, self._status_attributes[EXCEPTION_STATUS])
+
+    def instrument_extraction(
+        self,
+        extract_traceparent: Callable[[v1.Event], TraceparentExtraction],
+    ) -> Callable[[v1.Event], TraceparentExtraction]:
+        """Measure a compiled traceparent pipeline, see `compile_pipelines`."""
+
+        @functools.wraps(extract_traceparent)
+        def measured(event: v1.Event) -> TraceparentExtraction:
+            start = time.perf_counter()
+            carrier, extractor_name = extract_traceparent(event)
+            self._record_extraction(
+                carrier, extractor_name, time.perf_counter() - start
+            )
+            return carrier, extractor_name
+
+        return measured
+
+    def instrument_handler(self, func: CloudEventHandlerT) -> CloudEventHandlerT:
+        """Measure the time and count the results of a CloudEvent handler."""
+
+        def wrap_async(func: AsyncCloudEventHandler) -> AsyncCloudEventHandler:
+            @functools.wraps(func)
+            async def async_wrapper(event: v1.Event) -> TopicEventResponse:
+                start = time.perf_counter()
+                try:
+                    result = await func(event)
+                except BaseException:
+                    self._record_exception(time.perf_counter() - start)
+                    raise
+                self._record_result(result, time.perf_counter() - start)
+                return result
+
+            return async_wrapper
+
+        def wrap_sync(func: CloudEventHandler) -> CloudEventHandler:
+            @functools.wraps(func)
+            def wrapper(event: v1.Event) -> TopicEventResponse:
+                start = time.perf_counter()
+                try:
+                    result = func(event)
+                except BaseException:
+                    self._record_exception(time.perf_counter() - start)
+                    raise
+                self._record_result(result, time.perf_counter() - start)
+                return result
+
+            return wrapper
+
+        return wrap_handler(func, wrap_sync, wrap_async)
+
+    def instrument_process(self, func: CloudEventHandlerT) -> CloudEventHandlerT:
+        """Measure the end-to-end time of a decorated CloudEvent handler."""
+
+        def wrap_async(func: AsyncCloudEventHandler) -> AsyncCloudEventHandler:
+            @functools.wraps(func)
+            async def async_wrapper(event: v1.Event) -> TopicEventResponse:
+                start = time.perf_counter()
+                try:
+                    return await func(event)
+                finally:
+                    self.process_duration.record(
+                        time.perf_counter() - start, self._attributes
+                    )
+
+            return async_wrapper
+
+        def wrap_sync(func: CloudEventHandler) -> CloudEventHandler:
+            @functools.wraps(func)
+            def wrapper(event: v1.Event) -> TopicEventResponse:
+                start = time.perf_counter()
+                try:
+                    return func(event)
+                finally:
+                    self.process_duration.record(
+                        time.perf_counter() - start, self._attributes
+                    )
+
+            return wrapper
+
+        return wrap_handler(func, wrap_sync, wrap_async)
@@ -0,0 +1,125 @@
+"""Decode-once access to CloudEvent payloads.
+
+When payload sharing is enabled for an event, the decoded ``event.data`` is
+cached on the event the first time it is requested, so the trace decorators and
+the wrapped handler all reuse the same decoded object.
+
+```python
+from skand_otel_utils.cloudevents import payload
+
+
+@distributed_trace_context.setup(share_payload=True)
+def handler(event: v1.Event) -> TopicEventResponse:
+    job = payload.get_payload(event)
+```
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple
+
+if TYPE_CHECKING:
+    from cloudevents.sdk.event import v1
+
+    from skand_otel_utils.cloudevents.json_scanner import JSONText
+
+PayloadDecoder = Callable[["JSONText"], Any]
+
+_DECODER_ATTRIBUTE = "_skand_otel_payload_decoder"
+_CACHE_ATTRIBUTE = "_skand_otel_payload"
+
+
+class _CachedPayload(NamedTuple):
+    data: object
+    decoded: object
+    error: ValueError | None
+
+
+def _decode_with_json(data: JSONText) -> Any:  # noqa: ANN401
+    return json.loads(data.tobytes() if isinstance(data, memoryview) else data)
+
+
+@functools.lru_cache(maxsize=None)
+def get_default_decoder() -> PayloadDecoder:
+    """Return the fastest installed JSON decoder.
+
+    orjson is preferred, then msgspec, falling back to the standard library.
+    """
+    try:
+        import orjson  # pyright: ignore[reportMissingImports]
+    except ImportError:
+        pass
+    else:
+        return orjson.loads
+
+    try:
+        import msgspec  # pyright: ignore[reportMissingImports]
+    except ImportError:
+        pass
+    else:
+
+        def decode_with_msgspec(data: JSONText) -> Any:  # noqa: ANN401
+            try:
+                return msgspec.json.decode(data)
+            except msgspec.DecodeError as e:
+                raise ValueError(str(e)) from e
+
+        return decode_with_msgspec
+
+    return _decode_with_json
+
+
+def share(event: v1.Event, decoder: PayloadDecoder | None = None) -> None:
+    """Enable payload sharing for an event.
+
+    Args:
+        event: The CloudEvent whose payload should be decoded at most once.
+        decoder: Decoder for the event data, raising ValueError on invalid
+            input. Defaults to `get_default_decoder`.
+
+    """
+    if decoder is None:
+        decoder = get_default_decoder()
+    setattr(event, _DECODER_ATTRIBUTE, decoder)
+
+
+def is_shared(event: v1.Event) -> bool:
+    """Return whether payload sharing is enabled for an event."""
+    return hasattr(event, _DECODER_ATTRIBUTE)
+
+
+def get_payload(event: v1.Event) -> Any:  # noqa: ANN401
+    """Return the decoded event data, decoding it on first access only.
+
+    Data that is not text (e.g. an already decoded mapping) is returned as is.
+    The cached value is invalidated when ``event.data`` is replaced.
+
+    Raises:
+        ValueError: The event data cannot be decoded. The error is cached as
+            well, so malformed payloads are not decoded again.
+
+    """
+    data = event.data
+    cached: _CachedPayload | None = getattr(event, _CACHE_ATTRIBUTE, None)
+    if cached is None or cached.data is not data:
+        cached = _decode(event, data)
+        setattr(event, _CACHE_ATTRIBUTE, cached)
+
+    if cached.error is not None:
+        raise cached.error
+    return cached.decoded
+
+
+def _decode(event: v1.Event, data: object) -> _CachedPayload:
+    if not isinstance(data, (str, bytes, bytearray, memoryview)):
+        return _CachedPayload(data, data, None)
+
+    decoder: PayloadDecoder | None = getattr(event, _DECODER_ATTRIBUTE, None)
+    if decoder is None:
+        decoder = get_default_decoder()
+    try:
+        return _CachedPayload(data, decoder(data), None)
+    except ValueError as e:
+        return _CachedPayload(data, None, e)
@@ -0,0 +1,131 @@
+"""Bounded-prefix scanner for top-level string fields of a protobuf message.
+
+The scanner walks the wire format of the top-level fields on a memoryview and
+skips the payload of the other fields without copying or decoding it, so a
+traceparent field is read without parsing the whole message.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Union
+
+BinaryData = Union[bytes, bytearray, memoryview]
+
+DEFAULT_MAX_SCAN_BYTES = 64 * 1024
+"""Default number of leading bytes scanned for field tags."""
+
+_INCOMPLETE = -1
+_MAX_VARINT_LENGTH = 10
+_CONTINUATION = 0x80
+_PAYLOAD_BITS = 0x7F
+_WIRE_TYPE_BITS = 3
+_WIRE_TYPE_MASK = 0x07
+
+_VARINT = 0
+_I64 = 1
+_LEN = 2
+_I32 = 5
+_FIXED_LENGTHS = {_I64: 8, _I32: 4}
+
+
+class MalformedMessageError(ValueError):
+    """Raised when the data is not a protobuf message the scanner can walk."""
+
+
+def _read_varint(view: memoryview, pos: int, end: int) -> tuple[int, int]:
+    """Read a varint at ``pos``, returning ``_INCOMPLETE`` if it crosses ``end``."""
+    result = 0
+    for shift in range(0, 7 * _MAX_VARINT_LENGTH, 7):
+        if pos >= end:
+            return _INCOMPLETE, pos
+        byte = view[pos]
+        pos += 1
+        result |= (byte & _PAYLOAD_BITS) << shift
+        if not byte & _CONTINUATION:
+            return result, pos
+    msg = "Varint is too long"
+    raise MalformedMessageError(msg)
+
+
+def _skip_value(
+    view: memoryview, wire_type: int, pos: int, end: int
+) -> tuple[int, int]:
+    """Skip the value at ``pos``, returning its bounds or ``_INCOMPLETE``."""
+    if wire_type == _VARINT:
+        value, value_end = _read_varint(view, pos, end)
+        return pos, _INCOMPLETE if value == _INCOMPLETE else value_end
+    if wire_type == _LEN:
+        length, value_start = _read_varint(view, pos, end)
+        if length == _INCOMPLETE:
+            return value_start, _INCOMPLETE
+        return value_start, value_start + length
+    if wire_type in _FIXED_LENGTHS:
+        return pos, pos + _FIXED_LENGTHS[wire_type]
+    msg = f"Unsupported wire type {wire_type}"
+    raise MalformedMessageError(msg)
+
+
+def _decode_string(view: memoryview, start: int, end: int) -> str | None:
+    try:
+        return str(view[start:end], "utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def scan_string_fields(
+    data: BinaryData,
+    field_numbers: Iterable[int],
+    max_bytes: int | None = DEFAULT_MAX_SCAN_BYTES,
+) -> dict[int, str | None]:
+    """Find the values of top-level string fields without decoding the message.
+
+    Only the fields whose tag starts in the first ``max_bytes`` of ``data`` are
+    inspected, and a wanted field must end in that prefix. Fields found are
+    returned with their decoded string value, or ``None`` when the field is not
+    length-delimited or not valid UTF-8. Fields that are not found are omitted.
+    Unlike a protobuf parser, the first occurrence of a repeated field wins, so
+    the scan can stop as soon as every field is found.
+
+    Args:
+        data: Serialised protobuf message.
+        field_numbers: Top-level field numbers to look for.
+        max_bytes: Scan budget, or ``None`` to scan the whole message.
+
+    Raises:
+        MalformedMessageError: The data is not a valid protobuf message, or
+            uses groups, which the scanner does not walk.
+
+    """
+    wanted = set(field_numbers)
+    found: dict[int, str | None] = {}
+    view = memoryview(data)
+    if view.format != "B" or view.ndim != 1:
+        view = view.cast("B")
+    size = len(view)
+    end = size if max_bytes is None else min(size, max_bytes)
+
+    pos = 0
+    while pos < end and len(found) < len(wanted):
+        tag, pos = _read_varint(view, pos, end)
+        if tag == _INCOMPLETE:
+            value_start = pos = _INCOMPLETE
+        else:
+            value_start, pos = _skip_value(view, tag & _WIRE_TYPE_MASK, pos, end)
+
+        if pos == _INCOMPLETE:
+            if end < size:
+                break
+            msg = "Message ended unexpectedly"
+            raise MalformedMessageError(msg)
+        field_number = tag >> _WIRE_TYPE_BITS
+        if field_number == 0 or pos > size:
+            msg = "Message is malformed"
+            raise MalformedMessageError(msg)
+        if field_number in wanted and field_number not in found:
+            if pos > end:
+                break
+            is_string = tag & _WIRE_TYPE_MASK == _LEN
+            found[field_number] = (
+                _decode_string(view, value_start, pos) if is_string else None
+            )
+    return found
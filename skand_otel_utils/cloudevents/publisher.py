@@ -0,0 +1,85 @@
+"""Trace context injection into outgoing CloudEvents.
+
+The trace headers are formatted once from the current context and reused for
+the whole batch, instead of running the propagators for every event.
+
+```python
+with tracer.start_as_current_span("fan out"):
+    propagate_to_events(events)
+    client.publish_event(
+        pubsub_name, topic, data, publish_metadata=get_publish_metadata()
+    )
+```
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable, Mapping
+
+from skand_otel_utils import propagator
+
+if TYPE_CHECKING:
+    from cloudevents.sdk.event import v1
+
+PUBLISH_METADATA_PREFIX = "cloudevent."
+"""Prefix of the Dapr publish metadata overriding CloudEvent attributes."""
+
+_PUBLISH_METADATA_HEADERS = (
+    propagator.TRACEPARENT_HEADER,
+    propagator.TRACESTATE_HEADER,
+)
+
+
+def propagate_to_events(
+    events: Iterable[v1.Event],
+    headers: Mapping[str, str] | None = None,
+) -> Mapping[str, str]:
+    """Add the trace headers to the extensions of every event of a batch.
+
+    Args:
+        events: Outgoing CloudEvents.
+        headers: Trace headers to add. Defaults to
+            `propagator.get_trace_headers_from_current_trace_context`, formatted
+            once for the batch.
+
+    Returns:
+        The headers added to the events.
+
+    """
+    if headers is None:
+        headers = propagator.get_trace_headers_from_current_trace_context()
+    if headers:
+        for event in events:
+            event.SetExtensions({**event.extensions, **headers})
+    return headers
+
+
+def get_publish_metadata(
+    metadata: Mapping[str, str] | None = None,
+    headers: Mapping[str, str] | None = None,
+) -> dict[str, str]:
+    """Build Dapr publish metadata setting the trace context of the CloudEvent.
+
+    Dapr has no metadata for baggage, so only ``traceparent`` and
+    ``tracestate`` are set.
+
+    Args:
+        metadata: Other publish metadata, kept as is.
+        headers: Trace headers. Defaults to
+            `propagator.get_trace_headers_from_current_trace_context`.
+
+    Returns:
+        The metadata with the ``cloudevent.traceparent`` and
+        ``cloudevent.tracestate`` entries.
+
+    """
+    if headers is None:
+        headers = propagator.get_trace_headers_from_current_trace_context(
+            include_baggage=False
+        )
+    publish_metadata = dict(metadata or {})
+    for header in _PUBLISH_METADATA_HEADERS:
+        value = headers.get(header)
+        if value:
+            publish_metadata[PUBLISH_METADATA_PREFIX + header] = value
+    return publish_metadata
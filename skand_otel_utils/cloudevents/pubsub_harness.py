@@ -0,0 +1,461 @@
+"""In-process stand-in for the Dapr sidecar delivering pub/sub events.
+
+Load-tests decorated CloudEvent handlers without a sidecar or broker. Events
+are generated with a distinct upstream trace each and delivered at a given
+rate and concurrency, either to the handler directly or through the
+subscriptions of a `dapr.ext.grpc.App`. The spans recorded by the handler are
+kept in memory to check that every event continued its upstream trace.
+
+```python
+harness = PubSubHarness()
+
+
+@distributed_trace_context.setup(
+    consumer_span=True, tracer_provider=harness.tracer_provider
+)
+def handler(event: v1.Event) -> TopicEventResponse:
+    pass
+
+
+report = harness.run(handler, events=10_000, rate=2_000, concurrency=16)
+print(report.to_dict())
+```
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import inspect
+import json
+import math
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Iterator, NamedTuple
+
+from cloudevents.sdk.event import v1
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+from opentelemetry.sdk.trace.id_generator import RandomIdGenerator
+
+from skand_otel_utils import propagator
+from skand_otel_utils.cloudevents import _dapr
+from skand_otel_utils.cloudevents._spans import use_span
+from skand_otel_utils.cloudevents.metrics import EXCEPTION_STATUS, NO_RESPONSE_STATUS
+
+if TYPE_CHECKING:
+    from dapr.ext.grpc import App
+    from opentelemetry.sdk.trace import ReadableSpan
+
+DEFAULT_TOPIC = "loadtest"
+"""Topic of the generated events."""
+
+DEFAULT_PUBSUB_NAME = "pubsub"
+"""Pub/sub component name of the generated events."""
+
+LATENCY_PERCENTILES = (50, 90, 99, 100)
+"""Reported latency percentiles, 100 being the maximum."""
+
+
+class GeneratedEvent(NamedTuple):
+    """An event delivered by the harness and the span it was published from."""
+
+    event: v1.Event
+    upstream: trace.SpanContext | None
+
+
+def generate_events(  # noqa: PLR0913
+    count: int,
+    *,
+    topic: str = DEFAULT_TOPIC,
+    pubsub_name: str = DEFAULT_PUBSUB_NAME,
+    payload_size: int = 1024,
+    content_type: str = "application/json",
+    with_traceparent: bool = True,
+) -> Iterator[GeneratedEvent]:
+    """Generate events shaped like the deliveries of the Dapr sidecar.
+
+    Each event has a unique id and, unless disabled, a traceparent extension
+    of its own sampled upstream trace. Like the sidecar, the topic and pub/sub
+    name are set as extensions and the topic as the subject.
+
+    Args:
+        count: Number of events.
+        topic: Topic of the events.
+        pubsub_name: Pub/sub component name of the events.
+        payload_size: Approximate size of the JSON data, in bytes.
+        content_type: Content type of the events.
+        with_traceparent: Give every event an upstream traceparent.
+
+    """
+    id_generator = RandomIdGenerator()
+    data = json.dumps({"payload": "x" * max(payload_size - 16, 0)}).encode()
+    for _ in range(count):
+        upstream = None
+        extensions = {"topic": topic, "pubsubname": pubsub_name}
+        if with_traceparent:
+            upstream = trace.SpanContext(
+                trace_id=id_generator.generate_trace_id(),
+                span_id=id_generator.generate_span_id(),
+                is_remote=True,
+                trace_flags=trace.TraceFlags(trace.TraceFlags.SAMPLED),
+            )
+            extensions[propagator.TRACEPARENT_HEADER] = propagator.format_traceparent(
+                upstream
+            )
+
+        event = v1.Event()
+        event.SetEventID(uuid.uuid4().hex)
+        event.SetEventType("com.skand.loadtest")
+        event.SetSource("skand-otel-utils/pubsub-harness")
+        event.SetSubject(topic)
+        event.SetContentType(content_type)
+        event.SetData(data)
+        event.SetExtensions(extensions)
+        yield GeneratedEvent(event, upstream)
+
+
+class _GrpcContext:
+    """Servicer context of a call without metadata."""
+
+    def invocation_metadata(self) -> tuple[()]:
+        return ()
+
+    def set_code(self, code: object) -> None:
+        pass
+
+
+def app_handler(
+    app: App, pubsub_name: str = DEFAULT_PUBSUB_NAME, topic: str = DEFAULT_TOPIC
+) -> Callable[[v1.Event], object]:
+    """Deliver events through the subscriptions of a Dapr gRPC app.
+
+    Events are converted to the ``TopicEventRequest`` sent by the sidecar and
+    dispatched by the app callback servicer, which rebuilds the event and
+    calls the handler subscribed to the topic, without starting a server.
+
+    Args:
+        app: App whose subscriptions receive the events.
+        pubsub_name: Pub/sub component name of the subscription.
+        topic: Topic of the subscription.
+
+    Returns:
+        A handler for `PubSubHarness.run`, returning the response of the app.
+
+    """
+    from dapr.proto.runtime.v1.appcallback_pb2 import (
+        TopicEventRequest,  # pyright: ignore[reportAttributeAccessIssue]
+    )
+    from google.protobuf.empty_pb2 import Empty
+
+    servicer = app._servicer  # noqa: SLF001
+    grpc_context = _GrpcContext()
+    _, status_type = _dapr.response_types()
+
+    def deliver(event: v1.Event) -> str:
+        request = TopicEventRequest(
+            id=event.id,
+            source=event.source,
+            type=event.type,
+            spec_version="1.0",
+            data_content_type=event.content_type,
+            data=event.data,
+            topic=topic,
+            pubsub_name=pubsub_name,
+        )
+        request.extensions.update(event.extensions)
+        response = servicer.OnTopicEvent(request, grpc_context)
+        if isinstance(response, Empty):
+            return NO_RESPONSE_STATUS
+        return status_type(response.status).name
+
+    return deliver
+
+
+def simulated_handler(
+    tracer_provider: trace.TracerProvider | None = None,
+    *,
+    work_seconds: float = 0.0,
+    span_name: str = "handle",
+) -> Callable[[v1.Event], object]:
+    """Create an undecorated handler doing traced work, to be decorated.
+
+    Args:
+        tracer_provider: Provider of the tracer of the work span, e.g.
+            `PubSubHarness.tracer_provider`.
+        work_seconds: Time spent sleeping in the work span.
+        span_name: Name of the work span.
+
+    Returns:
+        A handler starting a span and answering with a success.
+
+    """
+    tracer = trace.get_tracer(__name__, tracer_provider=tracer_provider)
+    response_type, status_type = _dapr.response_types()
+    success = response_type(status_type.success)
+
+    def handler(_: v1.Event) -> object:
+        with use_span(tracer.start_span(span_name), end_on_exit=True):
+            if work_seconds:
+                time.sleep(work_seconds)
+        return success
+
+    return handler
+
+
+def _percentile(sorted_values: list[float], percentile: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(percentile / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+@dataclasses.dataclass(frozen=True)
+class LoadReport:
+    """Outcome of a load test run.
+
+    Latencies are measured from the time each event was due to be delivered,
+    so time spent waiting for a free handler slot when the handler cannot
+    keep up with the rate is included.
+
+    Attributes:
+        events: Number of events delivered.
+        duration_seconds: Time from the first delivery to the last response.
+        statuses: Number of events per handler status, see
+            `metrics.HANDLER_STATUS_ATTRIBUTE`.
+        latency_seconds: Latency per percentile, keyed ``p50``, ``p90``,
+            ``p99`` and ``p100``.
+        spans: Number of spans recorded by the handler.
+        traced_events: Events with an upstream traceparent whose trace has
+            spans recorded by the handler.
+        untraced_events: Events with an upstream traceparent whose trace has
+            no span, e.g. because the handler started none.
+        orphan_spans: Spans outside of every upstream trace, such as new
+            roots started when propagation failed.
+        misparented_spans: Spans of an upstream trace whose parent is neither
+            the upstream span nor another span of the trace.
+
+    """
+
+    events: int
+    duration_seconds: float
+    statuses: dict[str, int]
+    latency_seconds: dict[str, float]
+    spans: int
+    traced_events: int
+    untraced_events: int
+    orphan_spans: int
+    misparented_spans: int
+
+    @property
+    def throughput(self) -> float:
+        """Events handled per second."""
+        return self.events / self.duration_seconds if self.duration_seconds else 0.0
+
+    @property
+    def trace_correct(self) -> bool:
+        """Whether every event continued its upstream trace and only it."""
+        return not (self.untraced_events or self.orphan_spans or self.misparented_spans)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return a JSON serialisable representation."""
+        return {
+            **dataclasses.asdict(self),
+            "throughput": self.throughput,
+            "trace_correct": self.trace_correct,
+        }
+
+
+def _check_traces(
+    spans: tuple[ReadableSpan, ...], upstreams: list[trace.SpanContext]
+) -> dict[str, int]:
+    upstream_span_ids = {upstream.trace_id: upstream.span_id for upstream in upstreams}
+    # Finished SDK spans always have a context
+    contexts = [
+        (span.context, span.parent) for span in spans if span.context is not None
+    ]
+    span_ids: dict[int, set[int]] = defaultdict(set)
+    for context, _ in contexts:
+        span_ids[context.trace_id].add(context.span_id)
+
+    orphans = misparented = 0
+    for context, parent in contexts:
+        trace_id = context.trace_id
+        if trace_id not in upstream_span_ids:
+            orphans += 1
+            continue
+        parent_id = parent.span_id if parent is not None else None
+        if parent_id != upstream_span_ids[trace_id] and (
+            parent_id not in span_ids[trace_id]
+        ):
+            misparented += 1
+
+    traced = len(upstream_span_ids.keys() & span_ids.keys())
+    return {
+        "spans": len(spans),
+        "traced_events": traced,
+        "untraced_events": len(upstream_span_ids) - traced,
+        "orphan_spans": orphans,
+        "misparented_spans": misparented,
+    }
+
+
+def _status(result: object) -> str:
+    if isinstance(result, str):
+        return result
+    response_type, _ = _dapr.response_types()
+    return (
+        result.status.name if isinstance(result, response_type) else NO_RESPONSE_STATUS
+    )
+
+
+class PubSubHarness:
+    """Deliver generated events to a handler and report how it coped.
+
+    Attributes:
+        exporter: Exporter keeping the spans of the current run.
+        tracer_provider: Provider the handler under test should record its
+            spans with, e.g. through the ``tracer_provider`` argument of
+            `distributed_trace_context.setup`.
+
+    """
+
+    def __init__(self) -> None:
+        """Create the in-memory tracer provider."""
+        self.exporter = InMemorySpanExporter()
+        self.tracer_provider = TracerProvider()
+        self.tracer_provider.add_span_processor(SimpleSpanProcessor(self.exporter))
+
+    def run(
+        self,
+        handler: Callable[[v1.Event], object] | Callable[[v1.Event], Awaitable[object]],
+        *,
+        events: int = 1000,
+        rate: float | None = None,
+        concurrency: int = 1,
+        **event_options: Any,  # noqa: ANN401
+    ) -> LoadReport:
+        """Deliver events to the handler and measure the run.
+
+        Synchronous handlers are called from a pool of ``concurrency`` threads,
+        coroutine handlers from as many concurrent tasks. Like the sidecar
+        with a maximum concurrency, an event is only delivered once a handler
+        slot is free. Spans of previous runs are discarded.
+
+        Args:
+            handler: Decorated handler under test, or `app_handler`.
+            events: Number of events delivered.
+            rate: Target deliveries per second, or None to deliver as fast as
+                the handler slots allow.
+            concurrency: Maximum number of events handled at once.
+            **event_options: Options of `generate_events`.
+
+        Returns:
+            The load report.
+
+        """
+        if concurrency < 1:
+            msg = "concurrency must be positive"
+            raise ValueError(msg)
+        generated = list(generate_events(events, **event_options))
+        self.exporter.clear()
+
+        start = time.perf_counter()
+        if inspect.iscoroutinefunction(handler):
+            outcomes = asyncio.run(
+                self._run_async(handler, generated, rate, concurrency, start)
+            )
+        else:
+            outcomes = self._run_threads(handler, generated, rate, concurrency, start)
+        duration = time.perf_counter() - start
+
+        latencies = sorted(latency for _, latency in outcomes)
+        return LoadReport(
+            events=len(outcomes),
+            duration_seconds=duration,
+            statuses=dict(Counter(status for status, _ in outcomes)),
+            latency_seconds={
+                f"p{percentile}": _percentile(latencies, percentile)
+                for percentile in LATENCY_PERCENTILES
+            },
+            **_check_traces(
+                self.exporter.get_finished_spans(),
+                [item.upstream for item in generated if item.upstream is not None],
+            ),
+        )
+
+    @staticmethod
+    def _wait_until(due: float | None) -> float:
+        now = time.perf_counter()
+        if due is None:
+            return now
+        if due > now:
+            time.sleep(due - now)
+        return due
+
+    def _run_threads(
+        self,
+        handler: Callable[[v1.Event], object],
+        generated: list[GeneratedEvent],
+        rate: float | None,
+        concurrency: int,
+        start: float,
+    ) -> list[tuple[str, float]]:
+        slots = threading.BoundedSemaphore(concurrency)
+
+        def deliver(event: v1.Event, due: float) -> tuple[str, float]:
+            try:
+                status = _status(handler(event))
+            except Exception:  # noqa: BLE001
+                status = EXCEPTION_STATUS
+            finally:
+                slots.release()
+            return status, time.perf_counter() - due
+
+        with ThreadPoolExecutor(concurrency) as executor:
+            futures = []
+            for index, item in enumerate(generated):
+                due = self._wait_until(start + index / rate if rate else None)
+                slots.acquire()
+                futures.append(executor.submit(deliver, item.event, due))
+            return [future.result() for future in futures]
+
+    async def _run_async(
+        self,
+        handler: Callable[[v1.Event], Awaitable[object]],
+        generated: list[GeneratedEvent],
+        rate: float | None,
+        concurrency: int,
+        start: float,
+    ) -> list[tuple[str, float]]:
+        slots = asyncio.Semaphore(concurrency)
+
+        async def deliver(event: v1.Event, due: float) -> tuple[str, float]:
+            try:
+                status = _status(await handler(event))
+            except Exception:  # noqa: BLE001
+                status = EXCEPTION_STATUS
+            finally:
+                slots.release()
+            return status, time.perf_counter() - due
+
+        tasks = []
+        for index, item in enumerate(generated):
+            due = start + index / rate if rate else None
+            if due is not None and due > time.perf_counter():
+                await asyncio.sleep(due - time.perf_counter())
+            await slots.acquire()
+            tasks.append(
+                asyncio.ensure_future(
+                    deliver(item.event, time.perf_counter() if due is None else due)
+                )
+            )
+        return list(await asyncio.gather(*tasks))
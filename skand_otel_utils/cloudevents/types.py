@@ -1,6 +1,44 @@
-from typing import Callable
+from typing import (
+    TYPE_CHECKING,
+    Awaitable,
+    Callable,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
-from cloudevents.sdk.event import v1
-from dapr.clients.grpc._response import TopicEventResponse
+from skand_otel_utils.propagator import TraceCarrier
 
-CloudEventHandler = Callable[[v1.Event], TopicEventResponse]
+if TYPE_CHECKING:
+    from cloudevents.sdk.event import v1
+    from dapr.clients.grpc._response import TopicEventResponse
+
+# The CloudEvent and Dapr types are forward references, so that importing the
+# aliases does not load cloudevents, dapr and grpc
+CloudEventHandler = Callable[["v1.Event"], "TopicEventResponse"]
+
+AsyncCloudEventHandler = Callable[["v1.Event"], Awaitable["TopicEventResponse"]]
+
+# Handlers may return anything else, such as None, which Dapr answers with an
+# empty response, so the decorators keep the type of any event handler
+CloudEventHandlerT = TypeVar("CloudEventHandlerT", bound=Callable[["v1.Event"], object])
+
+BulkTopicEventResponse = Union[
+    "TopicEventResponse", Sequence[Optional["TopicEventResponse"]]
+]
+
+BulkCloudEventHandler = Callable[[Sequence["v1.Event"]], BulkTopicEventResponse]
+
+AsyncBulkCloudEventHandler = Callable[
+    [Sequence["v1.Event"]], Awaitable[BulkTopicEventResponse]
+]
+
+BulkCloudEventHandlerT = TypeVar(
+    "BulkCloudEventHandlerT", bound=Callable[[Sequence["v1.Event"]], object]
+)
+
+TraceparentExtractorFunc = Callable[["v1.Event"], Optional[Union[str, TraceCarrier]]]
+
+TraceparentExtraction = Tuple[Optional[Union[str, TraceCarrier]], Optional[str]]
@@ -0,0 +1,164 @@
+"""Executors running submitted callables under the trace context of the submitter.
+
+The OTel context is stored in context variables, which worker threads and
+processes do not inherit, so spans started by pooled work would otherwise
+become new roots.
+
+```python
+@distributed_trace_context.setup()
+def handler(event: v1.Event) -> TopicEventResponse:
+    with ContextPropagatingThreadPoolExecutor() as executor:
+        tiles = list(executor.map(build_tile, tile_ids))
+```
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Mapping, TypeVar
+
+from opentelemetry import context, trace
+
+from skand_otel_utils import propagator
+
+if TYPE_CHECKING:
+    from multiprocessing.context import BaseContext
+
+_T = TypeVar("_T")
+
+
+def _run_in_context(
+    trace_context: context.Context,
+    fn: Callable[..., _T],
+    /,
+    *args: Any,  # noqa: ANN401
+    **kwargs: Any,  # noqa: ANN401
+) -> _T:
+    token = context.attach(trace_context)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        context.detach(token)
+
+
+def _flush_spans() -> None:
+    force_flush = getattr(trace.get_tracer_provider(), "force_flush", None)
+    if force_flush is not None:
+        force_flush()
+
+
+def _run_with_trace_headers(
+    headers: Mapping[str, str],
+    flush_spans: bool,  # noqa: FBT001
+    fn: Callable[..., _T],
+    /,
+    *args: Any,  # noqa: ANN401
+    **kwargs: Any,  # noqa: ANN401
+) -> _T:
+    # Forked workers inherit the context of the thread that forked them, so an
+    # empty context is attached when the submitter had no trace
+    traceparent = headers.get(propagator.TRACEPARENT_HEADER)
+    trace_context = (
+        propagator.extract_context_from_carrier(
+            propagator.TraceCarrier(
+                traceparent,
+                headers.get(propagator.TRACESTATE_HEADER),
+                headers.get(propagator.BAGGAGE_HEADER),
+            )
+        )
+        if traceparent
+        else context.Context()
+    )
+    token = context.attach(trace_context)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        context.detach(token)
+        if flush_spans:
+            _flush_spans()
+
+
+class ContextPropagatingThreadPoolExecutor(ThreadPoolExecutor):
+    """Thread pool whose workers run each callable under the submitter's context.
+
+    The current OTel context, with its span and baggage, is captured when a
+    callable is submitted, including through `map`, and attached in the worker
+    thread for the duration of the call.
+    """
+
+    def submit(
+        self,
+        fn: Callable[..., _T],
+        /,
+        *args: Any,  # noqa: ANN401
+        **kwargs: Any,  # noqa: ANN401
+    ) -> Future[_T]:
+        """Submit a callable to run under the current context."""
+        return super().submit(
+            _run_in_context, context.get_current(), fn, *args, **kwargs
+        )
+
+
+class ContextPropagatingProcessPoolExecutor(ProcessPoolExecutor):
+    """Process pool whose workers run each callable under the submitter's trace.
+
+    Contexts cannot be pickled, so the W3C trace headers of the current context
+    are sent with each callable and extracted in the worker process, where the
+    spans of the callable are children of the submitter's span.
+
+    Worker processes need their own tracing setup: forked workers inherit the
+    tracer provider of the parent, spawned ones start without one. Pass an
+    ``initializer`` configuring tracing when the start method is not ``fork``,
+    or install the providers of the parent with `bootstrap.install_providers`,
+    whose exporters are fork-safe. Pool workers exit without
+    running ``atexit`` handlers, so the spans of each callable are flushed when
+    it returns unless disabled.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        mp_context: BaseContext | None = None,
+        initializer: Callable[..., object] | None = None,
+        initargs: tuple[Any, ...] = (),
+        *,
+        flush_spans: bool = True,
+    ) -> None:
+        """Initialize the executor.
+
+        Args:
+            max_workers: Number of worker processes, see `ProcessPoolExecutor`.
+            mp_context: Multiprocessing context used to start the workers.
+                Defaults to the default start method.
+            initializer: Called in each worker process when it starts, e.g. to
+                configure tracing.
+            initargs: Arguments of ``initializer``.
+            flush_spans: Flush the spans of the worker tracer provider after
+                each callable.
+
+        """
+        super().__init__(
+            max_workers,
+            mp_context or multiprocessing.get_context(),
+            initializer,
+            initargs,
+        )
+        self.flush_spans = flush_spans
+
+    def submit(
+        self,
+        fn: Callable[..., _T],
+        /,
+        *args: Any,  # noqa: ANN401
+        **kwargs: Any,  # noqa: ANN401
+    ) -> Future[_T]:
+        """Submit a picklable callable to run under the current trace context."""
+        return super().submit(
+            _run_with_trace_headers,
+            propagator.get_trace_headers_from_current_trace_context(),
+            self.flush_spans,
+            fn,
+            *args,
+            **kwargs,
+        )
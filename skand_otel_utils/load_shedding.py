@@ -0,0 +1,34 @@
+"""Load shedding of optional instrumentation work.
+
+During traffic spikes the span export queue can fill up faster than it is
+exported. A hook, installed by `bootstrap.configure_tracing`, tells the
+CloudEvent decorators when it is near full, and they then skip their optional
+work, such as the payload span events, so that instrumentation does not
+become the bottleneck.
+"""
+
+from __future__ import annotations
+
+from typing import Callable
+
+LoadSheddingHook = Callable[[], bool]
+"""Returns True when optional instrumentation work should be skipped."""
+
+_hook: LoadSheddingHook | None = None
+
+
+def set_hook(hook: LoadSheddingHook | None) -> None:
+    """Install the process-wide load shedding hook, or remove it if None."""
+    global _hook  # noqa: PLW0603
+    _hook = hook
+
+
+def get_hook() -> LoadSheddingHook | None:
+    """Return the installed load shedding hook, if any."""
+    return _hook
+
+
+def should_shed() -> bool:
+    """Whether optional instrumentation work should be skipped now."""
+    hook = _hook
+    return hook is not None and hook()
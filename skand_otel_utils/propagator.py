@@ -1,10 +1,230 @@
 from __future__ import annotations
 
-from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+import functools
+import re
+from typing import NamedTuple
+from urllib.parse import quote_plus
+
+from opentelemetry import baggage, trace
+from opentelemetry.baggage.propagation import W3CBaggagePropagator
+from opentelemetry.context.context import Context
+
+TRACEPARENT_HEADER = "traceparent"
+TRACESTATE_HEADER = "tracestate"
+BAGGAGE_HEADER = "baggage"
+
+TRACEPARENT_CACHE_SIZE = 1024
+"""Number of distinct traceparent strings whose parsed context is cached."""
+
+TRACE_CARRIER_CACHE_SIZE = 1024
+"""Number of distinct tracestate, baggage and carrier values whose parse is cached."""
+
+MAX_TRACESTATE_LENGTH = 512
+"""Longest tracestate header extracted, W3C only requires propagating 512 chars."""
+
+MAX_BAGGAGE_LENGTH = 8192
+"""Longest baggage header extracted, the W3C limit of a baggage-string."""
+
+_MAX_TRACEPARENT_LENGTH = 512
+# Same pattern as TraceContextTextMapPropagator, whose ``$`` also accepts a
+# trailing newline
+_TRACEPARENT_RE = re.compile(
+    r"^[ \t]*([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?[ \t]*$"
+)
+_INVALID_TRACE_ID = "0" * 32
+_INVALID_SPAN_ID = "0" * 16
+_EMPTY_CONTEXT = Context()
+_BAGGAGE_PROPAGATOR = W3CBaggagePropagator()
+
+
+class TraceCarrier(NamedTuple):
+    """W3C trace headers carried by a message.
+
+    Attributes:
+        traceparent: The traceparent header.
+        tracestate: The tracestate header, if any.
+        baggage: The baggage header, if any.
+
+    """
+
+    traceparent: str
+    tracestate: str | None = None
+    baggage: str | None = None
+
+
+def get_carrier_traceparent(carrier: str | TraceCarrier | None) -> str | None:
+    """Return the traceparent of a carrier or of a plain traceparent string."""
+    if isinstance(carrier, TraceCarrier):
+        return carrier.traceparent
+    return carrier
+
+
+def format_traceparent(span_context: trace.SpanContext) -> str:
+    """Format a W3C traceparent string from a span context."""
+    return (
+        f"00-{span_context.trace_id:032x}-{span_context.span_id:016x}"
+        f"-{span_context.trace_flags:02x}"
+    )
 
 
 def get_traceparent_from_current_trace_context() -> str | None:
     """Get traceparent from current trace context."""
-    carrier: dict[str, str] = {}
-    TraceContextTextMapPropagator().inject(carrier)
-    return carrier.get(TraceContextTextMapPropagator._TRACEPARENT_HEADER_NAME)  # noqa: SLF001
+    span_context = trace.get_current_span().get_span_context()
+    if span_context == trace.INVALID_SPAN_CONTEXT:
+        return None
+    return format_traceparent(span_context)
+
+
+def get_trace_headers_from_current_trace_context(
+    *, include_baggage: bool = True
+) -> dict[str, str]:
+    """Get the W3C trace headers of the current trace context.
+
+    The headers are formatted once from the current span context and baggage,
+    so they can be reused for every message published in the same context.
+
+    Args:
+        include_baggage: Include the ``baggage`` header when there is baggage.
+
+    Returns:
+        The ``traceparent`` header, with ``tracestate`` and ``baggage`` when
+        not empty, or no headers without a valid current span context.
+
+    """
+    headers: dict[str, str] = {}
+    span_context = trace.get_current_span().get_span_context()
+    if span_context.is_valid:
+        headers[TRACEPARENT_HEADER] = format_traceparent(span_context)
+        if span_context.trace_state:
+            headers[TRACESTATE_HEADER] = span_context.trace_state.to_header()
+
+    if include_baggage:
+        baggage_entries = baggage.get_all()
+        if baggage_entries:
+            headers[BAGGAGE_HEADER] = ",".join(
+                f"{quote_plus(str(key))}={quote_plus(str(value))}"
+                for key, value in baggage_entries.items()
+            )
+    return headers
+
+
+def _parse_traceparent(traceparent: str) -> trace.SpanContext | None:
+    """Validate and parse a traceparent the way the W3C propagator does."""
+    match = _TRACEPARENT_RE.search(traceparent)
+    if not match:
+        return None
+
+    version, trace_id, span_id, trace_flags, future = match.groups()
+    if trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+        return None
+    if version == "ff" or (version == "00" and future):
+        return None
+
+    return trace.SpanContext(
+        trace_id=int(trace_id, 16),
+        span_id=int(span_id, 16),
+        is_remote=True,
+        trace_flags=trace.TraceFlags(int(trace_flags, 16)),
+    )
+
+
+@functools.lru_cache(maxsize=TRACEPARENT_CACHE_SIZE)
+def _extract_context_from_traceparent(traceparent: str) -> Context:
+    span_context = _parse_traceparent(traceparent)
+    if span_context is None:
+        return _EMPTY_CONTEXT
+    return trace.set_span_in_context(trace.NonRecordingSpan(span_context), Context())
+
+
+def extract_context_from_traceparent(traceparent: str) -> Context:
+    """Extract a context holding the remote span of a W3C traceparent string.
+
+    Equivalent to ``TraceContextTextMapPropagator().extract`` on a carrier with
+    only a traceparent, without the propagator and carrier machinery. Results,
+    including those of invalid strings, are kept in a bounded LRU cache, so
+    redeliveries and events sharing a parent are not parsed again.
+
+    Args:
+        traceparent: W3C traceparent string (e.g., '00-trace-id-span-id-flags')
+
+    Returns:
+        The context with the remote span, or an empty context if invalid.
+
+    """
+    if not isinstance(traceparent, str) or len(traceparent) > _MAX_TRACEPARENT_LENGTH:
+        return _EMPTY_CONTEXT
+    return _extract_context_from_traceparent(traceparent)
+
+
+@functools.lru_cache(maxsize=TRACE_CARRIER_CACHE_SIZE)
+def _parse_tracestate(tracestate: str) -> trace.TraceState:
+    return trace.TraceState.from_header([tracestate])
+
+
+@functools.lru_cache(maxsize=TRACE_CARRIER_CACHE_SIZE)
+def _extract_baggage_context(baggage_header: str) -> Context:
+    return _BAGGAGE_PROPAGATOR.extract(
+        {BAGGAGE_HEADER: baggage_header}, context=_EMPTY_CONTEXT
+    )
+
+
+@functools.lru_cache(maxsize=TRACE_CARRIER_CACHE_SIZE)
+def _extract_context_from_carrier(carrier: TraceCarrier) -> Context:
+    span_context = _parse_traceparent(carrier.traceparent)
+    if span_context is None:
+        return _EMPTY_CONTEXT
+
+    if carrier.tracestate and len(carrier.tracestate) <= MAX_TRACESTATE_LENGTH:
+        span_context = trace.SpanContext(
+            trace_id=span_context.trace_id,
+            span_id=span_context.span_id,
+            is_remote=True,
+            trace_flags=span_context.trace_flags,
+            trace_state=_parse_tracestate(carrier.tracestate),
+        )
+    parent = _EMPTY_CONTEXT
+    if carrier.baggage and len(carrier.baggage) <= MAX_BAGGAGE_LENGTH:
+        parent = _extract_baggage_context(carrier.baggage)
+    return trace.set_span_in_context(trace.NonRecordingSpan(span_context), parent)
+
+
+def extract_context_from_carrier(carrier: TraceCarrier | str) -> Context:
+    """Extract a context holding the remote span and baggage of a carrier.
+
+    Equivalent to the W3C trace context and baggage propagators on a carrier
+    with the three headers. The parsed tracestate and baggage headers and the
+    composite contexts are kept in bounded LRU caches, as events of a tenant
+    or a workflow usually share them. Headers longer than
+    `MAX_TRACESTATE_LENGTH` or `MAX_BAGGAGE_LENGTH` are ignored.
+
+    Args:
+        carrier: The trace headers of a message, or only its traceparent.
+
+    Returns:
+        The context with the remote span and baggage, or an empty context if
+        the traceparent is invalid.
+
+    """
+    if not isinstance(carrier, TraceCarrier):
+        return extract_context_from_traceparent(carrier)
+    if not carrier.tracestate and not carrier.baggage:
+        return extract_context_from_traceparent(carrier.traceparent)
+    if (
+        not isinstance(carrier.traceparent, str)
+        or len(carrier.traceparent) > _MAX_TRACEPARENT_LENGTH
+    ):
+        return _EMPTY_CONTEXT
+    return _extract_context_from_carrier(carrier)
+
+
+def parse_traceparent(traceparent: str) -> trace.SpanContext | None:
+    """Parse a W3C traceparent string into a remote span context.
+
+    Returns:
+        The remote span context, or None if the traceparent is invalid.
+
+    """
+    span_context = trace.get_current_span(
+        extract_context_from_traceparent(traceparent)
+    ).get_span_context()
+    return span_context if span_context.is_valid else None
@@ -0,0 +1,147 @@
+"""Samplers capping the trace volume of CloudEvent consumers."""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Hashable, Sequence
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace.sampling import Decision, Sampler, SamplingResult
+from opentelemetry.semconv.trace import SpanAttributes
+
+if TYPE_CHECKING:
+    from opentelemetry.context.context import Context
+    from opentelemetry.util.types import Attributes
+
+DEFAULT_KEY_ATTRIBUTES = (
+    SpanAttributes.MESSAGING_DESTINATION_NAME,
+    SpanAttributes.CLOUDEVENTS_EVENT_TYPE,
+)
+"""Attributes whose values select the budget of a span: topic and event type."""
+
+DEFAULT_MAX_KEYS = 1024
+"""Number of distinct keys with their own budget, the others share one."""
+
+_OVERFLOW_KEY = ("__overflow__",)
+
+
+class _TokenBucket:
+    """Token bucket refilled continuously, guarded by its own lock."""
+
+    __slots__ = ("_last", "_lock", "_tokens")
+
+    def __init__(self, tokens: float, now: float) -> None:
+        self._lock = threading.Lock()
+        self._tokens = tokens
+        self._last = now
+
+    def take(self, rate: float, capacity: float, now: float) -> bool:
+        with self._lock:
+            self._tokens = min(capacity, self._tokens + (now - self._last) * rate)
+            self._last = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RateLimitingSampler(Sampler):
+    """Sample at most a number of spans per second per topic and event type.
+
+    Each key, made of the values of ``key_attributes``, has its own token
+    bucket, so a spike on one topic does not use the budget of the others.
+    Buckets only lock themselves, and the bucket of a known key is found
+    without locking, so threads handling different topics do not contend.
+
+    The sampler can be passed to `distributed_trace_context.setup` as the head
+    sampler, which provides the topic and event type attributes, or used by a
+    tracer provider for the consumer spans, but should not be used for both:
+    each decision takes a token.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        spans_per_second: float,
+        *,
+        burst: float | None = None,
+        key_attributes: Sequence[str] = DEFAULT_KEY_ATTRIBUTES,
+        respect_parent: bool = False,
+        max_keys: int = DEFAULT_MAX_KEYS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the sampler.
+
+        Args:
+            spans_per_second: Budget of each key, in sampled spans per second.
+            burst: Number of spans a key can sample at once after being idle.
+                Defaults to one second of budget, and at least one span.
+            key_attributes: Attributes whose values select the budget of a span.
+            respect_parent: Follow the sampled flag of a valid parent instead of
+                the budget, as a parent-based sampler does. Root spans always
+                use the budget.
+            max_keys: Number of distinct keys with their own budget. Spans of
+                further keys share a single budget.
+            clock: Monotonic clock, in seconds.
+
+        """
+        if spans_per_second < 0:
+            msg = "spans_per_second must not be negative"
+            raise ValueError(msg)
+        self.spans_per_second = spans_per_second
+        self.burst = max(spans_per_second, 1.0) if burst is None else burst
+        self.key_attributes = tuple(key_attributes)
+        self.respect_parent = respect_parent
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets: dict[Hashable, _TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+
+    def _bucket(self, key: Hashable, now: float) -> _TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            return bucket
+
+        with self._buckets_lock:
+            if key not in self._buckets and len(self._buckets) >= self.max_keys:
+                key = _OVERFLOW_KEY
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = _TokenBucket(self.burst, now)
+                self._buckets[key] = bucket
+            return bucket
+
+    def _key(self, attributes: Attributes) -> Hashable:
+        if not attributes:
+            return (None,) * len(self.key_attributes)
+        return tuple(attributes.get(key) for key in self.key_attributes)
+
+    def should_sample(  # noqa: PLR0913
+        self,
+        parent_context: Context | None,
+        trace_id: int,  # noqa: ARG002
+        name: str,  # noqa: ARG002
+        kind: trace.SpanKind | None = None,  # noqa: ARG002
+        attributes: Attributes = None,
+        links: Sequence[trace.Link] | None = None,  # noqa: ARG002
+        trace_state: trace.TraceState | None = None,
+    ) -> SamplingResult:
+        """Take a token from the budget of the span key."""
+        parent_span_context = trace.get_current_span(parent_context).get_span_context()
+        if self.respect_parent and parent_span_context.is_valid:
+            sampled = parent_span_context.trace_flags.sampled
+        else:
+            now = self._clock()
+            sampled = self._bucket(self._key(attributes), now).take(
+                self.spans_per_second, self.burst, now
+            )
+
+        if trace_state is None and parent_span_context.is_valid:
+            trace_state = parent_span_context.trace_state
+        if not sampled:
+            return SamplingResult(Decision.DROP, None, trace_state)
+        return SamplingResult(Decision.RECORD_AND_SAMPLE, attributes, trace_state)
+
+    def get_description(self) -> str:
+        """Describe the sampler."""
+        return f"RateLimitingSampler{{{self.spans_per_second}/s per key}}"
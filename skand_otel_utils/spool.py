@@ -0,0 +1,560 @@
+"""Span exporter spooling to disk the batches its downstream exporter fails.
+
+When the collector is slow or restarting, the batch span processor queue
+fills up and spans are dropped exactly during the incidents worth tracing.
+`SpoolingSpanExporter` appends the batches its downstream exporter could not
+export to a local, size-capped spool as serialised OTLP requests, and a
+background thread replays them in order once the downstream recovers.
+
+```python
+exporter = SpoolingSpanExporter(
+    OTLPSpanExporter(), f"/var/spool/otel/worker-{worker_index}", max_bytes=256 << 20
+)
+tracer_provider.add_span_processor(BatchSpanProcessor(exporter))
+```
+
+The directory is per worker slot, such as the index the process manager gives
+each worker, rather than per process, so the spans spooled by a worker are
+replayed by the one restarted in its place. Replay is at least once: batches
+of a segment being replayed when the process stops are exported again by the
+next process using the spool.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Generator, Iterator, Sequence, cast
+
+from opentelemetry import trace
+from opentelemetry.attributes import BoundedAttributes
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import Event, ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from opentelemetry.sdk.util.instrumentation import InstrumentationScope
+
+if TYPE_CHECKING:
+    from opentelemetry.proto.common.v1.common_pb2 import AnyValue, KeyValue
+    from opentelemetry.proto.trace.v1.trace_pb2 import Span as SpanProto
+    from opentelemetry.util.types import AttributeValue
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_BYTES = 4 << 20
+"""Size above which the spool starts a new segment file."""
+
+DEFAULT_MAX_BYTES = 128 << 20
+"""Size of the spool above which its oldest segments are deleted."""
+
+DEFAULT_RETRY_INTERVAL = 1.0
+"""Seconds between the first replay attempts, doubled after each failure."""
+
+DEFAULT_MAX_RETRY_INTERVAL = 60.0
+"""Maximum number of seconds between two replay attempts."""
+
+SEGMENT_SUFFIX = ".spool"
+"""Suffix of the segment files."""
+
+_RECORD_HEADER = struct.Struct(">II")
+# SpanFlags.SPAN_FLAGS_CONTEXT_IS_REMOTE_MASK, kept here not to import protobuf
+_CONTEXT_IS_REMOTE_MASK = 0x200
+_SEGMENT_NAME_DIGITS = 16
+
+
+def _iter_records(data: memoryview, offset: int) -> Iterator[tuple[int, memoryview]]:
+    """Read the length-prefixed records of a segment up to the first torn one.
+
+    Each record is yielded with the offset of the next one, as a view of
+    ``data`` released when the iteration resumes.
+    """
+    pos = offset
+    while pos + _RECORD_HEADER.size <= len(data):
+        length, checksum = _RECORD_HEADER.unpack_from(data, pos)
+        start = pos + _RECORD_HEADER.size
+        with data[start : start + length] as record:
+            if len(record) < length or zlib.crc32(record) != checksum:
+                logger.warning("Skipping the torn end of a spool segment")
+                return
+            pos = start + length
+            yield pos, record
+
+
+class SegmentedSpool:
+    """Append-only log of records split into size-capped segment files.
+
+    Records are appended to the newest segment, which is sealed when it grows
+    above ``segment_bytes`` or is read. Segments are read and removed oldest
+    first. When the spool would grow above ``max_bytes``, its oldest segments
+    are deleted to make room, except the one being read. Each record is stored
+    with its length and CRC32, so a record torn by a crash ends the segment.
+    The spool is not safe for use by several processes.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike[str],
+        *,
+        segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        use_mmap: bool = False,
+    ) -> None:
+        """Open the spool, keeping the segments already in ``directory``.
+
+        Args:
+            directory: Directory of the segment files, created if missing.
+            segment_bytes: Size above which a new segment is started.
+            max_bytes: Maximum size of the spool.
+            use_mmap: Read segments through a memory map rather than into
+                memory.
+
+        """
+        if segment_bytes > max_bytes:
+            msg = "segment_bytes must not exceed max_bytes"
+            raise ValueError(msg)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.use_mmap = use_mmap
+        self.dropped_bytes = 0
+        self._lock = threading.Lock()
+        # Other files, such as editor backups, are not segments of the spool
+        self._segments = sorted(
+            path
+            for path in self.directory.glob(f"*{SEGMENT_SUFFIX}")
+            if path.stem.isdigit()
+        )
+        self._sizes = {path: path.stat().st_size for path in self._segments}
+        self._next_sequence = int(self._segments[-1].stem) + 1 if self._segments else 0
+        self._active: Path | None = None
+        self._file: BinaryIO | None = None
+        self._reading: Path | None = None
+
+    @property
+    def size(self) -> int:
+        """Number of bytes in the spool."""
+        return sum(self._sizes.values())
+
+    def __bool__(self) -> bool:
+        """Whether the spool has segments left to read."""
+        return bool(self._segments)
+
+    def _seal(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = self._active = None
+
+    def _evict(self, needed: int) -> bool:
+        """Delete the oldest segments not being read until ``needed`` fits.
+
+        Returns:
+            False, deleting nothing, if ``needed`` does not fit even then.
+
+        """
+        size = self.size
+        evictable = [path for path in self._segments if path != self._reading]
+        kept = size - sum(self._sizes[path] for path in evictable)
+        if kept + needed > self.max_bytes:
+            return False
+        while size + needed > self.max_bytes:
+            oldest = evictable.pop(0)
+            self._segments.remove(oldest)
+            if oldest == self._active:
+                self._seal()
+            dropped = self._sizes.pop(oldest)
+            size -= dropped
+            self.dropped_bytes += dropped
+            logger.warning("Spool is full, dropping %d bytes of spans", dropped)
+            with contextlib.suppress(FileNotFoundError):
+                oldest.unlink()
+        return True
+
+    def append(self, record: bytes) -> bool:
+        """Append a record, returning False if it does not fit in the spool.
+
+        A record does not fit when it is larger than the spool, or than the
+        room left by the segment being read, which is not deleted.
+        """
+        needed = _RECORD_HEADER.size + len(record)
+        with self._lock:
+            if not self._evict(needed):
+                self.dropped_bytes += needed
+                return False
+            active, file = self._active, self._file
+            if active is not None and self._sizes[active] + needed > self.segment_bytes:
+                self._seal()
+                active = file = None
+            if active is None or file is None:
+                name = f"{self._next_sequence:0{_SEGMENT_NAME_DIGITS}d}"
+                active = self.directory / f"{name}{SEGMENT_SUFFIX}"
+                self._next_sequence += 1
+                file = active.open("ab")
+                self._active, self._file = active, file
+                self._segments.append(active)
+                self._sizes[active] = 0
+            file.write(_RECORD_HEADER.pack(len(record), zlib.crc32(record)))
+            file.write(record)
+            file.flush()
+            self._sizes[active] += needed
+            return True
+
+    def oldest(self) -> Path | None:
+        """Seal and return the oldest segment, without removing it."""
+        with self._lock:
+            if not self._segments:
+                return None
+            path = self._segments[0]
+            if path == self._active:
+                self._seal()
+            return path
+
+    def read(
+        self, path: Path, offset: int = 0
+    ) -> Generator[tuple[int, memoryview], None, None]:
+        """Iterate over the records of a sealed segment, starting at ``offset``.
+
+        Each record is yielded with the offset of the next one, to resume
+        reading from it. Records are views valid until the iteration resumes;
+        with ``use_mmap`` they are views of the memory map, which stays open
+        until the iteration ends or is closed. The segment is not deleted to
+        make room for appends until then.
+        """
+        with self._lock:
+            if path not in self._sizes:
+                # Dropped by an append making room since it was listed
+                return
+            self._reading = path
+        try:
+            yield from self._read(path, offset)
+        finally:
+            with self._lock:
+                self._reading = None
+
+    def _read(self, path: Path, offset: int) -> Iterator[tuple[int, memoryview]]:
+        try:
+            file = path.open("rb")
+        except FileNotFoundError:
+            return
+        with file:
+            if self.use_mmap:
+                if os.fstat(file.fileno()).st_size == 0:
+                    return
+                with mmap.mmap(
+                    file.fileno(), 0, access=mmap.ACCESS_READ
+                ) as mapped, memoryview(mapped) as view:
+                    yield from _iter_records(view, offset)
+                return
+            data = file.read()
+        yield from _iter_records(memoryview(data), offset)
+
+    def remove(self, path: Path) -> None:
+        """Delete a segment once its records are handled."""
+        with self._lock:
+            if path in self._sizes:
+                self._segments.remove(path)
+                del self._sizes[path]
+            with contextlib.suppress(FileNotFoundError):
+                path.unlink()
+
+    def close(self) -> None:
+        """Close the newest segment. The segments stay on disk."""
+        with self._lock:
+            self._seal()
+
+
+def _decode_value(value: AnyValue) -> AttributeValue | None:
+    kind = value.WhichOneof("value")
+    if kind == "array_value":
+        values = [_decode_value(item) for item in value.array_value.values]
+        # Arrays are homogeneous, as the SDK only records homogeneous sequences
+        return cast(
+            "AttributeValue", tuple(item for item in values if item is not None)
+        )
+    if kind is None or kind == "kvlist_value":
+        return None
+    return getattr(value, kind)
+
+
+def _decode_attribute_values(
+    attributes: Sequence[KeyValue],
+) -> dict[str, AttributeValue]:
+    decoded = {}
+    for attribute in attributes:
+        value = _decode_value(attribute.value)
+        if value is not None:
+            decoded[attribute.key] = value
+    return decoded
+
+
+def _decode_attributes(attributes: Sequence[KeyValue]) -> BoundedAttributes:
+    # The encoder reads the dropped count of bounded attributes
+    return BoundedAttributes(attributes=_decode_attribute_values(attributes))
+
+
+def _span_context(
+    trace_id: bytes, span_id: bytes, trace_state: str, flags: int
+) -> trace.SpanContext:
+    return trace.SpanContext(
+        trace_id=int.from_bytes(trace_id, "big"),
+        span_id=int.from_bytes(span_id, "big"),
+        is_remote=bool(flags & _CONTEXT_IS_REMOTE_MASK),
+        trace_flags=trace.TraceFlags(trace.TraceFlags.SAMPLED),
+        trace_state=trace.TraceState.from_header([trace_state])
+        if trace_state
+        else None,
+    )
+
+
+def _decode_span(
+    span: SpanProto, resource: Resource, scope: InstrumentationScope
+) -> ReadableSpan:
+    return ReadableSpan(
+        name=span.name,
+        context=_span_context(span.trace_id, span.span_id, span.trace_state, 0),
+        parent=_span_context(span.trace_id, span.parent_span_id, "", span.flags)
+        if span.parent_span_id
+        else None,
+        resource=resource,
+        attributes=_decode_attributes(span.attributes),
+        events=[
+            Event(
+                event.name,
+                _decode_attributes(event.attributes),
+                event.time_unix_nano,
+            )
+            for event in span.events
+        ],
+        links=[
+            trace.Link(
+                _span_context(
+                    link.trace_id, link.span_id, link.trace_state, link.flags
+                ),
+                _decode_attributes(link.attributes),
+            )
+            for link in span.links
+        ],
+        # OTLP span kinds start at 1 for internal, after the unspecified kind
+        kind=trace.SpanKind(max(span.kind - 1, 0)),
+        status=trace.Status(
+            trace.StatusCode(span.status.code), span.status.message or None
+        ),
+        start_time=span.start_time_unix_nano,
+        end_time=span.end_time_unix_nano,
+        instrumentation_scope=scope,
+    )
+
+
+def decode_spans(data: bytes | memoryview) -> list[ReadableSpan]:
+    """Rebuild the spans of a serialised OTLP ``ExportTraceServiceRequest``.
+
+    The counts of attributes, events and links dropped before encoding are
+    not restored.
+    """
+    from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import (
+        ExportTraceServiceRequest,
+    )
+
+    # Protobuf parses any buffer, not only bytes
+    request = ExportTraceServiceRequest.FromString(data)  # pyright: ignore[reportArgumentType]
+    spans = []
+    for resource_spans in request.resource_spans:
+        resource = Resource(
+            _decode_attribute_values(resource_spans.resource.attributes),
+            resource_spans.schema_url,
+        )
+        for scope_spans in resource_spans.scope_spans:
+            scope = InstrumentationScope(
+                scope_spans.scope.name,
+                scope_spans.scope.version or None,
+                scope_spans.schema_url or None,
+            )
+            spans.extend(
+                _decode_span(span, resource, scope) for span in scope_spans.spans
+            )
+    return spans
+
+
+class SpoolingSpanExporter(SpanExporter):
+    """Span exporter spooling the batches its downstream exporter fails.
+
+    Batches are exported directly while the spool is empty. A batch the
+    downstream exporter fails, or raises on, is appended to the spool, and so
+    are the next batches until the spool is drained, to keep their order. A
+    background thread replays the spool, backing off exponentially while the
+    downstream keeps failing. Spooled batches count as exported, since the
+    batch span processor does not retry them anyway.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        exporter: SpanExporter,
+        directory: str | os.PathLike[str],
+        *,
+        segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        use_mmap: bool = False,
+        retry_interval: float = DEFAULT_RETRY_INTERVAL,
+        max_retry_interval: float = DEFAULT_MAX_RETRY_INTERVAL,
+    ) -> None:
+        """Initialize the exporter, replaying the spans already spooled.
+
+        Args:
+            exporter: Downstream exporter, e.g. ``OTLPSpanExporter``.
+            directory: Directory of the spool, used by one process at a time.
+                Keep it across restarts, e.g. one per worker slot, for the
+                next process to replay what this one spooled.
+            segment_bytes: Size of the spool segment files, see
+                `SegmentedSpool`.
+            max_bytes: Maximum size of the spool. The oldest spans are dropped
+                beyond it.
+            use_mmap: Read the spool segments through a memory map.
+            retry_interval: Seconds between the first replay attempts.
+            max_retry_interval: Maximum number of seconds between two replay
+                attempts.
+
+        """
+        self.exporter = exporter
+        self.spool = SegmentedSpool(
+            directory,
+            segment_bytes=segment_bytes,
+            max_bytes=max_bytes,
+            use_mmap=use_mmap,
+        )
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self._replay_lock = threading.Lock()
+        # Segment being replayed and offset of its next batch
+        self._replaying: Path | None = None
+        self._replay_offset = 0
+        self._pending = threading.Event()
+        self._stopping = threading.Event()
+        self._replayer: threading.Thread | None = None
+        self._replayer_pid: int | None = None
+        if self.spool:
+            self._wake_replayer()
+
+    def _export_downstream(self, spans: Sequence[ReadableSpan]) -> bool:
+        try:
+            return self.exporter.export(spans) == SpanExportResult.SUCCESS
+        except Exception:
+            logger.exception("Downstream span exporter raised")
+            return False
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        """Export the spans, spooling them if the downstream cannot."""
+        if self._stopping.is_set():
+            return SpanExportResult.FAILURE
+        if not self.spool and self._export_downstream(spans):
+            return SpanExportResult.SUCCESS
+
+        from opentelemetry.exporter.otlp.proto.common.trace_encoder import (
+            encode_spans,
+        )
+
+        if not self.spool.append(encode_spans(spans).SerializeToString()):
+            logger.warning(
+                "Dropping a batch of %d spans that does not fit in the spool",
+                len(spans),
+            )
+            return SpanExportResult.FAILURE
+        self._wake_replayer()
+        return SpanExportResult.SUCCESS
+
+    def _wake_replayer(self) -> None:
+        # The thread does not survive a fork, so it is restarted per process
+        if self._replayer is None or self._replayer_pid != os.getpid():
+            self._replayer_pid = os.getpid()
+            self._replayer = threading.Thread(
+                target=self._replay_loop, name="SpoolingSpanExporter", daemon=True
+            )
+            self._replayer.start()
+        self._pending.set()
+
+    def _replay_once(self, deadline: float | None = None) -> bool:
+        """Replay batches of the oldest segment.
+
+        Returns:
+            False if a batch failed or the monotonic ``deadline`` passed before
+            the segment was replayed, including while waiting for a replay in
+            progress in another thread.
+
+        """
+        if deadline is None:
+            acquired = self._replay_lock.acquire()
+        else:
+            timeout = max(deadline - time.monotonic(), 0)
+            acquired = self._replay_lock.acquire(timeout=timeout)
+        if not acquired:
+            return False
+        try:
+            return self._replay_oldest(deadline)
+        finally:
+            self._replay_lock.release()
+
+    def _replay_oldest(self, deadline: float | None) -> bool:
+        path = self.spool.oldest()
+        if path is None:
+            return True
+        if path != self._replaying:
+            self._replaying, self._replay_offset = path, 0
+        with contextlib.closing(self.spool.read(path, self._replay_offset)) as records:
+            for offset, record in records:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                try:
+                    spans = decode_spans(record)
+                except Exception:
+                    logger.exception("Skipping a spooled batch that cannot be decoded")
+                    spans = []
+                if spans and not self._export_downstream(spans):
+                    return False
+                self._replay_offset = offset
+        self.spool.remove(path)
+        self._replaying = None
+        return True
+
+    def _replay_loop(self) -> None:
+        delay = self.retry_interval
+        while not self._stopping.is_set():
+            if not self.spool:
+                self._pending.wait()
+                self._pending.clear()
+                continue
+            if self._replay_once():
+                delay = self.retry_interval
+                continue
+            self._stopping.wait(delay)
+            delay = min(delay * 2, self.max_retry_interval)
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        """Replay the spool, then flush the downstream exporter.
+
+        Returns:
+            False if the spool could not be drained before the timeout.
+
+        """
+        deadline = time.monotonic() + timeout_millis / 1000
+        while self.spool:
+            if time.monotonic() >= deadline or not self._replay_once(deadline):
+                return False
+        remaining_millis = max(int((deadline - time.monotonic()) * 1000), 0)
+        return self.exporter.force_flush(remaining_millis)
+
+    def shutdown(self) -> None:
+        """Stop replaying and shut the downstream exporter down.
+
+        Spans left in the spool are replayed by the next exporter using it.
+        """
+        self._stopping.set()
+        self._pending.set()
+        if self._replayer is not None and self._replayer_pid == os.getpid():
+            self._replayer.join(self.max_retry_interval)
+        self.spool.close()
+        self.exporter.shutdown()
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Sequence
+
+import pytest
+from dapr.clients.grpc._response import TopicEventResponse, TopicEventResponseStatus
+from opentelemetry import trace
+from opentelemetry.trace import SpanKind, StatusCode
+
+from skand_otel_utils.cloudevents.decorators import bulk
+from skand_otel_utils.cloudevents.diagnostics import RateLimitedLogger
+from tests.testutils import (
+    CloudEventBuilder,
+    SpanContextBuilder,
+    assert_no_active_trace_context,
+    format_traceparent_from_span_context,
+    new_in_memory_tracer_provider,
+)
+
+if TYPE_CHECKING:
+    from cloudevents.sdk.event import v1
+
+    from skand_otel_utils.cloudevents.types import BulkTopicEventResponse
+
+SUCCESS = TopicEventResponse(TopicEventResponseStatus.success)
+RETRY = TopicEventResponse(TopicEventResponseStatus.retry)
+DROP = TopicEventResponse(TopicEventResponseStatus.drop)
+
+
+def build_events(
+    remote_span_contexts: Sequence[trace.SpanContext | None],
+) -> list[v1.Event]:
+    events = []
+    for span_context in remote_span_contexts:
+        builder = CloudEventBuilder()
+        if span_context is not None:
+            builder.with_extension(
+                "traceparent", format_traceparent_from_span_context(span_context)
+            )
+        events.append(builder.build())
+    return events
+
+
+class TestSetup:
+    def test_batch_span_links_to_each_upstream_context(self) -> None:
+        tracer_provider, exporter = new_in_memory_tracer_provider()
+        first, second = (SpanContextBuilder().with_remote(True).build() for _ in "ab")
+
+        @bulk.setup(span_name="batch", tracer_provider=tracer_provider)
+        def bulk_handler(events: Sequence[v1.Event]) -> trace.Span:
+            assert len(events) == 4  # noqa: PLR2004
+            return trace.get_current_span()
+
+        batch_span = bulk_handler(build_events([first, second, first, None]))
+
+        (span,) = exporter.get_finished_spans()
+        assert span.context == batch_span.get_span_context()
+        assert span.name == "batch"
+        assert span.kind == SpanKind.CONSUMER
+        assert span.attributes == {bulk.BATCH_MESSAGE_COUNT_ATTRIBUTE: 4}
+        assert [link.context for link in span.links] == [first, second]
+        assert span.context is not None
+        assert span.context.trace_id not in (first.trace_id, second.trace_id)
+        assert_no_active_trace_context()
+
+    def test_async_batch_span(self) -> None:
+        tracer_provider, exporter = new_in_memory_tracer_provider()
+        upstream = SpanContextBuilder().with_remote(True).build()
+
+        @bulk.setup(tracer_provider=tracer_provider)
+        async def bulk_handler(_: Sequence[v1.Event]) -> trace.Span:
+            await asyncio.sleep(0)
+            return trace.get_current_span()
+
+        batch_span = asyncio.run(bulk_handler(build_events([upstream])))
+
+        (span,) = exporter.get_finished_spans()
+        assert span.context == batch_span.get_span_context()
+        assert [link.context for link in span.links] == [upstream]
+        assert_no_active_trace_context()
+
+    def test_misses_are_reported_through_miss_logger(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        tracer_provider, _ = new_in_memory_tracer_provider()
+        miss_logger = RateLimitedLogger(logging.getLogger(__name__), first_n=1)
+
+        @bulk.setup(tracer_provider=tracer_provider, miss_logger=miss_logger)
+        def bulk_handler(_: Sequence[v1.Event]) -> None:
+            return
+
+        with caplog.at_level(logging.WARNING):
+            for _ in range(3):
+                bulk_handler(build_events([None, None]))
+
+        assert miss_logger.count == 3  # noqa: PLR2004
+        assert [
+            record.getMessage() for record in caplog.records if record.name == __name__
+        ] == ["Failed to extract traceparent from 2 bulk events."]
+
+
+def test_set_span_events_from_events() -> None:
+    tracer_provider, exporter = new_in_memory_tracer_provider()
+
+    @bulk.setup(tracer_provider=tracer_provider)
+    @bulk.set_span_events_from_events(
+        name="event payload", event_extractor=lambda event: {"event_id": event.id}
+    )
+    def bulk_handler(_: Sequence[v1.Event]) -> None:
+        return
+
+    bulk_handler(
+        [
+            CloudEventBuilder().with_id("1").build(),
+            CloudEventBuilder().with_id("2").build(),
+        ]
+    )
+
+    (span,) = exporter.get_finished_spans()
+    assert [(event.name, event.attributes) for event in span.events] == [
+        ("event payload", {"event_id": "1"}),
+        ("event payload", {"event_id": "2"}),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("response", "expected_status", "expected_attributes"),
+    [
+        pytest.param(
+            [SUCCESS, SUCCESS, None],
+            StatusCode.OK,
+            {"cloudevents.bulk.status.success": 2},
+            id="ok_when_all_entries_succeed",
+        ),
+        pytest.param(
+            [SUCCESS, RETRY, DROP],
+            StatusCode.ERROR,
+            {
+                "cloudevents.bulk.status.success": 1,
+                "cloudevents.bulk.status.retry": 1,
+                "cloudevents.bulk.status.drop": 1,
+            },
+            id="error_when_any_entry_fails",
+        ),
+        pytest.param(
+            RETRY,
+            StatusCode.ERROR,
+            {"cloudevents.bulk.status.retry": 3},
+            id="single_response_for_the_batch",
+        ),
+        pytest.param(None, StatusCode.UNSET, {}, id="no_response"),
+    ],
+)
+def test_set_span_status_from_bulk_handler_result(
+    response: BulkTopicEventResponse | None,
+    expected_status: StatusCode,
+    expected_attributes: dict,
+) -> None:
+    tracer_provider, exporter = new_in_memory_tracer_provider()
+
+    @bulk.setup(tracer_provider=tracer_provider)
+    @bulk.set_span_status_from_bulk_handler_result
+    def bulk_handler(_: Sequence[v1.Event]) -> BulkTopicEventResponse | None:
+        return response
+
+    assert bulk_handler(build_events([None] * 3)) is response
+
+    (span,) = exporter.get_finished_spans()
+    assert span.status.status_code == expected_status
+    assert span.attributes is not None
+    assert {
+        key: value
+        for key, value in span.attributes.items()
+        if key.startswith(bulk.BULK_STATUS_COUNT_ATTRIBUTE_PREFIX)
+    } == expected_attributes
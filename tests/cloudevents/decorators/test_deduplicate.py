@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import TYPE_CHECKING
+
+import pytest
+from dapr.clients.grpc._response import TopicEventResponse, TopicEventResponseStatus
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+from skand_otel_utils.cloudevents.decorators import (
+    deduplicate,
+    distributed_trace_context,
+)
+from skand_otel_utils.cloudevents.decorators.deduplicate import (
+    DUPLICATE_COUNTER_NAME,
+    DUPLICATE_SPAN_EVENT_NAME,
+    Delivery,
+    SeenEvents,
+)
+from tests.testutils import CloudEventBuilder, new_in_memory_tracer_provider
+
+if TYPE_CHECKING:
+    from cloudevents.sdk.event import v1
+
+SUCCESS = TopicEventResponse(TopicEventResponseStatus.success)
+RETRY = TopicEventResponse(TopicEventResponseStatus.retry)
+
+
+class FakeClock:
+    """Clock advanced by hand."""
+
+    def __init__(self) -> None:
+        """Initialize the clock at zero."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestSeenEvents:
+    def test_detects_keys_seen_in_the_window(self) -> None:
+        clock = FakeClock()
+        seen = SeenEvents(window_seconds=10, clock=clock)
+
+        assert seen.add("a")
+        clock.now = 9
+        assert not seen.add("a")
+        clock.now = 10
+        assert seen.add("a")
+
+    def test_window_starts_when_first_added(self) -> None:
+        clock = FakeClock()
+        seen = SeenEvents(window_seconds=10, clock=clock)
+
+        seen.add("a")
+        clock.now = 5
+        seen.add("a")
+        clock.now = 10
+
+        assert seen.add("a")
+
+    def test_evicts_expired_keys(self) -> None:
+        clock = FakeClock()
+        seen = SeenEvents(window_seconds=10, clock=clock)
+        seen.add("a")
+        seen.add("b")
+        clock.now = 10
+
+        seen.add("c")
+
+        assert len(seen) == 1
+
+    def test_forgets_oldest_keys_above_capacity(self) -> None:
+        seen = SeenEvents(max_events=2, clock=FakeClock())
+        for key in ("a", "b", "c"):
+            seen.add(key)
+
+        assert len(seen) == seen.max_events
+        assert seen.add("a")
+        assert not seen.add("c")
+
+    def test_discard(self) -> None:
+        seen = SeenEvents()
+        seen.add("a")
+
+        seen.discard("a")
+        seen.discard("missing")
+
+        assert seen.add("a")
+
+    def test_concurrent_adds_of_a_key_succeed_once(self) -> None:
+        seen = SeenEvents()
+        barrier = threading.Barrier(8)
+        added = []
+
+        def add() -> None:
+            barrier.wait()
+            added.append(seen.add("a"))
+
+        threads = [threading.Thread(target=add) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(added) == [False] * 7 + [True]
+
+    def test_keys_in_flight_are_seen_once_handled_successfully(self) -> None:
+        seen = SeenEvents()
+
+        assert seen.start("a") is Delivery.NEW
+        assert seen.start("a") is Delivery.IN_FLIGHT
+        seen.finish("a", succeeded=False)
+        assert seen.start("a") is Delivery.NEW
+        seen.finish("a", succeeded=True)
+
+        assert seen.start("a") is Delivery.SEEN
+        assert not seen.add("a")
+
+    @pytest.mark.parametrize(("max_events", "window_seconds"), [(0, 1.0), (1, 0.0)])
+    def test_rejects_empty_bounds(self, max_events: int, window_seconds: float) -> None:
+        with pytest.raises(ValueError, match="must be positive"):
+            SeenEvents(max_events, window_seconds)
+
+
+def test_event_key() -> None:
+    event = (
+        CloudEventBuilder()
+        .with_id("1")
+        .with_source("orders")
+        .with_extension("traceparent", "tp")
+        .build()
+    )
+
+    assert deduplicate.event_key(event) == ("1", "orders", "tp")
+
+
+def test_returns_duplicate_response_without_calling_handler() -> None:
+    calls = []
+    duplicate_response = TopicEventResponse(TopicEventResponseStatus.drop)
+
+    @deduplicate.setup(duplicate_response=duplicate_response)
+    def cloudevent_handler(event: v1.Event) -> TopicEventResponse:
+        calls.append(event.id)
+        return SUCCESS
+
+    first = CloudEventBuilder().with_id("1").build()
+    other = CloudEventBuilder().with_id("2").build()
+
+    assert cloudevent_handler(first) is SUCCESS
+    assert cloudevent_handler(first) is duplicate_response
+    assert cloudevent_handler(other) is SUCCESS
+    assert calls == ["1", "2"]
+
+
+def test_acknowledges_duplicates_by_default() -> None:
+    event = CloudEventBuilder().build()
+    seen = SeenEvents()
+    seen.add(deduplicate.event_key(event))
+
+    response = deduplicate.setup(seen=seen)(lambda _: RETRY)(event)
+
+    assert response.status == TopicEventResponseStatus.success
+
+
+@pytest.mark.parametrize(
+    ("response", "handled_twice"),
+    [
+        pytest.param(SUCCESS, False, id="success"),
+        pytest.param(RETRY, True, id="retry"),
+        pytest.param(None, False, id="no_response"),
+    ],
+)
+def test_forgets_events_not_handled_successfully(
+    response: TopicEventResponse | None, handled_twice: bool
+) -> None:
+    calls = []
+
+    @deduplicate.setup()
+    def cloudevent_handler(event: v1.Event) -> TopicEventResponse | None:
+        calls.append(event.id)
+        return response
+
+    event = CloudEventBuilder().build()
+    cloudevent_handler(event)
+    cloudevent_handler(event)
+
+    assert len(calls) == (2 if handled_twice else 1)
+
+
+def test_retries_deliveries_overlapping_a_failing_one() -> None:
+    calls = []
+    started = threading.Event()
+    released = threading.Event()
+
+    @deduplicate.setup()
+    def cloudevent_handler(event: v1.Event) -> TopicEventResponse:
+        calls.append(event.id)
+        started.set()
+        released.wait(5)
+        return RETRY
+
+    event = CloudEventBuilder().build()
+    responses = []
+    first = threading.Thread(target=lambda: responses.append(cloudevent_handler(event)))
+    first.start()
+    assert started.wait(5)
+
+    overlapping = cloudevent_handler(event)
+    released.set()
+    first.join()
+
+    assert overlapping.status == TopicEventResponseStatus.retry
+    assert responses == [RETRY]
+    # The redelivery following the failure is handled again
+    assert cloudevent_handler(event) is RETRY
+    assert calls == [event.id, event.id]
+
+
+def raise_error(_: v1.Event) -> TopicEventResponse:
+    msg = "failed"
+    raise RuntimeError(msg)
+
+
+def test_forgets_events_whose_handler_raises() -> None:
+    handler = deduplicate.setup()(raise_error)
+    event = CloudEventBuilder().build()
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            handler(event)
+
+
+def test_records_duplicates_as_span_event_and_counter() -> None:
+    tracer_provider, exporter = new_in_memory_tracer_provider()
+    reader = InMemoryMetricReader()
+    event = CloudEventBuilder().with_id("1").with_source("orders").build()
+
+    @distributed_trace_context.setup(
+        consumer_span=True, tracer_provider=tracer_provider
+    )
+    @deduplicate.setup(
+        meter_provider=MeterProvider(metric_readers=[reader]),
+        attributes={"topic": "orders"},
+    )
+    def cloudevent_handler(_: v1.Event) -> TopicEventResponse:
+        return SUCCESS
+
+    cloudevent_handler(event)
+    cloudevent_handler(event)
+
+    first, duplicate = exporter.get_finished_spans()
+    assert first.events == ()
+    (span_event,) = duplicate.events
+    assert span_event.name == DUPLICATE_SPAN_EVENT_NAME
+    assert span_event.attributes == {
+        "event_id": "1",
+        "event_source": "orders",
+        "in_flight": False,
+    }
+    (metric,) = [
+        metric
+        for resource_metrics in reader.get_metrics_data().resource_metrics
+        for scope_metrics in resource_metrics.scope_metrics
+        for metric in scope_metrics.metrics
+    ]
+    assert metric.name == DUPLICATE_COUNTER_NAME
+    (point,) = metric.data.data_points
+    assert (point.value, dict(point.attributes)) == (1, {"topic": "orders"})
+
+
+def test_async_handler() -> None:
+    calls = []
+
+    @deduplicate.setup()
+    async def cloudevent_handler(event: v1.Event) -> TopicEventResponse:
+        calls.append(event.id)
+        return SUCCESS
+
+    event = CloudEventBuilder().build()
+
+    async def run_twice() -> list[TopicEventResponse]:
+        return [await cloudevent_handler(event), await cloudevent_handler(event)]
+
+    responses = asyncio.run(run_twice())
+
+    assert responses[0] is SUCCESS
+    assert responses[1].status == TopicEventResponseStatus.success
+    assert len(calls) == 1
@@ -1,26 +1,68 @@
 from __future__ import annotations
 
+import asyncio
 import json
-from typing import Callable
+import logging
+from typing import TYPE_CHECKING, Callable, Sequence
 
 import pytest
 from cloudevents.sdk.event import v1
-from opentelemetry import context, trace
-from opentelemetry.trace import span
+from google.protobuf import descriptor_pb2
+from opentelemetry import baggage, context, trace
+from opentelemetry.sdk.trace.sampling import (
+    ALWAYS_OFF,
+    ALWAYS_ON,
+    Decision,
+    Sampler,
+    SamplingResult,
+)
+from opentelemetry.semconv.trace import SpanAttributes
+from opentelemetry.trace import SpanKind, span
 
+from skand_otel_utils import propagator
+from skand_otel_utils.cloudevents import payload
+from skand_otel_utils.cloudevents._spans import use_span
+from skand_otel_utils.cloudevents.decorators import trace_span
 from skand_otel_utils.cloudevents.decorators.distributed_trace_context import (
+    JSON_CONTENT_TYPES,
+    PUBSUB_NAME_ATTRIBUTE,
+    ExtractorMetadata,
+    HeadSampler,
     TraceparentExtractor,
     _attach_distributed_trace_context,
+    _CompiledPipeline,
     _extract_trace_context_from_traceparent,
+    attach_from_event,
+    compile_pipelines,
+    detach,
+    extractor_metadata,
+    get_extractor_metadata,
     setup,
+    use_event_trace_context,
 )
+from skand_otel_utils.cloudevents.diagnostics import RateLimitedLogger
+from skand_otel_utils.sampling import RateLimitingSampler
 from tests.testutils import (
     CloudEventBuilder,
     SpanContextBuilder,
     assert_no_active_trace_context,
     format_traceparent_from_span_context,
+    new_in_memory_tracer_provider,
 )
 
+if TYPE_CHECKING:
+    from opentelemetry.util.types import Attributes
+
+    from skand_otel_utils.cloudevents.json_scanner import JSONText
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+OTHER_TRACEPARENT = "00-00000000000000000000000000000001-0000000000000001-01"
+
+
+def protobuf_field(number: int, value: str) -> bytes:
+    encoded = value.encode()
+    return bytes((number << 3 | 2, len(encoded))) + encoded
+
 
 class TestTraceparentExtractor:
     @pytest.mark.parametrize(
@@ -180,6 +222,138 @@ class TestTraceparentExtractor:
                 "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01",
                 id="valid_json_data_with_charset",
             ),
+            pytest.param(
+                lambda: (
+                    CloudEventBuilder()
+                    .with_content_type("application/json")
+                    .with_data(
+                        json.dumps(
+                            {
+                                "payload": [[0.1, 0.2], {"traceparent": "nested"}],
+                                "traceparent": "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01",  # noqa: E501
+                            }
+                        ).encode()
+                    )
+                    .build()
+                ),
+                "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01",
+                id="valid_json_bytes_data_with_nested_payload",
+            ),
+            pytest.param(
+                lambda: (
+                    CloudEventBuilder()
+                    .with_content_type("application/json")
+                    .with_data(
+                        memoryview(
+                            json.dumps(
+                                {
+                                    "traceparent": "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"  # noqa: E501
+                                }
+                            ).encode()
+                        )
+                    )
+                    .build()
+                ),
+                "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01",
+                id="valid_json_memoryview_data",
+            ),
+            pytest.param(
+                lambda: (
+                    CloudEventBuilder()
+                    .with_content_type("application/json")
+                    .with_data(
+                        b"\xef\xbb\xbf"
+                        + json.dumps(
+                            {
+                                "traceparent": "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"  # noqa: E501
+                            }
+                        ).encode()
+                    )
+                    .build()
+                ),
+                "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01",
+                id="ambiguous_scan_falls_back_to_full_parse",
+            ),
+            pytest.param(
+                lambda: (
+                    CloudEventBuilder()
+                    .with_content_type("application/json")
+                    .with_data('{"traceparent": "00-0af7651916cd43dd8448eb211c80319c')
+                    .build()
+                ),
+                None,
+                id="truncated_json_data",
+            ),
+            pytest.param(
+                lambda: (
+                    CloudEventBuilder()
+                    .with_content_type("application/json")
+                    .with_data(
+                        '{"\\u0074raceparent": '
+                        '"00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"}'
+                    )
+                    .build()
+                ),
+                "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01",
+                id="escaped_key",
+            ),
+            pytest.param(
+                lambda: (
+                    CloudEventBuilder()
+                    .with_content_type("application/json")
+                    .with_data(
+                        b'{"\\u0074raceparent": '
+                        b'"00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"}'
+                    )
+                    .build()
+                ),
+                "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01",
+                id="escaped_key_in_bytes_data",
+            ),
+            pytest.param(
+                lambda: (
+                    CloudEventBuilder()
+                    .with_content_type("application/json")
+                    .with_data(
+                        bytearray(
+                            b'{"tracestate": "vendor=value", "traceparent": '
+                            b'"00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"}'
+                        )
+                    )
+                    .build()
+                ),
+                propagator.TraceCarrier(
+                    "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01",
+                    "vendor=value",
+                ),
+                id="bytearray_data_with_tracestate",
+            ),
+            pytest.param(
+                lambda: (
+                    CloudEventBuilder()
+                    .with_content_type("application/json")
+                    .with_data(
+                        json.dumps(
+                            {
+                                "traceparent": "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"  # noqa: E501
+                            }
+                        ).encode("utf-16")
+                    )
+                    .build()
+                ),
+                "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01",
+                id="utf16_json_data",
+            ),
+            pytest.param(
+                lambda: (
+                    CloudEventBuilder()
+                    .with_content_type("application/json")
+                    .with_data(json.dumps({"items": [{"name": "item"}] * 100}).encode())
+                    .build()
+                ),
+                None,
+                id="json_data_without_traceparent_key",
+            ),
         ],
     )
     def test_from_json_data(
@@ -188,6 +362,247 @@ class TestTraceparentExtractor:
         acutual_traceparent = TraceparentExtractor.from_json_data(setup_cloudevent())
         assert acutual_traceparent == expected_traceparent
 
+    def test_from_json_data_with_budget(self) -> None:
+        traceparent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+        event = (
+            CloudEventBuilder()
+            .with_data(json.dumps({"padding": "x" * 1024, "traceparent": traceparent}))
+            .build()
+        )
+
+        assert TraceparentExtractor.from_json_data_with_budget(512)(event) is None
+        assert (
+            TraceparentExtractor.from_json_data_with_budget(None)(event) == traceparent
+        )
+
+    @pytest.mark.parametrize(
+        "encoding",
+        [
+            pytest.param("utf-8", id="scanned"),
+            pytest.param("utf-16", id="full_parse"),
+        ],
+    )
+    def test_duplicate_json_traceparent_is_the_last(self, encoding: str) -> None:
+        data = (
+            f'{{"traceparent": "{OTHER_TRACEPARENT}", "traceparent": "{TRACEPARENT}"}}'
+        )
+        event = CloudEventBuilder().with_data(data.encode(encoding)).build()
+
+        assert TraceparentExtractor.from_json_data(event) == TRACEPARENT
+        assert json.loads(data)["traceparent"] == TRACEPARENT
+
+    @pytest.mark.parametrize(
+        "setup_cloudevent",
+        [
+            pytest.param(
+                lambda: CloudEventBuilder()
+                .with_extension("traceparent", TRACEPARENT)
+                .with_extension("tracestate", "vendor=value")
+                .with_extension("baggage", "tenant=skand")
+                .build(),
+                id="extensions",
+            ),
+            pytest.param(
+                lambda: CloudEventBuilder()
+                .with_data(
+                    json.dumps(
+                        {
+                            "traceparent": TRACEPARENT,
+                            "items": [1, 2],
+                            "baggage": "tenant=skand",
+                            "tracestate": "vendor=value",
+                        }
+                    ).encode()
+                )
+                .build(),
+                id="json_data",
+            ),
+            pytest.param(
+                lambda: CloudEventBuilder()
+                .with_data(
+                    f'{{"\\u0074raceparent": "{TRACEPARENT}",'
+                    ' "tracestate": "vendor=value", "baggage": "tenant=skand"}'
+                )
+                .build(),
+                id="escaped_json_keys",
+            ),
+        ],
+    )
+    def test_carrier_with_tracestate_and_baggage(
+        self, setup_cloudevent: Callable[[], v1.Event]
+    ) -> None:
+        event = setup_cloudevent()
+        expected = propagator.TraceCarrier(TRACEPARENT, "vendor=value", "tenant=skand")
+
+        assert (
+            _CompiledPipeline(TraceparentExtractor.get_default_pipelines())(event)[0]
+            == expected
+        )
+
+        payload.share(event)
+        if event.data is not None:
+            assert TraceparentExtractor.from_json_data(event) == expected
+
+    def test_carrier_without_tracestate_nor_baggage_is_the_traceparent(self) -> None:
+        event = (
+            CloudEventBuilder()
+            .with_extension("traceparent", TRACEPARENT)
+            .with_extension("tracestate", "")
+            .with_data(json.dumps({"traceparent": TRACEPARENT, "baggage": None}))
+            .build()
+        )
+
+        assert TraceparentExtractor.from_extensions(event) == TRACEPARENT
+        assert TraceparentExtractor.from_json_data(event) == TRACEPARENT
+
+    @pytest.mark.parametrize(
+        ("data", "expected"),
+        [
+            pytest.param(
+                b"\x08\x01" + protobuf_field(2, TRACEPARENT),
+                TRACEPARENT,
+                id="traceparent_field",
+            ),
+            pytest.param(
+                memoryview(
+                    protobuf_field(3, "tenant=skand")
+                    + protobuf_field(2, TRACEPARENT)
+                    + protobuf_field(4, "vendor=value")
+                ),
+                propagator.TraceCarrier(TRACEPARENT, "vendor=value", "tenant=skand"),
+                id="carrier_fields",
+            ),
+            pytest.param(protobuf_field(5, TRACEPARENT), None, id="other_field"),
+            pytest.param(b"\x12\x40" + TRACEPARENT.encode(), None, id="malformed"),
+            pytest.param(TRACEPARENT, None, id="text_data"),
+        ],
+    )
+    def test_from_protobuf_field(
+        self, data: object, expected: str | propagator.TraceCarrier | None
+    ) -> None:
+        extract = TraceparentExtractor.from_protobuf_field(
+            2, tracestate_field_number=4, baggage_field_number=3
+        )
+        event = (
+            CloudEventBuilder()
+            .with_content_type("application/x-protobuf")
+            .with_data(data)
+            .build()
+        )
+
+        assert extract(event) == expected
+
+    def test_from_protobuf_field_with_budget(self) -> None:
+        event = (
+            CloudEventBuilder()
+            .with_data(
+                descriptor_pb2.FileDescriptorProto(
+                    name="x" * 1024, package=TRACEPARENT
+                ).SerializeToString()
+            )
+            .build()
+        )
+
+        assert (
+            TraceparentExtractor.from_protobuf_field(2, max_scan_bytes=512)(event)
+            is None
+        )
+        assert (
+            TraceparentExtractor.from_protobuf_field(2, max_scan_bytes=None)(event)
+            == TRACEPARENT
+        )
+
+    @pytest.mark.parametrize(
+        ("data", "expected"),
+        [
+            pytest.param(
+                b"TP" + TRACEPARENT.encode() + b"\x00\xff", TRACEPARENT, id="header"
+            ),
+            pytest.param(
+                bytearray(b"XX" + TRACEPARENT.encode()), None, id="other_prefix"
+            ),
+            pytest.param(b"TP" + TRACEPARENT.encode()[:-1], None, id="truncated"),
+            pytest.param(b"TP" + b"\xff" * 55, None, id="not_ascii"),
+        ],
+    )
+    def test_from_binary_header(self, data: bytes, expected: str | None) -> None:
+        event = CloudEventBuilder().with_data(data).build()
+
+        assert TraceparentExtractor.from_binary_header(b"TP")(event) == expected
+
+
+class TestCompiledPipeline:
+    def test_extractor_metadata(self) -> None:
+        assert get_extractor_metadata(lambda _: None) == ExtractorMetadata()
+        assert (
+            get_extractor_metadata(TraceparentExtractor.from_extensions)
+            == ExtractorMetadata()
+        )
+        assert get_extractor_metadata(
+            TraceparentExtractor.from_json_data_with_budget(None)
+        ) == ExtractorMetadata(JSON_CONTENT_TYPES)
+
+    def test_keeps_declared_order(self) -> None:
+        calls = []
+
+        def first(_: v1.Event) -> str:
+            calls.append("first")
+            return "first"
+
+        def second(_: v1.Event) -> str:
+            calls.append("second")
+            return "second"
+
+        extract = _CompiledPipeline((first, second))
+        assert extract(CloudEventBuilder().build()) == ("first", "first")
+        assert calls == ["first"]
+
+    def test_default_pipeline_prefers_json_data_over_extensions(self) -> None:
+        extension_traceparent = format_traceparent_from_span_context(
+            SpanContextBuilder().with_trace_id(1).build()
+        )
+        data_traceparent = format_traceparent_from_span_context(
+            SpanContextBuilder().with_trace_id(2).build()
+        )
+        event = (
+            CloudEventBuilder()
+            .with_content_type("application/json")
+            .with_data(json.dumps({"traceparent": data_traceparent}))
+            .with_extension("traceparent", extension_traceparent)
+            .build()
+        )
+
+        assert compile_pipelines()(event) == (data_traceparent, "from_json_data")
+
+    @pytest.mark.parametrize(
+        ("content_type", "expected_traceparent"),
+        [
+            pytest.param(None, "json", id="missing_content_type"),
+            pytest.param("application/json", "json", id="json"),
+            pytest.param(
+                "Application/CloudEvents+JSON; charset=utf-8",
+                "json",
+                id="structured_json_with_parameters",
+            ),
+            pytest.param("application/octet-stream", "any", id="octet_stream"),
+            pytest.param("application/x-protobuf", "any", id="protobuf"),
+        ],
+    )
+    def test_skips_extractors_for_other_content_types(
+        self, content_type: str | None, expected_traceparent: str
+    ) -> None:
+        extract = _CompiledPipeline(
+            (
+                extractor_metadata(content_types=JSON_CONTENT_TYPES)(lambda _: "json"),
+                lambda _: "any",
+            )
+        )
+        event = CloudEventBuilder().build()
+        event.content_type = content_type
+
+        traceparent, _ = extract(event)
+        assert traceparent == expected_traceparent
+
 
 class TestExtractTraceContextFromTraceparent:
     def test_happy_path_with_remote_span_context(self) -> None:
@@ -348,6 +763,29 @@ class TestSetupDistributedTraceContext:
         # should no side effects after the decorator is applied
         assert_no_active_trace_context()
 
+    @pytest.mark.parametrize("consumer_span", [False, True])
+    def test_attaches_tracestate_and_baggage(self, consumer_span: bool) -> None:
+        tracer_provider, _ = new_in_memory_tracer_provider()
+        event = (
+            CloudEventBuilder()
+            .with_extension("traceparent", TRACEPARENT)
+            .with_extension("tracestate", "vendor=value")
+            .with_extension("baggage", "tenant=skand")
+            .build()
+        )
+
+        @setup(consumer_span=consumer_span, tracer_provider=tracer_provider)
+        def cloudevent_handler(_: v1.Event) -> tuple[trace.TraceState, object]:
+            span_context = trace.get_current_span().get_span_context()
+            return span_context.trace_state, baggage.get_all()
+
+        trace_state, current_baggage = cloudevent_handler(event)
+
+        assert trace_state == trace.TraceState([("vendor", "value")])
+        assert current_baggage == {"tenant": "skand"}
+        assert_no_active_trace_context()
+        assert baggage.get_all() == {}
+
     @pytest.mark.parametrize(
         "pipelines",
         [
@@ -369,3 +807,413 @@ class TestSetupDistributedTraceContext:
         # apply the decorator and verify no trace context is propagated
         extracted_span_context = cloudevent_handler(v1.Event())
         assert extracted_span_context == span.INVALID_SPAN_CONTEXT
+
+    def test_decorator_with_shared_payload(self) -> None:
+        decoded_payloads = []
+
+        def decoder(data: JSONText) -> dict:
+            decoded_payloads.append(
+                json.loads(data.tobytes() if isinstance(data, memoryview) else data)
+            )
+            return decoded_payloads[-1]
+
+        # setup
+        @setup(share_payload=True, payload_decoder=decoder)
+        def cloudevent_handler(event: v1.Event) -> tuple[trace.SpanContext, dict]:
+            return (
+                trace.get_current_span().get_span_context(),
+                payload.get_payload(event),
+            )
+
+        remote_span_context = SpanContextBuilder().with_remote(True).build()
+        traceparent = format_traceparent_from_span_context(remote_span_context)
+        event = (
+            CloudEventBuilder()
+            .with_data(json.dumps({"traceparent": traceparent, "key": "value"}))
+            .build()
+        )
+
+        # apply the decorator and verify the payload is decoded only once
+        extracted_span_context, event_payload = cloudevent_handler(event)
+        assert extracted_span_context == remote_span_context
+        assert decoded_payloads == [event_payload]
+        assert_no_active_trace_context()
+
+    def test_async_decorator_keeps_context_across_awaits(self) -> None:
+        # setup
+        @setup((TraceparentExtractor.from_extensions,))
+        async def cloudevent_handler(_: v1.Event) -> trace.SpanContext:
+            await asyncio.sleep(0)
+            return trace.get_current_span().get_span_context()
+
+        remote_span_contexts = [
+            SpanContextBuilder().with_remote(True).build() for _ in range(2)
+        ]
+        events = [
+            CloudEventBuilder()
+            .with_extension("traceparent", format_traceparent_from_span_context(sc))
+            .build()
+            for sc in remote_span_contexts
+        ]
+
+        async def handle_concurrently() -> list[trace.SpanContext]:
+            return await asyncio.gather(*(cloudevent_handler(e) for e in events))
+
+        # before the decorator is applied
+        assert_no_active_trace_context()
+
+        # apply the decorator to concurrent handlers
+        assert asyncio.run(handle_concurrently()) == remote_span_contexts
+
+        # should no side effects after the decorator is applied
+        assert_no_active_trace_context()
+
+    @pytest.mark.parametrize("is_async", [False, True])
+    def test_decorator_detaches_when_handler_raises(self, is_async: bool) -> None:
+        event = CloudEventBuilder().with_extension("traceparent", TRACEPARENT).build()
+
+        if is_async:
+
+            @setup()
+            async def async_handler(_: v1.Event) -> None:
+                raise RuntimeError
+
+            with pytest.raises(RuntimeError):
+                asyncio.run(async_handler(event))
+        else:
+
+            @setup()
+            def cloudevent_handler(_: v1.Event) -> None:
+                raise RuntimeError
+
+            with pytest.raises(RuntimeError):
+                cloudevent_handler(event)
+
+        assert_no_active_trace_context()
+
+
+class TestAttachFromEvent:
+    def test_attach_and_detach(self) -> None:
+        event = CloudEventBuilder().with_extension("traceparent", TRACEPARENT).build()
+
+        token = attach_from_event(event)
+        try:
+            assert trace.get_current_span().get_span_context() == (
+                propagator.parse_traceparent(TRACEPARENT)
+            )
+        finally:
+            detach(token)
+
+        assert_no_active_trace_context()
+
+    def test_nothing_attached_without_traceparent(self) -> None:
+        token = attach_from_event(CloudEventBuilder().build())
+
+        assert token is None
+        detach(token)
+        assert_no_active_trace_context()
+
+    def test_context_manager_is_reentrant_and_detaches_on_error(self) -> None:
+        outer, inner = (SpanContextBuilder().with_remote(True).build() for _ in "ab")
+        outer_event, inner_event = (
+            CloudEventBuilder()
+            .with_extension("traceparent", format_traceparent_from_span_context(sc))
+            .build()
+            for sc in (outer, inner)
+        )
+        extract = compile_pipelines((TraceparentExtractor.from_extensions,))
+        span_contexts = []
+
+        def handle_inner_event() -> None:
+            with use_event_trace_context(inner_event):
+                span_contexts.append(trace.get_current_span().get_span_context())
+                raise RuntimeError
+
+        with use_event_trace_context(outer_event, extract):
+            with pytest.raises(RuntimeError):
+                handle_inner_event()
+            span_contexts.append(trace.get_current_span().get_span_context())
+
+        assert span_contexts == [inner, outer]
+
+        assert_no_active_trace_context()
+
+    def test_context_manager_with_head_sampler(self) -> None:
+        event = CloudEventBuilder().with_extension("traceparent", TRACEPARENT).build()
+
+        with use_event_trace_context(event, head_sampler=HeadSampler(ALWAYS_OFF)):
+            span_context = trace.get_current_span().get_span_context()
+
+        assert span_context.trace_id == int(TRACEPARENT.split("-")[1], 16)
+        assert not span_context.trace_flags.sampled
+        assert_no_active_trace_context()
+
+
+class TestSetupConsumerSpan:
+    def test_consumer_span_parented_on_upstream_context(self) -> None:
+        tracer_provider, exporter = new_in_memory_tracer_provider()
+        upstream = (
+            SpanContextBuilder()
+            .with_remote(True)
+            .with_trace_flags(trace.TraceFlags(trace.TraceFlags.SAMPLED))
+            .build()
+        )
+        event = (
+            CloudEventBuilder()
+            .with_id("event-id")
+            .with_type("event-type")
+            .with_source("event-source")
+            .with_extension(
+                "traceparent", format_traceparent_from_span_context(upstream)
+            )
+            .build()
+        )
+
+        @setup(
+            consumer_span=True,
+            pubsub_name="pubsub",
+            topic="orders",
+            tracer_provider=tracer_provider,
+        )
+        def cloudevent_handler(_: v1.Event) -> trace.Span:
+            return trace.get_current_span()
+
+        current_span = cloudevent_handler(event)
+
+        (consumer_span,) = exporter.get_finished_spans()
+        assert consumer_span.context == current_span.get_span_context()
+        assert consumer_span.name == "orders process"
+        assert consumer_span.kind == SpanKind.CONSUMER
+        assert consumer_span.parent == upstream
+        assert consumer_span.attributes == {
+            SpanAttributes.MESSAGING_SYSTEM: "dapr",
+            SpanAttributes.MESSAGING_OPERATION: "process",
+            SpanAttributes.MESSAGING_DESTINATION_NAME: "orders",
+            PUBSUB_NAME_ATTRIBUTE: "pubsub",
+            SpanAttributes.MESSAGING_MESSAGE_ID: "event-id",
+            SpanAttributes.CLOUDEVENTS_EVENT_ID: "event-id",
+            SpanAttributes.CLOUDEVENTS_EVENT_TYPE: "event-type",
+            SpanAttributes.CLOUDEVENTS_EVENT_SOURCE: "event-source",
+        }
+        assert_no_active_trace_context()
+
+    def test_destination_read_from_dapr_extensions(self) -> None:
+        tracer_provider, exporter = new_in_memory_tracer_provider()
+        event = (
+            CloudEventBuilder()
+            .with_extension("topic", "orders")
+            .with_extension("pubsubname", "pubsub")
+            .build()
+        )
+
+        @setup(consumer_span=True, tracer_provider=tracer_provider)
+        def cloudevent_handler(_: v1.Event) -> None:
+            return
+
+        cloudevent_handler(event)
+
+        (consumer_span,) = exporter.get_finished_spans()
+        assert consumer_span.name == "orders process"
+        attributes = consumer_span.attributes or {}
+        assert attributes[SpanAttributes.MESSAGING_DESTINATION_NAME] == "orders"
+        assert attributes[PUBSUB_NAME_ATTRIBUTE] == "pubsub"
+
+    def test_current_context_is_parent_without_traceparent(self) -> None:
+        tracer_provider, exporter = new_in_memory_tracer_provider()
+        tracer = tracer_provider.get_tracer(__name__)
+
+        @setup(consumer_span=True, tracer_provider=tracer_provider)
+        async def cloudevent_handler(_: v1.Event) -> None:
+            await asyncio.sleep(0)
+
+        server_span = tracer.start_span("server")
+        with use_span(server_span, end_on_exit=True):
+            asyncio.run(cloudevent_handler(CloudEventBuilder().build()))
+
+        consumer_span, _ = exporter.get_finished_spans()
+        assert consumer_span.name == "process"
+        assert consumer_span.parent == server_span.get_span_context()
+
+    def test_consumer_span_records_handler_exception(self) -> None:
+        tracer_provider, exporter = new_in_memory_tracer_provider()
+
+        @setup(consumer_span=True, tracer_provider=tracer_provider)
+        def cloudevent_handler(_: v1.Event) -> None:
+            msg = "handler failed"
+            raise RuntimeError(msg)
+
+        with pytest.raises(RuntimeError, match="handler failed"):
+            cloudevent_handler(CloudEventBuilder().build())
+
+        (consumer_span,) = exporter.get_finished_spans()
+        assert consumer_span.status.status_code == trace.StatusCode.ERROR
+        assert_no_active_trace_context()
+
+
+def test_setup_reports_missing_traceparent_through_miss_logger(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    miss_logger = RateLimitedLogger(logging.getLogger(__name__), first_n=1)
+
+    @setup(miss_logger=miss_logger)
+    def cloudevent_handler(_: v1.Event) -> None:
+        return
+
+    with caplog.at_level(logging.DEBUG):
+        for _ in range(3):
+            cloudevent_handler(CloudEventBuilder().build())
+
+    assert miss_logger.count == 3  # noqa: PLR2004
+    assert [
+        record.getMessage() for record in caplog.records if record.name == __name__
+    ] == ["Failed to extract traceparent from the event."]
+    assert all(
+        record.levelno == logging.DEBUG
+        for record in caplog.records
+        if record.name != __name__
+    )
+
+
+class RecordingSampler(Sampler):
+    """Sampler recording the span names and attributes it is asked about."""
+
+    def __init__(self, decision: Decision) -> None:
+        """Initialize the sampler with the decision it always returns."""
+        self.decision = decision
+        self.calls: list[tuple[str, dict]] = []
+
+    def should_sample(  # noqa: PLR0913
+        self,
+        parent_context: context.Context | None,  # noqa: ARG002
+        trace_id: int,  # noqa: ARG002
+        name: str,
+        kind: trace.SpanKind | None = None,  # noqa: ARG002
+        attributes: Attributes = None,
+        links: Sequence[trace.Link] | None = None,  # noqa: ARG002
+        trace_state: trace.TraceState | None = None,  # noqa: ARG002
+    ) -> SamplingResult:
+        self.calls.append((name, dict(attributes or {})))
+        return SamplingResult(self.decision)
+
+    def get_description(self) -> str:
+        return "RecordingSampler"
+
+
+def build_event_with_upstream(*, sampled: bool) -> tuple[v1.Event, trace.SpanContext]:
+    upstream = (
+        SpanContextBuilder()
+        .with_remote(True)
+        .with_trace_flags(
+            trace.TraceFlags(
+                trace.TraceFlags.SAMPLED if sampled else trace.TraceFlags.DEFAULT
+            )
+        )
+        .build()
+    )
+    event = (
+        CloudEventBuilder()
+        .with_type("order.created")
+        .with_extension("traceparent", format_traceparent_from_span_context(upstream))
+        .build()
+    )
+    return event, upstream
+
+
+class TestSetupHeadSampling:
+    def test_unsampled_traceparent_skips_consumer_span_and_span_events(self) -> None:
+        tracer_provider, exporter = new_in_memory_tracer_provider()
+        event, upstream = build_event_with_upstream(sampled=False)
+        sampler = RecordingSampler(Decision.RECORD_AND_SAMPLE)
+        extracted = []
+
+        @setup(consumer_span=True, sampler=sampler, tracer_provider=tracer_provider)
+        @trace_span.set_span_event_from_event("payload", extracted.append)
+        def cloudevent_handler(_: v1.Event) -> trace.SpanContext:
+            return trace.get_current_span().get_span_context()
+
+        span_context = cloudevent_handler(event)
+
+        assert (span_context.trace_id, span_context.span_id) == (
+            upstream.trace_id,
+            upstream.span_id,
+        )
+        assert not span_context.trace_flags.sampled
+        assert extracted == []
+        assert sampler.calls == []
+        assert exporter.get_finished_spans() == ()
+        assert_no_active_trace_context()
+
+    def test_local_sampler_drops_sampled_traceparent(self) -> None:
+        event, upstream = build_event_with_upstream(sampled=True)
+        sampler = RecordingSampler(Decision.DROP)
+
+        @setup(sampler=sampler, topic="orders", pubsub_name="pubsub")
+        def cloudevent_handler(_: v1.Event) -> str | None:
+            return propagator.get_traceparent_from_current_trace_context()
+
+        traceparent = cloudevent_handler(event)
+
+        assert traceparent == (
+            f"00-{upstream.trace_id:032x}-{upstream.span_id:016x}-00"
+        )
+        assert sampler.calls == [
+            (
+                "orders process",
+                {
+                    SpanAttributes.MESSAGING_DESTINATION_NAME: "orders",
+                    PUBSUB_NAME_ATTRIBUTE: "pubsub",
+                    SpanAttributes.CLOUDEVENTS_EVENT_TYPE: "order.created",
+                },
+            )
+        ]
+        assert_no_active_trace_context()
+
+    def test_sampled_traceparent_starts_consumer_span(self) -> None:
+        tracer_provider, exporter = new_in_memory_tracer_provider()
+        event, upstream = build_event_with_upstream(sampled=True)
+
+        @setup(consumer_span=True, sampler=ALWAYS_ON, tracer_provider=tracer_provider)
+        def cloudevent_handler(_: v1.Event) -> None:
+            return
+
+        cloudevent_handler(event)
+
+        (consumer_span,) = exporter.get_finished_spans()
+        assert consumer_span.parent == upstream
+
+    def test_dropped_event_without_traceparent_gets_new_unsampled_context(
+        self,
+    ) -> None:
+        @setup(sampler=ALWAYS_OFF)
+        def cloudevent_handler(_: v1.Event) -> trace.SpanContext:
+            return trace.get_current_span().get_span_context()
+
+        span_context = cloudevent_handler(CloudEventBuilder().build())
+
+        assert span_context.is_valid
+        assert not span_context.trace_flags.sampled
+        assert_no_active_trace_context()
+
+    def test_rate_limiting_sampler_caps_spans_per_topic(self) -> None:
+        tracer_provider, exporter = new_in_memory_tracer_provider()
+
+        @setup(
+            consumer_span=True,
+            sampler=RateLimitingSampler(spans_per_second=0, burst=1),
+            tracer_provider=tracer_provider,
+        )
+        def cloudevent_handler(_: v1.Event) -> None:
+            return
+
+        for topic in ("busy", "busy", "busy", "quiet"):
+            cloudevent_handler(
+                CloudEventBuilder()
+                .with_type("order.created")
+                .with_extension("topic", topic)
+                .build()
+            )
+
+        assert [span.name for span in exporter.get_finished_spans()] == [
+            "busy process",
+            "quiet process",
+        ]
@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple
+
+import pytest
+from dapr.clients.grpc._response import TopicEventResponse, TopicEventResponseStatus
+from opentelemetry import trace
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+from opentelemetry.sdk.trace.sampling import ALWAYS_OFF, ALWAYS_ON
+from opentelemetry.trace import StatusCode
+
+from skand_otel_utils.cloudevents._spans import use_span
+from skand_otel_utils.cloudevents.decorators import (
+    distributed_trace_context,
+    instrument,
+    trace_span,
+)
+from tests.testutils import (
+    CloudEventBuilder,
+    SpanContextBuilder,
+    assert_no_active_trace_context,
+    format_traceparent_from_span_context,
+    new_in_memory_tracer_provider,
+)
+
+if TYPE_CHECKING:
+    from cloudevents.sdk.event import v1
+    from opentelemetry.sdk.trace import ReadableSpan
+    from opentelemetry.sdk.trace.sampling import Sampler
+
+    from skand_otel_utils.cloudevents.types import CloudEventHandlerT
+
+
+def test_attaches_upstream_trace_context() -> None:
+    upstream = SpanContextBuilder().with_remote(True).build()
+    event = (
+        CloudEventBuilder()
+        .with_extension("traceparent", format_traceparent_from_span_context(upstream))
+        .build()
+    )
+
+    @instrument.setup()
+    def cloudevent_handler(_: v1.Event) -> trace.SpanContext:
+        return trace.get_current_span().get_span_context()
+
+    assert cloudevent_handler(event) == upstream
+    assert_no_active_trace_context()
+
+
+@pytest.mark.parametrize(
+    ("response", "expected_span_status"),
+    [
+        pytest.param(
+            TopicEventResponse(TopicEventResponseStatus.success),
+            StatusCode.OK,
+            id="ok_status_code_for_success_response",
+        ),
+        pytest.param(
+            TopicEventResponse(TopicEventResponseStatus.retry),
+            StatusCode.ERROR,
+            id="error_status_code_for_retry_response",
+        ),
+        pytest.param(
+            None, StatusCode.UNSET, id="default_status_code_for_none_response"
+        ),
+    ],
+)
+def test_sets_span_event_and_status(
+    response: TopicEventResponse | None, expected_span_status: StatusCode
+) -> None:
+    @instrument.setup(event_extractor=lambda event: {"event_id": event.id})
+    def cloudevent_handler(_: v1.Event) -> TopicEventResponse | None:
+        return response
+
+    tracer_provider, exporter = new_in_memory_tracer_provider()
+    tracer = tracer_provider.get_tracer(__name__)
+    with use_span(tracer.start_span("test_span"), end_on_exit=True):
+        assert cloudevent_handler(CloudEventBuilder().with_id("1").build()) is response
+
+    (span,) = exporter.get_finished_spans()
+    assert span.status.status_code == expected_span_status
+    assert [(event.name, event.attributes) for event in span.events] == [
+        ("event payload", {"event_id": "1"})
+    ]
+
+
+def test_set_span_status_disabled() -> None:
+    @instrument.setup(set_span_status=False)
+    def cloudevent_handler(_: v1.Event) -> TopicEventResponse:
+        return TopicEventResponse(TopicEventResponseStatus.retry)
+
+    tracer_provider, exporter = new_in_memory_tracer_provider()
+    tracer = tracer_provider.get_tracer(__name__)
+    with use_span(tracer.start_span("test_span"), end_on_exit=True):
+        cloudevent_handler(CloudEventBuilder().build())
+
+    (span,) = exporter.get_finished_spans()
+    assert span.status.status_code == StatusCode.UNSET
+    assert not span.events
+
+
+def test_async_handler() -> None:
+    upstream = SpanContextBuilder().with_remote(True).build()
+    event = (
+        CloudEventBuilder()
+        .with_extension("traceparent", format_traceparent_from_span_context(upstream))
+        .build()
+    )
+
+    @instrument.setup(span_event_name="received", event_extractor=lambda _: {})
+    async def cloudevent_handler(_: v1.Event) -> trace.SpanContext:
+        await asyncio.sleep(0)
+        return trace.get_current_span().get_span_context()
+
+    assert asyncio.run(cloudevent_handler(event)) == upstream
+    assert_no_active_trace_context()
+
+
+@pytest.mark.parametrize("is_async", [False, True])
+def test_detaches_when_handler_raises(is_async: bool) -> None:
+    upstream = SpanContextBuilder().with_remote(True).build()
+    event = (
+        CloudEventBuilder()
+        .with_extension("traceparent", format_traceparent_from_span_context(upstream))
+        .build()
+    )
+
+    if is_async:
+
+        @instrument.setup()
+        async def async_handler(_: v1.Event) -> None:
+            raise RuntimeError
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(async_handler(event))
+    else:
+
+        @instrument.setup()
+        def cloudevent_handler(_: v1.Event) -> None:
+            raise RuntimeError
+
+        with pytest.raises(RuntimeError):
+            cloudevent_handler(event)
+
+    assert_no_active_trace_context()
+
+
+def describe_span(span: ReadableSpan) -> tuple[object, ...]:
+    """Everything but the ids and timestamps of a span."""
+    return (
+        span.name,
+        span.kind,
+        span.parent,
+        dict(span.attributes or {}),
+        span.status.status_code,
+        [(event.name, dict(event.attributes or {})) for event in span.events],
+    )
+
+
+def describe_metrics(reader: InMemoryMetricReader) -> dict[str, list[str]]:
+    """Name and data point attributes of each metric."""
+    metrics_data = reader.get_metrics_data()
+    if metrics_data is None:
+        return {}
+    return {
+        metric.name: sorted(
+            str(sorted((point.attributes or {}).items()))
+            for point in metric.data.data_points
+        )
+        for resource_metrics in metrics_data.resource_metrics
+        for scope_metrics in resource_metrics.scope_metrics
+        for metric in scope_metrics.metrics
+    }
+
+
+class Subscription(NamedTuple):
+    """Options shared by `instrument.setup` and the stacked decorators."""
+
+    consumer_span: bool
+    topic: str | None = None
+    pubsub_name: str | None = None
+    record_metrics: bool = False
+    sampler: Sampler | None = None
+
+
+def extract_event_id(event: v1.Event) -> dict[str, str]:
+    return {"event_id": event.id}
+
+
+def run_handler(
+    decorator: Callable[[Any], Any],
+    event: v1.Event,
+    *,
+    is_async: bool,
+) -> None:
+    response = TopicEventResponse(TopicEventResponseStatus.retry)
+
+    if is_async:
+
+        @decorator
+        async def async_handler(_: v1.Event) -> TopicEventResponse:
+            return response
+
+        assert asyncio.run(async_handler(event)) is response
+    else:
+
+        @decorator
+        def handler(_: v1.Event) -> TopicEventResponse:
+            return response
+
+        assert handler(event) is response
+
+
+def record_handling(
+    subscription: Subscription, event: v1.Event, *, single: bool, is_async: bool
+) -> tuple[list[tuple[object, ...]], dict[str, list[str]]]:
+    """Handle an event with either decorator, returning its spans and metrics."""
+    tracer_provider, exporter = new_in_memory_tracer_provider()
+    reader = InMemoryMetricReader()
+    meter_provider = MeterProvider(metric_readers=[reader])
+    decorator: Callable[[Any], Any]
+    if single:
+        decorator = instrument.setup(
+            event_extractor=extract_event_id,
+            tracer_provider=tracer_provider,
+            meter_provider=meter_provider,
+            consumer_span=subscription.consumer_span,
+            topic=subscription.topic,
+            pubsub_name=subscription.pubsub_name,
+            record_metrics=subscription.record_metrics,
+            sampler=subscription.sampler,
+        )
+    else:
+        setup = distributed_trace_context.setup(
+            tracer_provider=tracer_provider,
+            meter_provider=meter_provider,
+            consumer_span=subscription.consumer_span,
+            topic=subscription.topic,
+            pubsub_name=subscription.pubsub_name,
+            record_metrics=subscription.record_metrics,
+            sampler=subscription.sampler,
+        )
+        set_span_event = trace_span.set_span_event_from_event(
+            "event payload", extract_event_id
+        )
+
+        def stack(func: CloudEventHandlerT) -> CloudEventHandlerT:
+            return setup(
+                set_span_event(
+                    trace_span.set_span_status_from_cloudenvet_handler_result(func)
+                )
+            )
+
+        decorator = stack
+
+    outer = tracer_provider.get_tracer(__name__).start_span("outer")
+    with use_span(outer, end_on_exit=True):
+        run_handler(decorator, event, is_async=is_async)
+    assert_no_active_trace_context()
+
+    spans = [describe_span(span) for span in exporter.get_finished_spans()]
+    return spans, describe_metrics(reader)
+
+
+@pytest.mark.parametrize(
+    "subscription",
+    [
+        pytest.param(Subscription(consumer_span=True), id="consumer_span"),
+        pytest.param(
+            Subscription(consumer_span=True, topic="orders", pubsub_name="pubsub"),
+            id="subscription",
+        ),
+        pytest.param(
+            Subscription(consumer_span=True, topic="orders", record_metrics=True),
+            id="metrics",
+        ),
+        pytest.param(
+            Subscription(consumer_span=True, topic="orders", sampler=ALWAYS_ON),
+            id="sampled",
+        ),
+        pytest.param(
+            Subscription(consumer_span=True, sampler=ALWAYS_OFF), id="dropped"
+        ),
+        pytest.param(
+            Subscription(
+                consumer_span=False,
+                pubsub_name="pubsub",
+                record_metrics=True,
+                sampler=ALWAYS_ON,
+            ),
+            id="remote_context",
+        ),
+    ],
+)
+@pytest.mark.parametrize("is_async", [False, True])
+def test_matches_the_stacked_decorators(
+    subscription: Subscription, is_async: bool
+) -> None:
+    upstream = (
+        SpanContextBuilder()
+        .with_remote(True)
+        .with_trace_flags(trace.TraceFlags(trace.TraceFlags.SAMPLED))
+        .build()
+    )
+    event = (
+        CloudEventBuilder()
+        .with_id("1")
+        .with_extension("traceparent", format_traceparent_from_span_context(upstream))
+        .with_extension("topic", "orders")
+        .with_extension("pubsubname", "pubsub")
+        .build()
+    )
+
+    stacked = record_handling(subscription, event, single=False, is_async=is_async)
+    single = record_handling(subscription, event, single=True, is_async=is_async)
+
+    assert single == stacked
+    spans, metrics = stacked
+    recorded = subscription.consumer_span and subscription.sampler is not ALWAYS_OFF
+    assert len(spans) == (2 if recorded else 1)
+    assert bool(metrics) == subscription.record_metrics
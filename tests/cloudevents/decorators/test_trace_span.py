@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 from typing import Callable
 
 import pytest
@@ -8,12 +9,18 @@ from dapr.clients.grpc._response import TopicEventResponse, TopicEventResponseSt
 from opentelemetry.test.spantestutil import new_tracer
 from opentelemetry.trace import StatusCode
 
+from skand_otel_utils.cloudevents._spans import use_span
 from skand_otel_utils.cloudevents.decorators.trace_span import (
     extract_payload_from_cloudevent,
+    make_payload_extractor,
     set_span_event_from_event,
     set_span_status_from_cloudenvet_handler_result,
 )
-from tests.testutils import CloudEventBuilder
+from tests.testutils import (
+    CloudEventBuilder,
+    SpanContextBuilder,
+    new_in_memory_tracer_provider,
+)
 
 
 @pytest.mark.parametrize(
@@ -51,6 +58,38 @@ def test_set_span_status_from_cloudevent_handler(
         assert span.status.status_code == expected_span_status
 
 
+@pytest.mark.parametrize(
+    ("response", "expected_span_status"),
+    [
+        pytest.param(
+            TopicEventResponse(TopicEventResponseStatus.success),
+            StatusCode.OK,
+            id="ok_status_code_for_success_response",
+        ),
+        pytest.param(
+            TopicEventResponse(TopicEventResponseStatus.retry),
+            StatusCode.ERROR,
+            id="error_status_code_for_retry_response",
+        ),
+    ],
+)
+def test_set_span_status_from_async_cloudevent_handler(
+    response: TopicEventResponse, expected_span_status: StatusCode
+) -> None:
+    @set_span_status_from_cloudenvet_handler_result
+    async def cloudevent_handler(_: v1.Event) -> TopicEventResponse:
+        await asyncio.sleep(0)
+        return response
+
+    tracer_provider, exporter = new_in_memory_tracer_provider()
+    tracer = tracer_provider.get_tracer(__name__)
+    with use_span(tracer.start_span("test_span"), end_on_exit=True):
+        assert asyncio.run(cloudevent_handler(v1.Event())) is response
+
+    (span,) = exporter.get_finished_spans()
+    assert span.status.status_code == expected_span_status
+
+
 @pytest.mark.parametrize(
     ("event_extractor", "setup_cloudevent", "expected_span_event_data"),
     [
@@ -108,3 +147,72 @@ def test_set_span_event_from_event(
         _ = cloudevent_handler(setup_cloudevent())
         assert len(span._events) == 1
         assert span._events[0].attributes == expected_span_event_data
+
+
+def test_set_span_event_from_event_with_async_handler() -> None:
+    @set_span_event_from_event(
+        name="test_set_span_event_from_event", event_extractor=lambda _: {"k": "v"}
+    )
+    async def cloudevent_handler(_: v1.Event) -> str:
+        await asyncio.sleep(0)
+        return "handled"
+
+    tracer_provider, exporter = new_in_memory_tracer_provider()
+    tracer = tracer_provider.get_tracer(__name__)
+    with use_span(tracer.start_span("test_span"), end_on_exit=True):
+        assert asyncio.run(cloudevent_handler(CloudEventBuilder().build())) == "handled"
+
+    (span,) = exporter.get_finished_spans()
+    assert [event.attributes for event in span.events] == [{"k": "v"}]
+
+
+def test_set_span_event_from_event_skips_extraction_for_non_recording_span() -> None:
+    extracted = []
+
+    @set_span_event_from_event(name="test", event_extractor=extracted.append)
+    def cloudevent_handler(_: v1.Event) -> str:
+        return "handled"
+
+    with use_span(SpanContextBuilder().build_span()):
+        assert cloudevent_handler(CloudEventBuilder().build()) == "handled"
+    assert extracted == []
+
+
+@pytest.mark.parametrize(
+    ("data", "max_data_length", "expected_event_data"),
+    [
+        pytest.param("short", 8, "short", id="str_within_limit"),
+        pytest.param("x" * 100, 8, "xxxxxxxx...", id="str_truncated"),
+        pytest.param(b"x" * 100, 4, "b'xxxx'...", id="bytes_truncated"),
+        pytest.param(b"ab", 4, "b'ab'", id="bytes_within_limit"),
+        pytest.param(
+            {"key": "x" * 100},
+            48,
+            "{'key': '" + "x" * 21 + "..." + "x" * 15 + "...",
+            id="dict_rendered_with_reprlib",
+        ),
+        pytest.param(
+            list(range(100)),
+            40,
+            "[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, ...]",
+            id="list_rendered_with_reprlib",
+        ),
+        pytest.param(None, 8, "None", id="none"),
+    ],
+)
+def test_make_payload_extractor(
+    data: object, max_data_length: int, expected_event_data: str
+) -> None:
+    event = CloudEventBuilder().with_data(data).with_id("test_id").build()
+    extracted = make_payload_extractor(max_data_length)(event)
+
+    assert extracted["event_data"] == expected_event_data
+    assert extracted == {
+        **extract_payload_from_cloudevent(event),
+        "event_data": expected_event_data,
+    }
+
+
+def test_make_payload_extractor_rejects_negative_length() -> None:
+    with pytest.raises(ValueError, match="must not be negative"):
+        make_payload_extractor(-1)
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING
+
+from skand_otel_utils.cloudevents.diagnostics import RateLimitedLogger
+
+if TYPE_CHECKING:
+    import pytest
+
+
+def test_logs_first_occurrences_then_periodic_summaries(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    now = [0.0]
+    rate_limited = RateLimitedLogger(
+        logging.getLogger(__name__),
+        first_n=2,
+        summary_interval=10.0,
+        clock=lambda: now[0],
+    )
+
+    with caplog.at_level(logging.WARNING, logger=__name__):
+        for second in range(25):
+            now[0] = float(second)
+            rate_limited.log("missing %s", "traceparent")
+
+    assert [record.getMessage() for record in caplog.records] == [
+        "missing traceparent",
+        "missing traceparent",
+        "missing traceparent (11 occurrences since the last report, 13 in total)",
+        "missing traceparent (10 occurrences since the last report, 23 in total)",
+    ]
+    assert rate_limited.count == 25  # noqa: PLR2004
+
+
+def test_nothing_counted_when_level_disabled(caplog: pytest.LogCaptureFixture) -> None:
+    rate_limited = RateLimitedLogger(logging.getLogger(__name__), level=logging.DEBUG)
+
+    with caplog.at_level(logging.INFO, logger=__name__):
+        rate_limited.log("missing traceparent")
+
+    assert not caplog.records
+    assert rate_limited.count == 0
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from skand_otel_utils.cloudevents.json_scanner import (
+    AmbiguousJSONError,
+    JSONText,
+    scan_top_level_strings,
+)
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+NESTED_DOCUMENT = json.dumps(
+    {
+        "nested": [1, {"traceparent": "nested"}, "]}", [[0.1, 0.2], [0.3]]],
+        "escaped": {"key": '"}'},
+        "empty": [{}, []],
+        "number": -1.5e3,
+        "flag": True,
+        "traceparent": TRACEPARENT,
+        "after": "value",
+    }
+)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        pytest.param(NESTED_DOCUMENT, id="str"),
+        pytest.param(NESTED_DOCUMENT.encode(), id="bytes"),
+        pytest.param(bytearray(NESTED_DOCUMENT.encode()), id="bytearray"),
+        pytest.param(memoryview(NESTED_DOCUMENT.encode()), id="memoryview"),
+    ],
+)
+def test_finds_top_level_string_skipping_nested_values(data: JSONText) -> None:
+    assert scan_top_level_strings(data, ("traceparent",)) == {
+        "traceparent": TRACEPARENT
+    }
+
+
+@pytest.mark.parametrize(
+    ("data", "expected"),
+    [
+        pytest.param('{"traceparent": null}', {"traceparent": None}, id="null"),
+        pytest.param('{"traceparent": 1}', {"traceparent": None}, id="number"),
+        pytest.param('{"traceparent": ""}', {"traceparent": ""}, id="empty_string"),
+        pytest.param(
+            json.dumps({"traceparent": "café\\"}),
+            {"traceparent": "café\\"},
+            id="escaped",
+        ),
+        pytest.param(
+            json.dumps({"traceparent": "café"}, ensure_ascii=False).encode(),
+            {"traceparent": "café"},
+            id="utf8_bytes",
+        ),
+        pytest.param(
+            '{"traceparent": "a", "traceparent": "b"}',
+            {"traceparent": "b"},
+            id="last_duplicate_wins",
+        ),
+        pytest.param(
+            b'{"traceparent": "a", "\\u0074raceparent": "b"}',
+            {"traceparent": "b"},
+            id="last_escaped_duplicate_wins",
+        ),
+        pytest.param("{}", {}, id="empty_object"),
+        pytest.param("", {}, id="empty_document"),
+        pytest.param("[1, 2]", {}, id="array"),
+        pytest.param('"traceparent"', {}, id="string"),
+    ],
+)
+def test_decodes_values(data: JSONText, expected: dict) -> None:
+    assert scan_top_level_strings(data, ("traceparent",)) == expected
+
+
+def test_finds_several_keys_in_one_pass() -> None:
+    data = json.dumps({"tracestate": "k=v", "other": [1], "traceparent": TRACEPARENT})
+    assert scan_top_level_strings(data, ("traceparent", "tracestate")) == {
+        "traceparent": TRACEPARENT,
+        "tracestate": "k=v",
+    }
+
+
+def test_stops_at_byte_budget() -> None:
+    data = json.dumps({"padding": "x" * 1024, "traceparent": TRACEPARENT})
+    assert scan_top_level_strings(data, ("traceparent",), max_bytes=512) == {}
+    assert scan_top_level_strings(data, ("traceparent",), max_bytes=None) == {
+        "traceparent": TRACEPARENT
+    }
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        pytest.param('{"a": 1', id="unterminated_object"),
+        pytest.param('{"a" 1}', id="missing_colon"),
+        pytest.param('{"a": 1 "b": 2}', id="missing_comma"),
+        pytest.param('{"traceparent": "\\x"}', id="invalid_escape"),
+        pytest.param(b'{"traceparent": "\xff"}', id="invalid_utf8"),
+        pytest.param(b"\xef\xbb\xbf{}", id="byte_order_mark"),
+        pytest.param('{"a": 1}'.encode("utf-16"), id="utf16"),
+    ],
+)
+def test_raises_when_ambiguous(data: JSONText) -> None:
+    with pytest.raises(AmbiguousJSONError):
+        scan_top_level_strings(data, ("traceparent", "missing"))
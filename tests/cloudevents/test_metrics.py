@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, Any, Callable
+
+import pytest
+from dapr.clients.grpc._response import TopicEventResponse, TopicEventResponseStatus
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+from opentelemetry.semconv.trace import SpanAttributes
+
+from skand_otel_utils.cloudevents.decorators.distributed_trace_context import setup
+from skand_otel_utils.cloudevents.metrics import (
+    EXCEPTION_STATUS,
+    EXTRACTOR_ATTRIBUTE,
+    HANDLER_STATUS_ATTRIBUTE,
+    NO_RESPONSE_STATUS,
+    UNKNOWN_EXTRACTOR,
+    CloudEventMetrics,
+)
+from tests.testutils import (
+    CloudEventBuilder,
+    SpanContextBuilder,
+    format_traceparent_from_span_context,
+)
+
+if TYPE_CHECKING:
+    from cloudevents.sdk.event import v1
+
+TOPIC_ATTRIBUTES = {SpanAttributes.MESSAGING_DESTINATION_NAME: "orders"}
+
+
+def collect(reader: InMemoryMetricReader) -> dict[str, dict[frozenset, Any]]:
+    """Collect the data points of every metric, keyed by name and attributes."""
+    collected: dict[str, dict[frozenset, Any]] = {}
+    metrics_data = reader.get_metrics_data()
+    if metrics_data is None:
+        return collected
+    for resource_metrics in metrics_data.resource_metrics:
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                collected[metric.name] = {
+                    frozenset(point.attributes.items()): point
+                    for point in metric.data.data_points
+                }
+    return collected
+
+
+def with_topic(**attributes: str) -> frozenset:
+    return frozenset({**TOPIC_ATTRIBUTES, **attributes}.items())
+
+
+def new_metered_setup() -> tuple[Callable[[Any], Any], InMemoryMetricReader]:
+    reader = InMemoryMetricReader()
+    decorator = setup(
+        topic="orders",
+        record_metrics=True,
+        meter_provider=MeterProvider(metric_readers=[reader]),
+    )
+    return decorator, reader
+
+
+def test_records_extraction_and_handler_metrics() -> None:
+    decorator, reader = new_metered_setup()
+    traceparent = format_traceparent_from_span_context(
+        SpanContextBuilder().with_remote(True).build()
+    )
+    responses = iter(
+        [
+            TopicEventResponse(TopicEventResponseStatus.success),
+            TopicEventResponse(TopicEventResponseStatus.retry),
+            None,
+        ]
+    )
+
+    @decorator
+    def cloudevent_handler(_: v1.Event) -> TopicEventResponse | None:
+        return next(responses)
+
+    cloudevent_handler(
+        CloudEventBuilder().with_extension("traceparent", traceparent).build()
+    )
+    cloudevent_handler(
+        CloudEventBuilder().with_extension("traceparent", "invalid").build()
+    )
+    cloudevent_handler(CloudEventBuilder().build())
+
+    event_count = 3
+    metrics = collect(reader)
+    for name in (
+        "cloudevents.traceparent.extraction.duration",
+        "cloudevents.handler.duration",
+        "cloudevents.process.duration",
+    ):
+        assert metrics[name][with_topic()].count == event_count
+    assert {
+        attributes: point.value
+        for attributes, point in metrics[
+            "cloudevents.traceparent.extractor.matches"
+        ].items()
+    } == {with_topic(**{EXTRACTOR_ATTRIBUTE: "from_extensions"}): 2}
+    assert metrics["cloudevents.traceparent.misses"][with_topic()].value == 1
+    assert metrics["cloudevents.traceparent.invalid"][with_topic()].value == 1
+    assert {
+        attributes: point.value
+        for attributes, point in metrics["cloudevents.handler.results"].items()
+    } == {
+        with_topic(**{HANDLER_STATUS_ATTRIBUTE: "success"}): 1,
+        with_topic(**{HANDLER_STATUS_ATTRIBUTE: "retry"}): 1,
+        with_topic(**{HANDLER_STATUS_ATTRIBUTE: NO_RESPONSE_STATUS}): 1,
+    }
+
+
+def test_records_handler_exception() -> None:
+    decorator, reader = new_metered_setup()
+
+    @decorator
+    async def cloudevent_handler(_: v1.Event) -> None:
+        await asyncio.sleep(0)
+        msg = "handler failed"
+        raise RuntimeError(msg)
+
+    with pytest.raises(RuntimeError, match="handler failed"):
+        asyncio.run(cloudevent_handler(CloudEventBuilder().build()))
+
+    metrics = collect(reader)
+    assert metrics["cloudevents.process.duration"][with_topic()].count == 1
+    assert (
+        metrics["cloudevents.handler.results"][
+            with_topic(**{HANDLER_STATUS_ATTRIBUTE: EXCEPTION_STATUS})
+        ].value
+        == 1
+    )
+
+
+def test_unnamed_extractor_is_recorded_as_unknown() -> None:
+    reader = InMemoryMetricReader()
+    cloudevent_metrics = CloudEventMetrics(MeterProvider(metric_readers=[reader]))
+    traceparent = format_traceparent_from_span_context(
+        SpanContextBuilder().with_remote(True).build()
+    )
+
+    extract = cloudevent_metrics.instrument_extraction(lambda _: (traceparent, None))
+    extract(CloudEventBuilder().build())
+
+    assert set(collect(reader)["cloudevents.traceparent.extractor.matches"]) == {
+        frozenset({EXTRACTOR_ATTRIBUTE: UNKNOWN_EXTRACTOR}.items())
+    }
+
+
+def test_no_metrics_when_disabled() -> None:
+    reader = InMemoryMetricReader()
+
+    @setup(meter_provider=MeterProvider(metric_readers=[reader]))
+    def cloudevent_handler(_: v1.Event) -> None:
+        return
+
+    cloudevent_handler(CloudEventBuilder().build())
+    assert collect(reader) == {}
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, Any
+
+import pytest
+
+from skand_otel_utils.cloudevents import payload
+from tests.testutils import CloudEventBuilder
+
+if TYPE_CHECKING:
+    from skand_otel_utils.cloudevents.json_scanner import JSONText
+
+
+class RecordingDecoder(list):
+    """JSON decoder that records every input it decodes."""
+
+    def __call__(self, data: JSONText) -> Any:  # noqa: ANN401
+        self.append(data)
+        return json.loads(data.tobytes() if isinstance(data, memoryview) else data)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        pytest.param('{"key": "value"}', id="str"),
+        pytest.param(b'{"key": "value"}', id="bytes"),
+        pytest.param(memoryview(b'{"key": "value"}'), id="memoryview"),
+    ],
+)
+def test_default_decoder(data: JSONText) -> None:
+    assert payload.get_default_decoder()(data) == {"key": "value"}
+
+
+def test_get_payload_decodes_once() -> None:
+    decoder = RecordingDecoder()
+    event = CloudEventBuilder().with_data('{"key": "value"}').build()
+    payload.share(event, decoder)
+
+    assert payload.is_shared(event)
+    assert payload.get_payload(event) == {"key": "value"}
+    assert payload.get_payload(event) is payload.get_payload(event)
+    assert len(decoder) == 1
+
+
+def test_get_payload_is_invalidated_when_data_changes() -> None:
+    decoder = RecordingDecoder()
+    event = CloudEventBuilder().with_data('{"key": "value"}').build()
+    payload.share(event, decoder)
+    assert payload.get_payload(event) == {"key": "value"}
+
+    event.data = '{"key": "other"}'
+    assert payload.get_payload(event) == {"key": "other"}
+    assert decoder == ['{"key": "value"}', '{"key": "other"}']
+
+
+def test_get_payload_caches_decode_errors() -> None:
+    decoder = RecordingDecoder()
+    event = CloudEventBuilder().with_data("invalid_json_data").build()
+    payload.share(event, decoder)
+
+    for _ in range(2):
+        with pytest.raises(ValueError, match="Expecting value"):
+            payload.get_payload(event)
+    assert len(decoder) == 1
+
+
+def test_get_payload_returns_non_text_data_as_is() -> None:
+    data = {"key": "value"}
+    event = CloudEventBuilder().with_data(data).build()
+    assert not payload.is_shared(event)
+    assert payload.get_payload(event) is data
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import pytest
+from google.protobuf import descriptor_pb2
+
+from skand_otel_utils.cloudevents.protobuf_scanner import (
+    BinaryData,
+    MalformedMessageError,
+    scan_string_fields,
+)
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+# Field numbers of FileDescriptorProto: 1 for name, 4 for message_type, 10 for
+# public_dependency and 12 for syntax.
+MESSAGE = descriptor_pb2.FileDescriptorProto(
+    name="orders.proto",
+    message_type=[descriptor_pb2.DescriptorProto(name=TRACEPARENT[::-1])],
+    public_dependency=[300],
+    syntax=TRACEPARENT,
+).SerializeToString()
+
+
+def varint(value: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte, value = value & 0x7F, value >> 7
+        encoded.append(byte | (0x80 if value else 0))
+        if not value:
+            return bytes(encoded)
+
+
+def field(number: int, wire_type: int, payload: bytes) -> bytes:
+    if wire_type == 2:  # noqa: PLR2004
+        payload = varint(len(payload)) + payload
+    return varint(number << 3 | wire_type) + payload
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        pytest.param(MESSAGE, id="bytes"),
+        pytest.param(bytearray(MESSAGE), id="bytearray"),
+        pytest.param(memoryview(MESSAGE), id="memoryview"),
+    ],
+)
+def test_finds_top_level_string_skipping_other_fields(data: BinaryData) -> None:
+    assert scan_string_fields(data, (12, 1)) == {
+        12: TRACEPARENT,
+        1: "orders.proto",
+    }
+
+
+@pytest.mark.parametrize(
+    ("data", "expected"),
+    [
+        pytest.param(
+            field(1, 1, bytes(8)) + field(2, 5, bytes(4)) + field(3, 2, b"value"),
+            {3: "value"},
+            id="after_fixed_width_fields",
+        ),
+        pytest.param(field(3, 0, varint(1 << 40)), {3: None}, id="varint"),
+        pytest.param(field(3, 5, bytes(4)), {3: None}, id="fixed32"),
+        pytest.param(field(3, 2, b"\xff\xfe"), {3: None}, id="invalid_utf8"),
+        pytest.param(field(3, 2, b""), {3: ""}, id="empty_string"),
+        pytest.param(field(3, 2, "café".encode()), {3: "café"}, id="utf8_string"),
+        pytest.param(
+            field(3, 2, b"first") + field(3, 2, b"second"),
+            {3: "first"},
+            id="first_occurrence_wins",
+        ),
+        pytest.param(field(4, 2, b"value"), {}, id="missing"),
+        pytest.param(b"", {}, id="empty_message"),
+    ],
+)
+def test_field_values(data: bytes, expected: dict[int, str | None]) -> None:
+    assert scan_string_fields(data, (3,)) == expected
+
+
+def test_stops_once_every_field_is_found() -> None:
+    data = field(3, 2, b"value") + b"\xff" * 16
+
+    assert scan_string_fields(data, (3,)) == {3: "value"}
+
+
+def test_budget_limits_the_scanned_prefix() -> None:
+    data = field(1, 2, b"x" * 1024) + field(3, 2, TRACEPARENT.encode())
+
+    assert scan_string_fields(data, (3,), 512) == {}
+    assert scan_string_fields(data, (3,), None) == {3: TRACEPARENT}
+
+
+def test_field_ending_after_the_budget_is_not_found() -> None:
+    data = field(3, 2, TRACEPARENT.encode())
+
+    assert scan_string_fields(data, (3,), len(data) - 1) == {}
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        pytest.param(field(3, 2, b"value")[:-1], id="truncated_value"),
+        pytest.param(field(1, 1, bytes(7)), id="truncated_fixed64"),
+        pytest.param(b"\x1a", id="missing_length"),
+        pytest.param(b"\x80", id="truncated_tag"),
+        pytest.param(field(1, 3, b"") + field(1, 4, b""), id="group"),
+        pytest.param(field(0, 2, b"value"), id="field_number_zero"),
+        pytest.param(b"\x08" + b"\xff" * 10 + b"\x01", id="varint_too_long"),
+    ],
+)
+def test_malformed_messages(data: bytes) -> None:
+    with pytest.raises(MalformedMessageError):
+        scan_string_fields(data, (3,))
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from opentelemetry import baggage, context, trace
+
+from skand_otel_utils.cloudevents.publisher import (
+    get_publish_metadata,
+    propagate_to_events,
+)
+from tests.testutils import (
+    CloudEventBuilder,
+    SpanContextBuilder,
+    assert_no_active_trace_context,
+    format_traceparent_from_span_context,
+)
+
+
+class TestPropagateToEvents:
+    def test_current_headers_are_added_to_every_event(self) -> None:
+        builder = SpanContextBuilder().with_trace_state(
+            trace.TraceState([("vendor", "value")])
+        )
+        token = context.attach(
+            baggage.set_baggage("tenant", "skand", builder.build_trace_context())
+        )
+        events = [
+            CloudEventBuilder().with_extension("partitionkey", "a").build(),
+            CloudEventBuilder().build(),
+        ]
+
+        headers = propagate_to_events(events)
+
+        context.detach(token)
+        assert headers == {
+            "traceparent": format_traceparent_from_span_context(builder.build()),
+            "tracestate": "vendor=value",
+            "baggage": "tenant=skand",
+        }
+        assert events[0].extensions == {"partitionkey": "a", **headers}
+        assert events[1].extensions == headers
+
+    def test_given_headers_replace_existing_ones(self) -> None:
+        event = CloudEventBuilder().with_extension("traceparent", "stale").build()
+        headers = {"traceparent": "00-" + "1" * 32 + "-" + "2" * 16 + "-01"}
+
+        propagate_to_events([event], headers)
+
+        assert event.extensions == headers
+
+    def test_events_are_unchanged_without_trace_context(self) -> None:
+        assert_no_active_trace_context()
+        event = CloudEventBuilder().build()
+
+        assert propagate_to_events([event]) == {}
+        assert event.extensions == {}
+
+
+class TestGetPublishMetadata:
+    def test_trace_context_is_set_and_metadata_kept(self) -> None:
+        builder = SpanContextBuilder().with_trace_state(
+            trace.TraceState([("vendor", "value")])
+        )
+        token = context.attach(
+            baggage.set_baggage("tenant", "skand", builder.build_trace_context())
+        )
+
+        metadata = get_publish_metadata({"ttlInSeconds": "60"})
+
+        context.detach(token)
+        assert metadata == {
+            "ttlInSeconds": "60",
+            "cloudevent.traceparent": format_traceparent_from_span_context(
+                builder.build()
+            ),
+            "cloudevent.tracestate": "vendor=value",
+        }
+
+    def test_metadata_is_copied_without_trace_context(self) -> None:
+        assert_no_active_trace_context()
+        metadata = {"ttlInSeconds": "60"}
+
+        assert get_publish_metadata(metadata) == metadata
+        assert get_publish_metadata() == {}
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import TYPE_CHECKING
+
+import pytest
+from dapr.clients.grpc._response import TopicEventResponse, TopicEventResponseStatus
+from dapr.ext.grpc import App
+from opentelemetry import trace
+
+from skand_otel_utils import propagator
+from skand_otel_utils.cloudevents.decorators import distributed_trace_context
+from skand_otel_utils.cloudevents.metrics import EXCEPTION_STATUS
+from skand_otel_utils.cloudevents.pubsub_harness import (
+    NO_RESPONSE_STATUS,
+    PubSubHarness,
+    app_handler,
+    generate_events,
+    simulated_handler,
+)
+
+if TYPE_CHECKING:
+    from cloudevents.sdk.event import v1
+
+EVENTS = 20
+
+
+def test_generate_events() -> None:
+    generated = list(generate_events(2, topic="orders", payload_size=256))
+
+    assert len({item.event.id for item in generated}) == len(generated)
+    for event, upstream in generated:
+        assert event.subject == "orders"
+        assert event.extensions["topic"] == "orders"
+        assert propagator.parse_traceparent(event.extensions["traceparent"]) == (
+            upstream
+        )
+        assert isinstance(event.data, bytes)
+        assert len(event.data) == pytest.approx(256, abs=16)
+
+
+def test_generate_events_without_traceparent() -> None:
+    ((event, upstream),) = generate_events(1, with_traceparent=False)
+
+    assert upstream is None
+    assert "traceparent" not in event.extensions
+
+
+@pytest.mark.parametrize("consumer_span", [True, False])
+def test_readme_stack_continues_upstream_traces(consumer_span: bool) -> None:
+    harness = PubSubHarness()
+    handler = distributed_trace_context.setup(
+        consumer_span=consumer_span, tracer_provider=harness.tracer_provider
+    )(simulated_handler(harness.tracer_provider))
+
+    report = harness.run(handler, events=EVENTS, concurrency=4)
+
+    assert report.events == EVENTS
+    assert report.statuses == {"success": EVENTS}
+    assert report.spans == EVENTS * (2 if consumer_span else 1)
+    assert report.traced_events == EVENTS
+    assert report.trace_correct
+    assert report.throughput > 0
+    latencies = report.latency_seconds
+    assert 0 <= latencies["p50"] <= latencies["p90"] <= latencies["p100"]
+    assert json.loads(json.dumps(report.to_dict()))["trace_correct"] is True
+
+
+def test_reports_broken_propagation() -> None:
+    harness = PubSubHarness()
+
+    report = harness.run(simulated_handler(harness.tracer_provider), events=EVENTS)
+
+    assert report.orphan_spans == EVENTS
+    assert report.untraced_events == EVENTS
+    assert not report.trace_correct
+
+
+def test_reports_misparented_spans() -> None:
+    harness = PubSubHarness()
+    tracer = harness.tracer_provider.get_tracer(__name__)
+
+    @distributed_trace_context.setup()
+    def handler(_: v1.Event) -> None:
+        span_context = trace.get_current_span().get_span_context()
+        parent = trace.NonRecordingSpan(
+            trace.SpanContext(
+                span_context.trace_id,
+                span_context.span_id + 1,
+                is_remote=True,
+                trace_flags=span_context.trace_flags,
+            )
+        )
+        tracer.start_span("handle", trace.set_span_in_context(parent)).end()
+
+    report = harness.run(handler, events=EVENTS)
+
+    assert report.misparented_spans == EVENTS
+    assert report.statuses == {"none": EVENTS}
+
+
+def test_counts_exceptions() -> None:
+    def handler(_: v1.Event) -> None:
+        msg = "failed"
+        raise RuntimeError(msg)
+
+    report = PubSubHarness().run(handler, events=EVENTS, concurrency=2)
+
+    assert report.statuses == {EXCEPTION_STATUS: EVENTS}
+
+
+def test_paces_deliveries() -> None:
+    harness = PubSubHarness()
+
+    report = harness.run(lambda _: None, events=5, rate=100)
+
+    assert report.duration_seconds >= 4 / 100
+
+
+def test_async_handler() -> None:
+    harness = PubSubHarness()
+    handler = simulated_handler(harness.tracer_provider)
+
+    @distributed_trace_context.setup(tracer_provider=harness.tracer_provider)
+    async def async_handler(event: v1.Event) -> object:
+        await asyncio.sleep(0)
+        return handler(event)
+
+    report = harness.run(async_handler, events=EVENTS, concurrency=4)
+
+    assert report.statuses == {"success": EVENTS}
+    assert report.trace_correct
+
+
+def test_delivers_through_dapr_app() -> None:
+    harness = PubSubHarness()
+    app = App()
+
+    @app.subscribe(pubsub_name="pubsub", topic="orders")
+    @distributed_trace_context.setup(
+        consumer_span=True, tracer_provider=harness.tracer_provider
+    )
+    def handler(event: v1.Event) -> TopicEventResponse:
+        assert event.subject == "orders"
+        return TopicEventResponse(TopicEventResponseStatus.retry)
+
+    report = harness.run(
+        app_handler(app, "pubsub", "orders"), events=EVENTS, topic="orders"
+    )
+
+    assert report.statuses == {"retry": EVENTS}
+    assert report.traced_events == EVENTS
+    assert report.trace_correct
+
+
+def test_dapr_app_without_response() -> None:
+    app = App()
+
+    @app.subscribe(pubsub_name="pubsub", topic="orders")
+    def handler(_: v1.Event) -> None:
+        return None
+
+    report = PubSubHarness().run(
+        app_handler(app, "pubsub", "orders"), events=EVENTS, topic="orders"
+    )
+
+    assert report.statuses == {NO_RESPONSE_STATUS: EVENTS}
+
+
+def test_rejects_no_concurrency() -> None:
+    with pytest.raises(ValueError, match="concurrency"):
+        PubSubHarness().run(lambda _: None, concurrency=0)
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import json
+
+from benchmarks import harness
+from benchmarks.__main__ import run
+
+
+def test_benchmark_suite_smoke() -> None:
+    report = run(payload_sizes=(1024,), min_time=0.0001, repeat=1)
+
+    results = json.loads(json.dumps(report))["results"]
+    keys = [result["key"] for result in results]
+    assert len(keys) == len(set(keys))
+    assert {result["name"] for result in results} >= {
+        "propagator/get_traceparent_from_current_trace_context",
+        "distributed_trace_context/setup",
+        "trace_span/set_span_event_from_event",
+        "trace_span/set_span_status_from_cloudenvet_handler_result",
+        "stack/readme",
+    }
+    assert all(result["best_ns_per_op"] > 0 for result in results)
+    assert harness.compare(report, report) == [
+        (result["key"], result["best_ns_per_op"], result["best_ns_per_op"])
+        for result in results
+    ]
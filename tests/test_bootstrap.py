@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+import functools
+import multiprocessing
+import os
+import threading
+from typing import Sequence
+
+import pytest
+from opentelemetry.sdk.metrics import Counter, MeterProvider
+from opentelemetry.sdk.metrics.export import (
+    AggregationTemporality,
+    InMemoryMetricReader,
+    MetricExporter,
+    MetricExportResult,
+    MetricsData,
+)
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    SimpleSpanProcessor,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+
+from skand_otel_utils import bootstrap, load_shedding
+from skand_otel_utils.bootstrap import (
+    DEFAULT_MAX_EXPORT_BATCH_SIZE,
+    DEFAULT_MAX_QUEUE_SIZE,
+    DROPPED_SPANS_METRIC,
+    QUEUE_SIZE_METRIC,
+    ForkSafeMetricExporter,
+    ForkSafeSpanExporter,
+    MonitoredBatchSpanProcessor,
+    configure_tracing,
+    install_providers,
+)
+
+
+class RecordingFactory:
+    """Span exporter factory keeping the exporters it created."""
+
+    def __init__(self) -> None:
+        """Initialize the factory without exporters."""
+        self.exporters: list[InMemorySpanExporter] = []
+
+    def __call__(self) -> InMemorySpanExporter:
+        exporter = InMemorySpanExporter()
+        self.exporters.append(exporter)
+        return exporter
+
+
+class TestForkSafeSpanExporter:
+    def test_exporter_is_created_lazily_once_per_process(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        factory = RecordingFactory()
+        exporter = ForkSafeSpanExporter(factory)
+        assert factory.exporters == []
+        assert exporter.force_flush()
+
+        assert exporter.export([]) == SpanExportResult.SUCCESS
+        assert exporter.export([]) == SpanExportResult.SUCCESS
+        assert len(factory.exporters) == 1
+
+        monkeypatch.setattr(bootstrap.os, "getpid", lambda: -1)
+        exporter.shutdown()
+        assert factory.exporters[0]._stopped is False
+        exporter.export([])
+        exporter.shutdown()
+
+        parent_exporter, child_exporter = factory.exporters
+        assert child_exporter._stopped is True
+        assert parent_exporter._stopped is False
+
+    @pytest.mark.skipif(
+        "fork" not in multiprocessing.get_all_start_methods(),
+        reason="requires the fork start method",
+    )
+    def test_forked_child_exports_through_its_own_exporter(self) -> None:
+        factory = RecordingFactory()
+        providers = install_providers(
+            factory, span_processor_factory=SimpleSpanProcessor, set_global=False
+        )
+        tracer = providers.tracer_provider.get_tracer(__name__)
+        tracer.start_span("parent").end()
+        results = multiprocessing.get_context("fork").Queue()
+
+        def export_in_child() -> None:
+            tracer.start_span("child").end()
+            results.put(
+                [
+                    [span.name for span in exporter.get_finished_spans()]
+                    for exporter in factory.exporters
+                ]
+            )
+
+        child = multiprocessing.get_context("fork").Process(target=export_in_child)
+        child.start()
+        child.join(timeout=30)
+
+        assert results.get(timeout=30) == [["parent"], ["child"]]
+        assert [span.name for span in factory.exporters[0].get_finished_spans()] == [
+            "parent"
+        ]
+
+    @pytest.mark.skipif(
+        "fork" not in multiprocessing.get_all_start_methods(),
+        reason="requires the fork start method",
+    )
+    def test_forked_child_does_not_wait_for_lock_held_in_parent(self) -> None:
+        factory = RecordingFactory()
+        exporter = ForkSafeSpanExporter(factory)
+        results = multiprocessing.get_context("fork").Queue()
+
+        def export_in_child() -> None:
+            results.put(exporter.export([]))
+
+        # As if another thread of the parent was creating its exporter
+        with exporter._exporter._lock:
+            child = multiprocessing.get_context("fork").Process(target=export_in_child)
+            child.start()
+        child.join(timeout=30)
+
+        assert results.get(timeout=30) == SpanExportResult.SUCCESS
+        assert child.exitcode == 0
+
+
+class RecordingMetricExporter(MetricExporter):
+    """Metric exporter recording its process id with each export."""
+
+    def __init__(self, exported: list[tuple[int, MetricsData]]) -> None:
+        """Initialize the exporter recording exports into ``exported``."""
+        super().__init__()
+        self.exported = exported
+        self.pid = os.getpid()
+
+    def export(
+        self,
+        metrics_data: MetricsData,
+        timeout_millis: float = 10_000,  # noqa: ARG002
+        **_: object,
+    ) -> MetricExportResult:
+        self.exported.append((self.pid, metrics_data))
+        return MetricExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis: float = 10_000) -> bool:  # noqa: ARG002
+        return True
+
+    def shutdown(self, timeout_millis: float = 30_000, **_: object) -> None:  # noqa: ARG002
+        return
+
+
+class TestForkSafeMetricExporter:
+    def test_delegates_to_the_exporter_of_the_process(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        exported: list[tuple[int, MetricsData]] = []
+        exporter = ForkSafeMetricExporter(
+            functools.partial(RecordingMetricExporter, exported),
+            preferred_temporality={Counter: AggregationTemporality.DELTA},
+        )
+        assert exporter._preferred_temporality[Counter] == AggregationTemporality.DELTA
+
+        first, second = MetricsData([]), MetricsData([])
+        exporter.export(first)
+        pid = os.getpid()
+        monkeypatch.setattr(bootstrap.os, "getpid", lambda: -1)
+        exporter.export(second)
+
+        assert exported == [(pid, first), (-1, second)]
+
+
+def test_install_providers_without_setting_globals() -> None:
+    exported: list[tuple[int, MetricsData]] = []
+    factory = RecordingFactory()
+
+    providers = install_providers(
+        factory,
+        functools.partial(RecordingMetricExporter, exported),
+        span_processor_factory=SimpleSpanProcessor,
+        metric_export_interval_millis=60_000,
+        set_global=False,
+    )
+    providers.tracer_provider.get_tracer(__name__).start_span("span").end()
+    providers.meter_provider.get_meter(__name__).create_counter("events").add(1)
+    providers.meter_provider.force_flush()
+    providers.meter_provider.shutdown()
+
+    (exporter,) = factory.exporters
+    assert [span.name for span in exporter.get_finished_spans()] == ["span"]
+    assert exported
+    assert {pid for pid, _ in exported} == {os.getpid()}
+
+
+class BlockingSpanExporter(SpanExporter):
+    """Span exporter blocking each export until released."""
+
+    def __init__(self) -> None:
+        """Initialize the exporter, blocked."""
+        self.exporting = threading.Event()
+        self.released = threading.Event()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:  # noqa: ARG002
+        self.exporting.set()
+        self.released.wait(5)
+        return SpanExportResult.SUCCESS
+
+
+def collect_metrics(reader: InMemoryMetricReader) -> dict[str, int]:
+    return {
+        metric.name: point.value
+        for resource_metrics in reader.get_metrics_data().resource_metrics
+        for scope_metrics in resource_metrics.scope_metrics
+        for metric in scope_metrics.metrics
+        for point in metric.data.data_points
+    }
+
+
+class TestMonitoredBatchSpanProcessor:
+    def test_counts_dropped_spans_and_reports_queue(self) -> None:
+        exporter = BlockingSpanExporter()
+        processor = MonitoredBatchSpanProcessor(
+            exporter,
+            max_queue_size=4,
+            max_export_batch_size=4,
+            schedule_delay_millis=60_000,
+            shed_load_above=0.5,
+        )
+        reader = InMemoryMetricReader()
+        processor.instrument(MeterProvider(metric_readers=[reader]))
+        tracer_provider = TracerProvider()
+        tracer_provider.add_span_processor(processor)
+        tracer = tracer_provider.get_tracer(__name__)
+
+        def end_spans(count: int) -> None:
+            for _ in range(count):
+                tracer.start_span("span").end()
+
+        end_spans(4)
+        assert exporter.exporting.wait(5)
+        assert not processor.is_near_full()
+        end_spans(6)
+
+        assert processor.queue_size == processor.max_queue_size
+        assert processor.is_near_full()
+        assert processor.dropped_spans == 2  # noqa: PLR2004
+        assert collect_metrics(reader) == {
+            QUEUE_SIZE_METRIC: processor.max_queue_size,
+            DROPPED_SPANS_METRIC: 2,
+        }
+        exporter.released.set()
+        tracer_provider.shutdown()
+
+    def test_skips_spans_without_context(self) -> None:
+        processor = MonitoredBatchSpanProcessor(
+            BlockingSpanExporter(),
+            max_queue_size=1,
+            max_export_batch_size=1,
+            schedule_delay_millis=60_000,
+        )
+        processor.on_end(ReadableSpan("span"))
+        processor.on_end(ReadableSpan("span"))
+
+        assert processor.queue_size == 0
+        assert processor.dropped_spans == 0
+        processor.shutdown()
+
+
+class TestConfigureTracing:
+    def test_tuned_defaults(self) -> None:
+        configuration = configure_tracing(
+            service_name="tiler",
+            span_exporter_factory=InMemorySpanExporter,
+            export_metrics=False,
+            set_global=False,
+        )
+
+        processor = configuration.span_processor
+        assert processor.max_queue_size == DEFAULT_MAX_QUEUE_SIZE
+        assert processor.max_export_batch_size == DEFAULT_MAX_EXPORT_BATCH_SIZE
+        assert configuration.tracer_provider.resource.attributes["service.name"] == (
+            "tiler"
+        )
+        configuration.tracer_provider.shutdown()
+
+    def test_environment_and_arguments_override_defaults(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setenv("OTEL_BSP_MAX_QUEUE_SIZE", "100")
+
+        from_environment = configure_tracing(
+            span_exporter_factory=InMemorySpanExporter,
+            export_metrics=False,
+            set_global=False,
+        ).span_processor
+        from_arguments = configure_tracing(
+            span_exporter_factory=InMemorySpanExporter,
+            export_metrics=False,
+            max_queue_size=64,
+            set_global=False,
+        ).span_processor
+
+        assert from_environment.max_queue_size == 100  # noqa: PLR2004
+        assert from_arguments.max_queue_size == 64  # noqa: PLR2004
+        assert from_arguments.max_export_batch_size == 64  # noqa: PLR2004
+        from_environment.shutdown()
+        from_arguments.shutdown()
+
+    @pytest.mark.parametrize(
+        ("protocol", "package"), [("grpc", "grpc"), ("http/protobuf", "http")]
+    )
+    def test_otlp_exporters_are_compressed(self, protocol: str, package: str) -> None:
+        span_factory, metric_factory = bootstrap._otlp_exporter_factories(
+            protocol, "http://localhost:4318", compression=True
+        )
+
+        for factory in (span_factory, metric_factory):
+            assert factory.func.__module__.startswith(
+                f"opentelemetry.exporter.otlp.proto.{package}"
+            )
+            assert factory.keywords["compression"].name == "Gzip"
+        if protocol == "http/protobuf":
+            assert span_factory.keywords["endpoint"] == (
+                "http://localhost:4318/v1/traces"
+            )
+
+    def test_compression_environment_variable_takes_precedence(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setenv("OTEL_EXPORTER_OTLP_COMPRESSION", "none")
+
+        span_factory, _ = bootstrap._otlp_exporter_factories(
+            "grpc", None, compression=True
+        )
+
+        assert span_factory.keywords["compression"] is None
+
+    def test_rejects_unknown_protocol(self) -> None:
+        with pytest.raises(ValueError, match="protocol"):
+            configure_tracing(protocol="thrift", set_global=False)
+
+    def test_installs_load_shedding_hook_globally(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr(bootstrap.trace, "set_tracer_provider", lambda _: None)
+        monkeypatch.setattr(bootstrap.metrics, "set_meter_provider", lambda _: None)
+        monkeypatch.setattr(load_shedding, "_hook", None)
+
+        configuration = configure_tracing(
+            span_exporter_factory=InMemorySpanExporter, export_metrics=False
+        )
+
+        assert load_shedding.get_hook() == configuration.span_processor.is_near_full
+        configuration.tracer_provider.shutdown()
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import multiprocessing
+from typing import Mapping
+
+import pytest
+from opentelemetry import baggage, context, trace
+
+from skand_otel_utils import executors
+from skand_otel_utils.executors import (
+    ContextPropagatingProcessPoolExecutor,
+    ContextPropagatingThreadPoolExecutor,
+)
+from tests.testutils import (
+    SpanContextBuilder,
+    assert_no_active_trace_context,
+    format_traceparent_from_span_context,
+)
+
+NO_TRACE = (0, 0, {})
+
+
+def current_trace(_: object = None) -> tuple[int, int, Mapping[str, object]]:
+    span_context = trace.get_current_span().get_span_context()
+    return span_context.trace_id, span_context.span_id, dict(baggage.get_all())
+
+
+def build_submitter_context() -> tuple[context.Context, tuple[int, int, dict]]:
+    span_context = SpanContextBuilder().with_remote(True).build()
+    submitter_context = baggage.set_baggage(
+        "tenant",
+        "skand",
+        trace.set_span_in_context(trace.NonRecordingSpan(span_context)),
+    )
+    return submitter_context, (
+        span_context.trace_id,
+        span_context.span_id,
+        {"tenant": "skand"},
+    )
+
+
+class TestContextPropagatingThreadPoolExecutor:
+    def test_workers_run_under_the_submitter_context(self) -> None:
+        submitter_context, expected = build_submitter_context()
+
+        with ContextPropagatingThreadPoolExecutor(max_workers=1) as executor:
+            token = context.attach(submitter_context)
+            try:
+                submitted = executor.submit(current_trace).result()
+                mapped = list(executor.map(current_trace, range(2)))
+            finally:
+                context.detach(token)
+            after_detach = executor.submit(current_trace).result()
+
+        assert submitted == expected
+        assert mapped == [expected, expected]
+        assert after_detach == NO_TRACE
+        assert_no_active_trace_context()
+
+    def test_keyword_arguments_are_passed_through(self) -> None:
+        with ContextPropagatingThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(dict, fn=1, trace_context=2)
+
+        assert future.result() == {"fn": 1, "trace_context": 2}
+
+
+class TestContextPropagatingProcessPoolExecutor:
+    @pytest.mark.skipif(
+        "fork" not in multiprocessing.get_all_start_methods(),
+        reason="requires the fork start method",
+    )
+    def test_workers_run_under_the_submitter_trace(self) -> None:
+        submitter_context, expected = build_submitter_context()
+
+        with ContextPropagatingProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            token = context.attach(submitter_context)
+            try:
+                submitted = executor.submit(current_trace).result()
+                mapped = list(executor.map(current_trace, range(2)))
+            finally:
+                context.detach(token)
+            after_detach = executor.submit(current_trace).result()
+
+        assert submitted == expected
+        assert mapped == [expected, expected]
+        assert after_detach == NO_TRACE
+
+    def test_spans_are_flushed_after_each_call(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        flushes = []
+
+        class FlushingTracerProvider(trace.NoOpTracerProvider):
+            def force_flush(self) -> None:
+                flushes.append(current_trace())
+
+        monkeypatch.setattr(trace, "get_tracer_provider", FlushingTracerProvider)
+        span_context = SpanContextBuilder().with_remote(True).build()
+        headers = {"traceparent": format_traceparent_from_span_context(span_context)}
+
+        result = executors._run_with_trace_headers(headers, True, current_trace)
+        executors._run_with_trace_headers({}, False, current_trace)
+
+        assert result == (span_context.trace_id, span_context.span_id, {})
+        assert flushes == [NO_TRACE]
+        assert_no_active_trace_context()
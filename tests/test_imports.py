@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_PACKAGES = ("cloudevents", "dapr", "google.protobuf", "grpc")
+SDK_PACKAGE = "opentelemetry.sdk"
+
+# Modules imported on top of the OTel API, which every module needs. Budgets
+# leave some room for the standard library of other Python versions
+IMPORT_BUDGETS = {
+    "skand_otel_utils.propagator": 5,
+    "skand_otel_utils.executors": 30,
+    "skand_otel_utils.load_shedding": 5,
+    "skand_otel_utils.sampling": 40,
+    "skand_otel_utils.bootstrap": 80,
+    "skand_otel_utils.spool": 40,
+    "skand_otel_utils.cloudevents.diagnostics": 10,
+    "skand_otel_utils.cloudevents.json_scanner": 10,
+    "skand_otel_utils.cloudevents.metrics": 10,
+    "skand_otel_utils.cloudevents.payload": 10,
+    "skand_otel_utils.cloudevents.protobuf_scanner": 10,
+    "skand_otel_utils.cloudevents.publisher": 10,
+    "skand_otel_utils.cloudevents.types": 10,
+    "skand_otel_utils.cloudevents.decorators.bulk": 25,
+    "skand_otel_utils.cloudevents.decorators.deduplicate": 25,
+    "skand_otel_utils.cloudevents.decorators.distributed_trace_context": 25,
+    "skand_otel_utils.cloudevents.decorators.instrument": 25,
+    "skand_otel_utils.cloudevents.decorators.trace_span": 10,
+}
+
+SDK_MODULES = {
+    "skand_otel_utils.sampling",
+    "skand_otel_utils.bootstrap",
+    "skand_otel_utils.spool",
+}
+
+IMPORT_SCRIPT = """
+import json
+import sys
+
+import opentelemetry.baggage.propagation
+import opentelemetry.metrics
+import opentelemetry.trace
+
+before = set(sys.modules)
+import {module}
+print(json.dumps(sorted(set(sys.modules) - before)))
+"""
+
+
+def imported_modules(module: str) -> list[str]:
+    """Import the module in a fresh interpreter and list the modules it loaded."""
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", IMPORT_SCRIPT.format(module=module)],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return json.loads(result.stdout)
+
+
+def is_in_package(module: str, package: str) -> bool:
+    return module == package or module.startswith(f"{package}.")
+
+
+@pytest.mark.parametrize(("module", "budget"), IMPORT_BUDGETS.items())
+def test_import_stays_within_budget(module: str, budget: int) -> None:
+    modules = imported_modules(module)
+
+    forbidden = (
+        HEAVY_PACKAGES if module in SDK_MODULES else (*HEAVY_PACKAGES, SDK_PACKAGE)
+    )
+    assert [
+        name
+        for name in modules
+        if any(is_in_package(name, package) for package in forbidden)
+    ] == []
+    assert len(modules) <= budget, modules
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Sequence
+
+import pytest
+from opentelemetry import trace
+
+from skand_otel_utils import load_shedding
+from skand_otel_utils.cloudevents._spans import use_span
+from skand_otel_utils.cloudevents.decorators import bulk, trace_span
+from tests.testutils import CloudEventBuilder, new_in_memory_tracer_provider
+
+if TYPE_CHECKING:
+    from cloudevents.sdk.event import v1
+
+
+class Shedding:
+    """Load shedding hook switched by hand."""
+
+    def __init__(self) -> None:
+        """Initialize the hook, not shedding."""
+        self.active = False
+
+    def __call__(self) -> bool:
+        return self.active
+
+
+@pytest.fixture
+def shedding(monkeypatch: pytest.MonkeyPatch) -> Shedding:
+    hook = Shedding()
+    monkeypatch.setattr(load_shedding, "_hook", None)
+    load_shedding.set_hook(hook)
+    return hook
+
+
+def test_does_not_shed_without_hook(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(load_shedding, "_hook", None)
+
+    assert load_shedding.get_hook() is None
+    assert not load_shedding.should_shed()
+
+
+def test_follows_hook(shedding: Shedding) -> None:
+    assert not load_shedding.should_shed()
+    shedding.active = True
+    assert load_shedding.should_shed()
+    load_shedding.set_hook(None)
+    assert not load_shedding.should_shed()
+
+
+def test_span_events_are_skipped_while_shedding(shedding: Shedding) -> None:
+    tracer_provider, exporter = new_in_memory_tracer_provider()
+    extracted = []
+
+    def extract(event: v1.Event) -> dict:
+        extracted.append(event.id)
+        return {"event_id": event.id}
+
+    @trace_span.set_span_event_from_event("event payload", extract)
+    def cloudevent_handler(_: v1.Event) -> None:
+        return
+
+    @bulk.set_span_events_from_events("event payload", extract)
+    def bulk_handler(_: Sequence[v1.Event]) -> None:
+        return
+
+    tracer = tracer_provider.get_tracer(__name__)
+    event = CloudEventBuilder().build()
+    for active in (False, True):
+        shedding.active = active
+        with use_span(tracer.start_span("handler"), end_on_exit=True):
+            cloudevent_handler(event)
+            bulk_handler([event])
+
+    kept, shed = exporter.get_finished_spans()
+    assert len(kept.events) == 2  # noqa: PLR2004
+    assert shed.events == ()
+    assert extracted == [event.id, event.id]
+    assert trace.get_current_span() is trace.INVALID_SPAN
@@ -1,8 +1,20 @@
-from opentelemetry import context, trace
+from __future__ import annotations
+
+import pytest
+from opentelemetry import baggage, context, trace
+from opentelemetry.baggage.propagation import W3CBaggagePropagator
 from opentelemetry.trace import span
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
 
+from skand_otel_utils import propagator
 from skand_otel_utils.propagator import (
+    TraceCarrier,
+    extract_context_from_carrier,
+    extract_context_from_traceparent,
+    format_traceparent,
+    get_trace_headers_from_current_trace_context,
     get_traceparent_from_current_trace_context,
+    parse_traceparent,
 )
 from tests.testutils import (
     SpanContextBuilder,
@@ -11,6 +23,45 @@ from tests.testutils import (
 )
 
 
+class TestGetTraceHeadersFromCurrentTraceContext:
+    def test_traceparent_tracestate_and_baggage(self) -> None:
+        builder = SpanContextBuilder().with_trace_state(
+            trace.TraceState([("vendor", "value")])
+        )
+        ctx = baggage.set_baggage("tenant id", "a&b", builder.build_trace_context())
+        token = context.attach(ctx)
+
+        headers = get_trace_headers_from_current_trace_context()
+
+        assert headers == {
+            "traceparent": format_traceparent_from_span_context(builder.build()),
+            "tracestate": "vendor=value",
+            "baggage": "tenant+id=a%26b",
+        }
+        assert get_trace_headers_from_current_trace_context(include_baggage=False) == {
+            "traceparent": headers["traceparent"],
+            "tracestate": "vendor=value",
+        }
+
+        context.detach(token)
+        assert_no_active_trace_context()
+
+    def test_empty_tracestate_and_baggage_are_omitted(self) -> None:
+        builder = SpanContextBuilder()
+        token = context.attach(builder.build_trace_context())
+
+        assert get_trace_headers_from_current_trace_context() == {
+            "traceparent": format_traceparent_from_span_context(builder.build())
+        }
+
+        context.detach(token)
+
+    def test_no_headers_without_trace_context(self) -> None:
+        assert_no_active_trace_context()
+
+        assert get_trace_headers_from_current_trace_context() == {}
+
+
 class TestGetTraceparentFromCurrentTraceContext:
     def test_happy_path_with_valid_current_trace_context(self) -> None:
         # before changing the current trace context
@@ -55,3 +106,159 @@ class TestGetTraceparentFromCurrentTraceContext:
         # teardown
         context.detach(token)
         assert_no_active_trace_context()
+
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+def test_format_traceparent() -> None:
+    span_context = SpanContextBuilder().build()
+    assert format_traceparent(span_context) == format_traceparent_from_span_context(
+        span_context
+    )
+
+
+class TestExtractContextFromTraceparent:
+    @pytest.mark.parametrize(
+        "traceparent",
+        [
+            pytest.param(TRACEPARENT, id="sampled"),
+            pytest.param(TRACEPARENT[:-2] + "00", id="not_sampled"),
+            pytest.param(f" {TRACEPARENT}\t", id="surrounding_whitespace"),
+            pytest.param(f"{TRACEPARENT}\n", id="trailing_newline"),
+            pytest.param(f"{TRACEPARENT}\r\n", id="trailing_crlf"),
+            pytest.param(f"{TRACEPARENT}\n\n", id="trailing_newlines"),
+            pytest.param(f"\n{TRACEPARENT}", id="leading_newline"),
+            pytest.param(f"{TRACEPARENT}\v", id="trailing_vertical_tab"),
+            pytest.param(f"\u00a0{TRACEPARENT}", id="leading_no_break_space"),
+            pytest.param(
+                "01" + TRACEPARENT[2:] + "-future\nfields", id="future_fields_newline"
+            ),
+            pytest.param(
+                "01" + TRACEPARENT[2:] + "-future\n", id="future_trailing_newline"
+            ),
+            pytest.param("01" + TRACEPARENT[2:] + "-future", id="future_version"),
+            pytest.param(TRACEPARENT + "-extra", id="extra_fields_in_version_00"),
+            pytest.param("ff" + TRACEPARENT[2:], id="forbidden_version"),
+            pytest.param(TRACEPARENT.upper(), id="upper_case"),
+            pytest.param(f"00-{'0' * 32}-b7ad6b7169203331-01", id="invalid_trace_id"),
+            pytest.param(
+                "00-0af7651916cd43dd8448eb211c80319c-0000000000000000-01",
+                id="invalid_span_id",
+            ),
+            pytest.param(TRACEPARENT[:-1], id="truncated"),
+            pytest.param("", id="empty"),
+        ],
+    )
+    def test_matches_w3c_propagator(self, traceparent: str) -> None:
+        expected = trace.get_current_span(
+            TraceContextTextMapPropagator().extract({"traceparent": traceparent})
+        ).get_span_context()
+        actual = trace.get_current_span(
+            extract_context_from_traceparent(traceparent)
+        ).get_span_context()
+
+        assert actual == expected
+        assert parse_traceparent(traceparent) == (
+            expected if expected.is_valid else None
+        )
+
+    def test_does_not_inherit_current_context(self) -> None:
+        propagator._extract_context_from_traceparent.cache_clear()
+        token = context.attach(context.set_value("key", "value"))
+        try:
+            extracted_context = extract_context_from_traceparent(TRACEPARENT)
+        finally:
+            context.detach(token)
+
+        assert context.get_value("key", extracted_context) is None
+
+    @pytest.mark.parametrize(
+        "traceparent",
+        [
+            pytest.param(TRACEPARENT, id="valid"),
+            pytest.param("invalid", id="invalid"),
+        ],
+    )
+    def test_caches_parsed_traceparents(self, traceparent: str) -> None:
+        propagator._extract_context_from_traceparent.cache_clear()
+
+        first = extract_context_from_traceparent(traceparent)
+        second = extract_context_from_traceparent(traceparent)
+
+        assert first is second
+        cache_info = propagator._extract_context_from_traceparent.cache_info()
+        assert (cache_info.hits, cache_info.misses) == (1, 1)
+
+    def test_does_not_cache_oversized_strings(self) -> None:
+        propagator._extract_context_from_traceparent.cache_clear()
+
+        extracted_context = extract_context_from_traceparent(TRACEPARENT + "-" * 1024)
+
+        assert trace.get_current_span(extracted_context) == span.INVALID_SPAN
+        assert propagator._extract_context_from_traceparent.cache_info().currsize == 0
+
+
+class TestExtractContextFromCarrier:
+    def test_matches_w3c_propagators(self) -> None:
+        carrier = TraceCarrier(
+            TRACEPARENT, "vendor=value,other=1", "tenant=skand,region=au%20east"
+        )
+        expected = W3CBaggagePropagator().extract(
+            {"baggage": carrier.baggage},
+            TraceContextTextMapPropagator().extract(
+                {"traceparent": carrier.traceparent, "tracestate": carrier.tracestate}
+            ),
+        )
+
+        actual = extract_context_from_carrier(carrier)
+
+        assert trace.get_current_span(actual).get_span_context() == (
+            trace.get_current_span(expected).get_span_context()
+        )
+        assert baggage.get_all(actual) == baggage.get_all(expected)
+        assert baggage.get_all(actual) == {"tenant": "skand", "region": "au east"}
+
+    def test_traceparent_only_uses_traceparent_cache(self) -> None:
+        assert extract_context_from_carrier(
+            TraceCarrier(TRACEPARENT)
+        ) is extract_context_from_traceparent(TRACEPARENT)
+        assert extract_context_from_carrier(
+            TRACEPARENT
+        ) is extract_context_from_traceparent(TRACEPARENT)
+
+    def test_invalid_traceparent_drops_tracestate_and_baggage(self) -> None:
+        extracted_context = extract_context_from_carrier(
+            TraceCarrier("invalid", "vendor=value", "tenant=skand")
+        )
+
+        assert trace.get_current_span(extracted_context) == span.INVALID_SPAN
+        assert baggage.get_all(extracted_context) == {}
+
+    def test_caches_composite_context_and_shared_headers(self) -> None:
+        propagator._extract_context_from_carrier.cache_clear()
+        propagator._extract_baggage_context.cache_clear()
+        carrier = TraceCarrier(TRACEPARENT, "vendor=value", "tenant=skand")
+        other_parent = TRACEPARENT[:-4] + "2-01"
+
+        first = extract_context_from_carrier(carrier)
+        second = extract_context_from_carrier(carrier)
+        other = extract_context_from_carrier(carrier._replace(traceparent=other_parent))
+
+        assert first is second
+        assert baggage.get_all(other) == {"tenant": "skand"}
+        assert propagator._extract_baggage_context.cache_info().hits == 1
+
+    def test_ignores_oversized_tracestate_and_baggage(self) -> None:
+        extracted_context = extract_context_from_carrier(
+            TraceCarrier(
+                TRACEPARENT,
+                "vendor=" + "v" * propagator.MAX_TRACESTATE_LENGTH,
+                "tenant=" + "t" * propagator.MAX_BAGGAGE_LENGTH,
+            )
+        )
+
+        span_context = trace.get_current_span(extracted_context).get_span_context()
+        assert span_context == parse_traceparent(TRACEPARENT)
+        assert not span_context.trace_state
+        assert baggage.get_all(extracted_context) == {}
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Callable
+
+import pytest
+from opentelemetry import trace
+from opentelemetry.sdk.trace.sampling import Decision
+from opentelemetry.semconv.trace import SpanAttributes
+
+from skand_otel_utils.sampling import DEFAULT_MAX_KEYS, RateLimitingSampler
+from tests.testutils import SpanContextBuilder
+
+if TYPE_CHECKING:
+    from opentelemetry.context import Context
+
+
+def topic_attributes(topic: str, event_type: str = "order.created") -> dict:
+    return {
+        SpanAttributes.MESSAGING_DESTINATION_NAME: topic,
+        SpanAttributes.CLOUDEVENTS_EVENT_TYPE: event_type,
+    }
+
+
+def new_sampler(
+    spans_per_second: float,
+    *,
+    burst: float | None = None,
+    respect_parent: bool = False,
+    max_keys: int = DEFAULT_MAX_KEYS,
+) -> tuple[RateLimitingSampler, list[float]]:
+    now = [0.0]
+    sampler = RateLimitingSampler(
+        spans_per_second,
+        burst=burst,
+        respect_parent=respect_parent,
+        max_keys=max_keys,
+        clock=lambda: now[0],
+    )
+    return sampler, now
+
+
+def decide(
+    sampler: RateLimitingSampler, attributes: dict, parent: Context | None = None
+) -> Decision:
+    return sampler.should_sample(parent, 1, "process", attributes=attributes).decision
+
+
+def test_budget_is_per_key() -> None:
+    sampler, _ = new_sampler(spans_per_second=2)
+
+    assert [decide(sampler, topic_attributes("busy")) for _ in range(3)] == [
+        Decision.RECORD_AND_SAMPLE,
+        Decision.RECORD_AND_SAMPLE,
+        Decision.DROP,
+    ]
+    assert decide(sampler, topic_attributes("quiet")) == Decision.RECORD_AND_SAMPLE
+    assert (
+        decide(sampler, topic_attributes("busy", "order.deleted"))
+        == Decision.RECORD_AND_SAMPLE
+    )
+
+
+def test_budget_refills_over_time() -> None:
+    sampler, now = new_sampler(spans_per_second=2, burst=1)
+    attributes = topic_attributes("busy")
+
+    assert decide(sampler, attributes) == Decision.RECORD_AND_SAMPLE
+    assert decide(sampler, attributes) == Decision.DROP
+    now[0] = 0.5
+    assert decide(sampler, attributes) == Decision.RECORD_AND_SAMPLE
+    now[0] = 10.0
+    assert decide(sampler, attributes) == Decision.RECORD_AND_SAMPLE
+    assert decide(sampler, attributes) == Decision.DROP
+
+
+@pytest.mark.parametrize(
+    ("trace_flags", "expected_decision"),
+    [
+        pytest.param(
+            trace.TraceFlags.SAMPLED, Decision.RECORD_AND_SAMPLE, id="sampled_parent"
+        ),
+        pytest.param(trace.TraceFlags.DEFAULT, Decision.DROP, id="unsampled_parent"),
+    ],
+)
+def test_respect_parent(trace_flags: int, expected_decision: Decision) -> None:
+    sampler, _ = new_sampler(spans_per_second=0, burst=0, respect_parent=True)
+    parent = (
+        SpanContextBuilder()
+        .with_remote(True)
+        .with_trace_flags(trace.TraceFlags(trace_flags))
+        .build_trace_context()
+    )
+
+    assert decide(sampler, topic_attributes("busy"), parent) == expected_decision
+    assert decide(sampler, topic_attributes("busy")) == Decision.DROP
+
+
+def test_keys_beyond_max_keys_share_a_budget() -> None:
+    sampler, _ = new_sampler(spans_per_second=1, max_keys=1)
+
+    assert decide(sampler, topic_attributes("first")) == Decision.RECORD_AND_SAMPLE
+    assert decide(sampler, topic_attributes("second")) == Decision.RECORD_AND_SAMPLE
+    assert decide(sampler, topic_attributes("third")) == Decision.DROP
+
+
+def test_budget_is_thread_safe() -> None:
+    sampler, _ = new_sampler(spans_per_second=100)
+    decisions: list[Decision] = []
+    barrier = threading.Barrier(8)
+
+    def sample(record: Callable[[Decision], None] = decisions.append) -> None:
+        barrier.wait()
+        for _ in range(50):
+            record(decide(sampler, topic_attributes("busy")))
+
+    threads = [threading.Thread(target=sample) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert decisions.count(Decision.RECORD_AND_SAMPLE) == 100  # noqa: PLR2004
+
+
+def test_rejects_negative_rate() -> None:
+    with pytest.raises(ValueError, match="must not be negative"):
+        RateLimitingSampler(-1)
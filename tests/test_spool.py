@@ -0,0 +1,366 @@
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+from typing import TYPE_CHECKING, Sequence
+
+import pytest
+from opentelemetry import trace
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    SimpleSpanProcessor,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.trace import SpanKind, StatusCode
+
+from skand_otel_utils.spool import (
+    DEFAULT_MAX_BYTES,
+    DEFAULT_SEGMENT_BYTES,
+    SEGMENT_SUFFIX,
+    SegmentedSpool,
+    SpoolingSpanExporter,
+    decode_spans,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+class FlakyExporter(SpanExporter):
+    """Span exporter failing while ``failing`` is set."""
+
+    def __init__(self, *, raises: bool = False) -> None:
+        """Initialize a healthy exporter without spans."""
+        self.failing = False
+        self.raises = raises
+        self.delay = 0.0
+        self.exported: list[str] = []
+        self.attempts = 0
+        self.exported_event = threading.Event()
+        self.is_shut_down = False
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        self.attempts += 1
+        time.sleep(self.delay)
+        if self.failing:
+            if self.raises:
+                msg = "collector unavailable"
+                raise ConnectionError(msg)
+            return SpanExportResult.FAILURE
+        self.exported.extend(span.name for span in spans)
+        self.exported_event.set()
+        return SpanExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:  # noqa: ARG002
+        return True
+
+    def shutdown(self) -> None:
+        self.is_shut_down = True
+
+
+def make_spans(*names: str) -> list[ReadableSpan]:
+    exporter = RecordingExporter()
+    tracer_provider = TracerProvider(resource=Resource({"service.name": "spool"}))
+    tracer_provider.add_span_processor(SimpleSpanProcessor(exporter))
+    tracer = tracer_provider.get_tracer("tests", "1.0")
+    for name in names:
+        tracer.start_span(name).end()
+    return exporter.spans
+
+
+class RecordingExporter(SpanExporter):
+    """Span exporter keeping the spans it exported."""
+
+    def __init__(self) -> None:
+        """Initialize the exporter without spans."""
+        self.spans: list[ReadableSpan] = []
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        self.spans.extend(spans)
+        return SpanExportResult.SUCCESS
+
+
+def read_all(spool: SegmentedSpool) -> list[bytes]:
+    """Read and remove every segment of the spool."""
+    read = []
+    path = spool.oldest()
+    while path is not None:
+        read.extend(bytes(record) for _, record in spool.read(path))
+        spool.remove(path)
+        path = spool.oldest()
+    return read
+
+
+def new_exporter(
+    downstream: SpanExporter,
+    directory: Path,
+    *,
+    segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> SpoolingSpanExporter:
+    # A long retry interval leaves the replay to force_flush
+    return SpoolingSpanExporter(
+        downstream,
+        directory,
+        segment_bytes=segment_bytes,
+        max_bytes=max_bytes,
+        retry_interval=60.0,
+    )
+
+
+class TestSegmentedSpool:
+    def test_records_are_read_in_order_across_segments(self, tmp_path: Path) -> None:
+        spool = SegmentedSpool(tmp_path, segment_bytes=32, max_bytes=1024)
+        records = [bytes([i]) * 10 for i in range(5)]
+        for record in records:
+            assert spool.append(record)
+
+        assert read_all(spool) == records
+        assert list(tmp_path.iterdir()) == []
+
+    def test_oldest_segments_are_dropped_above_max_bytes(self, tmp_path: Path) -> None:
+        spool = SegmentedSpool(tmp_path, segment_bytes=18, max_bytes=54)
+        for i in range(5):
+            spool.append(bytes([i]) * 10)
+
+        assert spool.size <= spool.max_bytes
+        assert spool.dropped_bytes == 36  # noqa: PLR2004
+        assert read_all(spool)[0] == bytes([2]) * 10
+
+    def test_record_larger_than_spool_is_refused(self, tmp_path: Path) -> None:
+        spool = SegmentedSpool(tmp_path, segment_bytes=16, max_bytes=16)
+        assert not spool.append(b"x" * 16)
+        assert not spool
+
+    def test_segment_being_read_is_not_dropped(self, tmp_path: Path) -> None:
+        spool = SegmentedSpool(tmp_path, segment_bytes=18, max_bytes=36)
+        spool.append(b"a" * 10)
+        spool.append(b"b" * 10)
+        path = spool.oldest()
+        assert path is not None
+
+        with contextlib.closing(spool.read(path)) as records:
+            _, record = next(records)
+            # Room is made by dropping the newer segment instead
+            assert spool.append(b"c" * 10)
+            assert not spool.append(b"d" * 20)
+            assert path.exists()
+            assert bytes(record) == b"a" * 10
+
+        assert spool.dropped_bytes == 18 + 28
+        assert read_all(spool) == [b"a" * 10, b"c" * 10]
+
+    def test_other_files_are_not_segments(self, tmp_path: Path) -> None:
+        spool = SegmentedSpool(tmp_path)
+        spool.append(b"first")
+        spool.close()
+        (tmp_path / f"backup{SEGMENT_SUFFIX}").write_bytes(b"not a segment")
+
+        reopened = SegmentedSpool(tmp_path)
+        reopened.append(b"second")
+        assert read_all(reopened) == [b"first", b"second"]
+        assert [path.name for path in tmp_path.iterdir()] == [f"backup{SEGMENT_SUFFIX}"]
+
+    def test_torn_record_ends_segment(self, tmp_path: Path) -> None:
+        spool = SegmentedSpool(tmp_path)
+        spool.append(b"complete")
+        spool.append(b"torn record")
+        spool.close()
+        (segment,) = tmp_path.glob(f"*{SEGMENT_SUFFIX}")
+        segment.write_bytes(segment.read_bytes()[:-3])
+
+        assert read_all(SegmentedSpool(tmp_path)) == [b"complete"]
+
+    @pytest.mark.parametrize("use_mmap", [False, True])
+    def test_segments_are_kept_across_instances(
+        self, tmp_path: Path, use_mmap: bool
+    ) -> None:
+        spool = SegmentedSpool(tmp_path)
+        spool.append(b"first")
+        spool.close()
+
+        reopened = SegmentedSpool(tmp_path, use_mmap=use_mmap)
+        reopened.append(b"second")
+        assert read_all(reopened) == [b"first", b"second"]
+
+    @pytest.mark.parametrize("use_mmap", [False, True])
+    def test_reading_resumes_from_offset(self, tmp_path: Path, use_mmap: bool) -> None:
+        spool = SegmentedSpool(tmp_path, use_mmap=use_mmap)
+        for record in (b"first", b"second", b"third"):
+            spool.append(record)
+        path = spool.oldest()
+        assert path is not None
+
+        records = spool.read(path)
+        offset, record = next(records)
+        assert record == b"first"
+        records.close()
+        # Records are views, released once the iteration resumes or ends
+        with pytest.raises(ValueError, match="released"):
+            bytes(record)
+
+        assert [bytes(record) for _, record in spool.read(path, offset)] == [
+            b"second",
+            b"third",
+        ]
+
+
+class TestSpoolingSpanExporter:
+    def test_spans_are_exported_directly_while_downstream_is_healthy(
+        self, tmp_path: Path
+    ) -> None:
+        downstream = FlakyExporter()
+        exporter = new_exporter(downstream, tmp_path)
+
+        assert exporter.export(make_spans("a", "b")) == SpanExportResult.SUCCESS
+        assert downstream.exported == ["a", "b"]
+        assert not exporter.spool
+        exporter.shutdown()
+        assert downstream.is_shut_down
+
+    @pytest.mark.parametrize("raises", [False, True])
+    def test_failed_batches_are_replayed_in_order(
+        self, tmp_path: Path, raises: bool
+    ) -> None:
+        downstream = FlakyExporter(raises=raises)
+        exporter = new_exporter(downstream, tmp_path)
+
+        downstream.failing = True
+        assert exporter.export(make_spans("a")) == SpanExportResult.SUCCESS
+        downstream.failing = False
+        # Spooled behind the failed batch, to keep the order
+        assert exporter.export(make_spans("b")) == SpanExportResult.SUCCESS
+
+        assert exporter.force_flush()
+        assert downstream.exported == ["a", "b"]
+        assert list(tmp_path.iterdir()) == []
+        exporter.shutdown()
+
+    def test_force_flush_fails_while_downstream_is_failing(
+        self, tmp_path: Path
+    ) -> None:
+        downstream = FlakyExporter()
+        exporter = new_exporter(downstream, tmp_path, segment_bytes=16)
+        downstream.failing = True
+        exporter.export(make_spans("a"))
+        exporter.export(make_spans("b"))
+
+        assert not exporter.force_flush()
+        downstream.failing = False
+        assert exporter.force_flush()
+        # The batch that failed is retried without exporting the others twice
+        assert downstream.exported == ["a", "b"]
+        exporter.shutdown()
+
+    def test_force_flush_stops_replaying_a_segment_at_the_timeout(
+        self, tmp_path: Path
+    ) -> None:
+        downstream = FlakyExporter()
+        exporter = new_exporter(downstream, tmp_path)
+        downstream.failing = True
+        names = [str(i) for i in range(5)]
+        for name in names:
+            exporter.export(make_spans(name))
+        # Let the replayer fail after the direct export and back off, leaving
+        # the replay to force_flush
+        deadline = time.monotonic() + 5
+        while downstream.attempts < 2 and time.monotonic() < deadline:  # noqa: PLR2004
+            time.sleep(0.001)
+        downstream.failing = False
+        downstream.delay = 0.05
+
+        assert not exporter.force_flush(timeout_millis=60)
+        assert 0 < len(downstream.exported) < len(names)
+        assert exporter.force_flush()
+        assert downstream.exported == names
+        exporter.shutdown()
+
+    def test_force_flush_times_out_waiting_for_a_replay(self, tmp_path: Path) -> None:
+        downstream = FlakyExporter()
+        exporter = new_exporter(downstream, tmp_path)
+        downstream.failing = True
+        exporter.export(make_spans("a"))
+        # Let the replayer fail and back off
+        deadline = time.monotonic() + 5
+        while downstream.attempts < 2 and time.monotonic() < deadline:  # noqa: PLR2004
+            time.sleep(0.001)
+        downstream.failing = False
+
+        # As if the replayer was replaying a segment
+        with exporter._replay_lock:
+            assert not exporter.force_flush(timeout_millis=10)
+        assert exporter.force_flush()
+        assert downstream.exported == ["a"]
+        exporter.shutdown()
+
+    def test_spool_is_replayed_in_background(self, tmp_path: Path) -> None:
+        downstream = FlakyExporter()
+        exporter = SpoolingSpanExporter(downstream, tmp_path, retry_interval=0.01)
+        downstream.failing = True
+        exporter.export(make_spans("a"))
+
+        downstream.failing = False
+        assert downstream.exported_event.wait(5)
+        assert downstream.exported == ["a"]
+        exporter.shutdown()
+
+    def test_spool_left_by_previous_exporter_is_replayed(self, tmp_path: Path) -> None:
+        downstream = FlakyExporter()
+        downstream.failing = True
+        exporter = new_exporter(downstream, tmp_path)
+        exporter.export(make_spans("a"))
+        exporter.shutdown()
+        assert exporter.export(make_spans("b")) == SpanExportResult.FAILURE
+
+        recovered = FlakyExporter()
+        SpoolingSpanExporter(recovered, tmp_path, retry_interval=0.01)
+        assert recovered.exported_event.wait(5)
+        assert recovered.exported == ["a"]
+
+    def test_batch_larger_than_spool_fails(self, tmp_path: Path) -> None:
+        downstream = FlakyExporter()
+        downstream.failing = True
+        exporter = new_exporter(downstream, tmp_path, segment_bytes=16, max_bytes=16)
+
+        assert exporter.export(make_spans("a")) == SpanExportResult.FAILURE
+        exporter.shutdown()
+
+
+def test_decoded_spans_encode_like_the_originals() -> None:
+    exporter = RecordingExporter()
+    tracer_provider = TracerProvider(resource=Resource({"service.name": "spool"}))
+    tracer_provider.add_span_processor(SimpleSpanProcessor(exporter))
+    tracer = tracer_provider.get_tracer("tests", "1.0", schema_url="https://schema")
+    remote_parent = trace.SpanContext(
+        trace_id=1,
+        span_id=2,
+        is_remote=True,
+        trace_flags=trace.TraceFlags(trace.TraceFlags.SAMPLED),
+        trace_state=trace.TraceState([("vendor", "value")]),
+    )
+    span = tracer.start_span(
+        "consume",
+        context=trace.set_span_in_context(trace.NonRecordingSpan(remote_parent)),
+        kind=SpanKind.CONSUMER,
+        attributes={"text": "a", "flag": True, "count": 3, "ratio": 0.5},
+        links=[trace.Link(remote_parent, {"link": "attribute"})],
+    )
+    span.add_event("received", {"sizes": (1, 2)})
+    span.set_status(StatusCode.ERROR, "failed")
+    tracer.start_span("child", context=trace.set_span_in_context(span)).end()
+    span.end()
+
+    encoded = encode_spans(exporter.spans)
+    decoded = decode_spans(encoded.SerializeToString())
+
+    assert encode_spans(decoded) == encoded
+    child, consume = decoded
+    assert consume.parent is not None
+    assert consume.parent.is_remote
+    assert consume.kind == SpanKind.CONSUMER
+    assert child.parent is not None
+    assert not child.parent.is_remote
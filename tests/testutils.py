@@ -1,6 +1,11 @@
 from cloudevents.sdk.event import v1
 from opentelemetry import trace
 from opentelemetry.context.context import Context
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
 from opentelemetry.sdk.trace.id_generator import RandomIdGenerator
 from opentelemetry.trace import (
     DEFAULT_TRACE_OPTIONS,
@@ -119,3 +124,11 @@ class CloudEventBuilder:
 
 def assert_no_active_trace_context() -> None:
     assert trace.get_current_span().get_span_context() == span.INVALID_SPAN_CONTEXT
+
+
+def new_in_memory_tracer_provider() -> "tuple[TracerProvider, InMemorySpanExporter]":
+    """Create a tracer provider exporting finished spans to memory."""
+    exporter = InMemorySpanExporter()
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(SimpleSpanProcessor(exporter))
+    return tracer_provider, exporter